@@ -0,0 +1,136 @@
+import hashlib
+from urllib.parse import urlencode
+from functools import wraps
+from flask import Blueprint, request, session, jsonify, make_response
+from models import Spesa, VersioneDati
+
+# API JSON in sola lettura, versionata nel prefisso (/api/v1).
+# Ogni risposta porta un ETag calcolato dalla versione dei dati dell'utente e dai parametri della richiesta:
+# un client che ripresenta l'ETag in If-None-Match riceve 304 al costo di una sola lettura su users.
+API_VERSION = 'v1'
+
+api_bp = Blueprint('api', __name__)
+
+# Numero massimo di spese per pagina richiedibile con il parametro limit
+MAX_PAGE_SIZE = 200
+
+
+def api_login_required(f):
+    """Come login_required, ma risponde 401 in JSON invece di reindirizzare al form di login"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({'errore': 'Autenticazione richiesta'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def compute_etag(user_id, version):
+    """ETag della richiesta corrente: versione dell'API, utente, versione dei dati, percorso e parametri"""
+    params = urlencode(sorted(request.args.items(multi=True)))
+    raw = f"{API_VERSION}:{user_id}:{version}:{request.path}?{params}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def conditional(f=None, *, validate=None):
+    """
+    Rende la view condizionale: se l'ETag indicato dal client in If-None-Match corrisponde
+    alla versione attuale dei dati, risponde 304 senza eseguire la view.
+    validate, se indicata, controlla i parametri prima del confronto: restituisce la risposta di errore
+    oppure None. Gli errori non hanno ETag, quindi non possono essere rivalidati con un 304.
+    """
+    if f is None:
+        return lambda f: conditional(f, validate=validate)
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if validate is not None:
+            error = validate()
+            if error is not None:
+                return error
+
+        user_id = session.get('user_id')
+        etag = compute_etag(user_id, VersioneDati.get(user_id))
+
+        # Confronto debole: se la risposta è stata compressa il client ripresenta l'ETag come W/"..."
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        # Dati personali: solo la cache del browser, sempre rivalidata con l'ETag.
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated_function
+
+
+def get_filters():
+    """Legge i filtri categoria e mese dalla query string"""
+    filters = {}
+    if request.args.get('categoria'):
+        filters['categoria'] = request.args['categoria']
+    if request.args.get('mese'):
+        filters['mese'] = request.args['mese']
+    return filters
+
+
+def get_limit():
+    """Legge il parametro limit (None se assente o zero, al massimo MAX_PAGE_SIZE); ValueError se non è un intero"""
+    return min(max(int(request.args.get('limit', 0)), 0), MAX_PAGE_SIZE) or None
+
+
+def valida_limit():
+    """Risposta 400 se il parametro limit non è un numero intero, altrimenti None"""
+    try:
+        get_limit()
+    except ValueError:
+        return jsonify({'errore': 'limit deve essere un numero intero'}), 400
+    return None
+
+
+@api_bp.route('/spese')
+@api_login_required
+@conditional(validate=valida_limit)
+def list_spese():
+    """Pagina di spese (parametri: categoria, mese, cursor, limit) con i cursori della pagina successiva/precedente"""
+    limit = get_limit()
+
+    spese, next_cursor, prev_cursor = Spesa.get_page(
+        user_id=session.get('user_id'),
+        filters=get_filters(),
+        cursor=request.args.get('cursor'),
+        page_size=limit
+    )
+
+    return jsonify({
+        'spese': [spesa.to_dict() for spesa in spese],
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    })
+
+
+@api_bp.route('/categorie')
+@api_login_required
+@conditional
+def list_categorie():
+    """Categorie usate dall'utente, in ordine alfabetico"""
+    return jsonify({'categorie': Spesa.get_categorie(user_id=session.get('user_id'))})
+
+
+@api_bp.route('/mesi')
+@api_login_required
+@conditional
+def list_mesi():
+    """Mesi (YYYY-MM) in cui l'utente ha spese, dal più recente"""
+    return jsonify({'mesi': Spesa.get_mesi(user_id=session.get('user_id'))})
+
+
+@api_bp.route('/totali')
+@api_login_required
+@conditional
+def totali():
+    """Totale, numero di spese e ripartizione per categoria (parametri: categoria, mese)"""
+    return jsonify(Spesa.get_riepilogo(user_id=session.get('user_id'), filters=get_filters()))
@@ -1,34 +1,174 @@
-from flask import Flask, redirect, url_for
-from config import Config
-from auth import auth_bp, login_required
-from spese import spese_bp
-import os
-
-def create_app():
-    """Crea e configura l'applicazione Flask"""
-    app = Flask(__name__)
-    app.config.from_object(Config)
-    
-    Config.init_app()
-    
-    app.register_blueprint(auth_bp, url_prefix='/auth')
-    app.register_blueprint(spese_bp, url_prefix='/spese')
-    
-    # Filtro custom per la formattazione dell'importo in valuta 
-    @app.template_filter('currency')
-    def currency_filter(value):
-        if value is None:
-            return "€ 0,00"
-        return f"€ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    
-    # Route principale: reindirizza alla pagina delle spese
-    @app.route('/')
-    def index():
-        return redirect(url_for('spese.index'))
-    
-    return app
-
-app = create_app()
-
-if __name__ == '__main__':
+import time
+# Inizio dell'avvio: il tempo di import dei moduli (Flask, modelli, bcrypt...) fa parte dell'avvio a freddo
+_import_started = time.perf_counter()
+
+import logging
+from flask import Flask, redirect, url_for, jsonify
+from config import Config
+import db
+import metrics
+import assets
+import compression
+from auth import auth_bp
+from spese import spese_bp
+from api import api_bp, API_VERSION
+from commands import register_commands
+from models import user_cache, meta_cache, page_cache
+from pool import PoolTimeoutError
+from passwords import PasswordServiceBusy
+import passwords
+import os
+
+logger = logging.getLogger(__name__)
+
+# Durata in secondi di ogni fase dell'avvio di questo processo (import, create_app, warm_up): esposta
+# su /metrics e misurata da benchmarks/startup.py, così un avvio a freddo più lento diventa visibile.
+STARTUP_TIMES = {'import': time.perf_counter() - _import_started}
+
+def collect_metrics():
+    """Metriche di pool, cache e bcrypt per /metrics, nel formato richiesto da metrics.add_collector"""
+    pool = db.init_db_pool().stats()
+    samples = [
+        ('db_pool_connections', 'gauge', "Connessioni del pool per stato",
+         [('', {'stato': stato}, pool[stato]) for stato in ('open', 'in_use', 'idle') if stato in pool]),
+        ('db_pool_waiters', 'gauge', "Richieste in attesa di una connessione", [('', {}, pool.get('waiters', 0))]),
+        ('db_pool_timeouts_total', 'counter', "Attese di una connessione scadute", [('', {}, pool.get('timeouts', 0))]),
+    ]
+    
+    if db.replica_set is not None:
+        samples.append(('db_replica_healthy', 'gauge', "Repliche in sola lettura raggiungibili (1) o escluse (0)",
+                        [('', {'replica': r['replica']}, int(r['healthy'])) for r in db.replica_set.stats()]))
+    
+    if 'wait_histogram' in pool:
+        wait = [('_bucket', {'le': bound}, count) for bound, count in pool['wait_histogram'].items()]
+        wait.append(('_sum', {}, pool['wait_seconds_total']))
+        wait.append(('_count', {}, pool['checkouts']))
+        samples.append(('db_pool_wait_seconds', 'histogram', "Attesa per ottenere una connessione dal pool", wait))
+    
+    for nome, cache in (('users', user_cache), ('metadati', meta_cache)):
+        stats = cache.stats()
+        samples.append((f'cache_{nome}_hits_total', 'counter', f"Letture trovate nella cache {nome}",
+                        [('', {}, stats['hits'])]))
+        samples.append((f'cache_{nome}_misses_total', 'counter', f"Letture mancate nella cache {nome}",
+                        [('', {}, stats['misses'])]))
+        samples.append((f'cache_{nome}_size', 'gauge', f"Voci nella cache {nome}", [('', {}, stats['size'])]))
+    
+    if page_cache is not None:
+        stats = page_cache.stats()
+        samples.append(('cache_pagine_hits_total', 'counter', "Pagine servite dalla cache", [('', {}, stats['hits'])]))
+        samples.append(('cache_pagine_misses_total', 'counter', "Pagine generate e messe in cache",
+                        [('', {}, stats['misses'])]))
+        samples.append(('cache_pagine_evictions_total', 'counter', "Pagine eliminate per rispettare il limite in byte",
+                        [('', {}, stats['evictions'])]))
+        samples.append(('cache_pagine_bytes', 'gauge', "Byte occupati dalla cache delle pagine",
+                        [('', {}, stats['bytes'] or 0)]))
+    
+    samples.append(('app_startup_seconds', 'gauge', "Durata delle fasi di avvio del processo",
+                    [('', {'fase': fase}, seconds) for fase, seconds in STARTUP_TIMES.items()]))
+    
+    password_stats = passwords.stats()
+    samples.append(('bcrypt_rejected_total', 'counter', "Operazioni bcrypt rifiutate per coda piena",
+                    [('', {}, password_stats['rejected'])]))
+    samples.append(('bcrypt_operations_total', 'counter', "Operazioni bcrypt eseguite",
+                    [('', {'operazione': op}, stat['count']) for op, stat in password_stats['operations'].items()]))
+    
+    return samples
+
+def create_app():
+    """Crea e configura l'applicazione Flask"""
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    
+    logging.basicConfig(level=Config.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    
+    Config.init_app()
+    db.init_app(app)
+    metrics.init_app(app)
+    assets.init_app(app)
+    compression.init_app(app)
+    
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(spese_bp, url_prefix='/spese')
+    app.register_blueprint(api_bp, url_prefix=f'/api/{API_VERSION}')
+    
+    register_commands(app)
+    
+    # Filtro custom per la formattazione dell'importo in valuta 
+    @app.template_filter('currency')
+    def currency_filter(value):
+        if value is None:
+            return "€ 0,00"
+        return f"€ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    
+    # Route principale: reindirizza alla pagina delle spese
+    @app.route('/')
+    def index():
+        return redirect(url_for('spese.index'))
+    
+    # Contatori delle cache in memoria di questo processo, per verificare quante query vengono evitate
+    @app.route('/stats/cache')
+    @metrics.token_required
+    def cache_stats():
+        return jsonify({
+            'users': user_cache.stats(),
+            'metadati': meta_cache.stats(),
+            'pagine': page_cache.stats() if page_cache is not None else None
+        })
+    
+    # Stato del pool di connessioni al database (in uso, inattive, richieste in attesa, tempi di attesa)
+    # e, se configurate, delle repliche
+    @app.route('/stats/pool')
+    @metrics.token_required
+    def pool_stats():
+        stats = db.init_db_pool().stats()
+        if db.replica_set is not None:
+            stats['replicas'] = db.replica_set.stats()
+        return jsonify(stats)
+    
+    # Tempi delle operazioni bcrypt (hash/verifica) e richieste rifiutate per coda piena
+    @app.route('/stats/passwords')
+    @metrics.token_required
+    def password_stats():
+        return jsonify(passwords.stats())
+    
+    # Valori già tenuti da pool, cache e bcrypt, letti solo quando Prometheus interroga /metrics
+    metrics.add_collector(collect_metrics)
+    
+    # Se il pool resta saturo oltre DB_POOL_TIMEOUT, o la coda di bcrypt è piena,
+    # la richiesta viene rifiutata con 503 invece di un errore generico
+    @app.errorhandler(PoolTimeoutError)
+    @app.errorhandler(PasswordServiceBusy)
+    def service_busy(e):
+        return "Servizio momentaneamente sovraccarico, riprova tra qualche istante.", 503, {'Retry-After': '5'}
+    
+    STARTUP_TIMES['create_app'] = time.perf_counter() - started
+    return app
+
+def warm_up(app):
+    """
+    Prepara il processo prima che riceva richieste: apre le connessioni del pool (importando il connettore
+    del database) e compila tutti i template, così la prima richiesta di ogni worker non paga questi costi.
+    Un database non raggiungibile non impedisce l'avvio: le richieste riproveranno a connettersi.
+    """
+    started = time.perf_counter()
+    try:
+        connections = db.warm_up()
+    except Exception as e:
+        connections = 0
+        logger.error("Riscaldamento del pool di connessioni non riuscito: %s", e)
+    STARTUP_TIMES['warmup_db'] = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    templates = app.jinja_env.list_templates()
+    for name in templates:
+        app.jinja_env.get_template(name)
+    STARTUP_TIMES['warmup_templates'] = time.perf_counter() - started
+    
+    logger.info("Processo %s pronto: %d connessioni, %d template; avvio %s", os.getpid(), connections, len(templates),
+                ', '.join(f"{fase} {seconds * 1000:.0f} ms" for fase, seconds in STARTUP_TIMES.items()))
+
+app = create_app()
+
+if __name__ == '__main__':
     app.run(debug=Config.DEBUG)
\ No newline at end of file
@@ -0,0 +1,112 @@
+import os
+import hashlib
+import mimetypes
+from flask import Response, request
+from config import Config
+import compression
+
+# File statici con impronta del contenuto: url_for('static', filename=...) aggiunge ?v=<hash>, così ogni modifica
+# cambia l'URL e il browser può tenere in cache il file per un anno senza mai ricontrollarlo (Cache-Control immutable).
+# All'avvio ogni file viene letto una volta e ne vengono preparate le versioni compresse (gzip e, se disponibile, brotli)
+# al livello massimo: le richieste successive le servono dalla memoria.
+
+# Parametro della query string con l'impronta
+VERSION_ARG = 'v'
+
+
+class StaticAsset:
+    """Contenuto di un file statico con impronta, tipo e varianti compresse"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime_ns
+        with open(path, 'rb') as f:
+            self.body = f.read()
+        self.hash = hashlib.sha1(self.body).hexdigest()[:12]
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.variants = {}
+
+        if self.mimetype in compression.COMPRESSIBLE_TYPES and len(self.body) >= Config.COMPRESS_MIN_SIZE:
+            for encoding in compression.available_encodings():
+                level = 11 if encoding == compression.ENCODING_BROTLI else 9
+                compressed = compression.compress(self.body, encoding, level=level)
+                # Una variante più grande dell'originale non serve
+                if len(compressed) < len(self.body):
+                    self.variants[encoding] = compressed
+
+
+class StaticAssets:
+    """Tutti i file di una directory statica, letti all'avvio"""
+
+    def __init__(self, directory, reload=False):
+        self.directory = directory
+        # Con reload (modalità debug) un file modificato viene riletto alla richiesta successiva.
+        self.reload = reload
+        self._assets = {}
+
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, directory).replace(os.sep, '/')
+                self._assets[filename] = StaticAsset(path)
+
+    def get(self, filename):
+        asset = self._assets.get(filename)
+
+        if asset is not None and self.reload:
+            try:
+                if os.stat(asset.path).st_mtime_ns != asset.mtime:
+                    asset = self._assets[filename] = StaticAsset(asset.path)
+            except OSError:
+                return None
+
+        return asset
+
+    def __len__(self):
+        return len(self._assets)
+
+
+def init_app(app):
+    """Aggiunge l'impronta agli URL dei file statici e li serve dalla memoria con gli header di cache"""
+    assets = StaticAssets(app.static_folder, reload=app.debug)
+    app.extensions['static_assets'] = assets
+
+    @app.url_defaults
+    def add_fingerprint(endpoint, values):
+        if endpoint == 'static' and VERSION_ARG not in values:
+            asset = assets.get(values.get('filename'))
+            if asset is not None:
+                values[VERSION_ARG] = asset.hash
+
+    @app.before_request
+    def serve_static():
+        if request.endpoint != 'static':
+            return None
+
+        asset = assets.get(request.view_args.get('filename'))
+        if asset is None:
+            # File aggiunto dopo l'avvio: lo serve Flask come di consueto
+            return None
+
+        encoding = compression.negotiate(tuple(asset.variants)) if asset.variants else None
+        # Un ETag per ogni rappresentazione: la versione gzip e quella brotli sono byte diversi.
+        etag = f"{asset.hash}-{encoding}" if encoding else asset.hash
+
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(asset.variants[encoding] if encoding else asset.body, mimetype=asset.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(etag)
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+
+        if request.args.get(VERSION_ARG) == asset.hash:
+            response.headers['Cache-Control'] = f"public, max-age={Config.STATIC_MAX_AGE}, immutable"
+        else:
+            # URL senza impronta (o con quella di una versione precedente): il browser deve ricontrollare.
+            response.headers['Cache-Control'] = 'no-cache'
+
+        return response
@@ -0,0 +1,367 @@
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from config import Config
+from pool import ConnectionPool, ThreadLocalPool
+
+# Backend di archiviazione selezionabili con Config.DB_BACKEND.
+# Ogni backend sa aprire le connessioni, creare il pool adatto e fornisce i pochi frammenti SQL
+# che cambiano da un database all'altro; tutto il resto dell'SQL dei modelli è comune.
+BACKEND_MYSQL = 'mysql'
+BACKEND_SQLITE = 'sqlite'
+
+MIGRATION_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migration')
+
+
+# Stopword predefinite degli indici FULLTEXT InnoDB (information_schema.INNODB_FT_DEFAULT_STOPWORD):
+# non vengono indicizzate, quindi come le parole troppo corte si cercano con LIKE.
+MYSQL_FT_STOPWORDS = frozenset((
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from', 'how', 'i', 'in',
+    'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what', 'when', 'where', 'who',
+    'will', 'with', 'und', 'www',
+))
+
+
+class MySQLBackend:
+    """MySQL/MariaDB tramite mysql-connector-python, con il pool di connessioni bloccante di pool.py"""
+
+    name = BACKEND_MYSQL
+    # Statement preparati lato server (vedi db.execute_query)
+    supports_prepared = True
+    # Blocco delle righe lette all'interno di una transazione
+    for_update = " FOR UPDATE"
+    # Lo script iniziale (migration/init.sql) crea anche il database e va eseguito a mano con il client mysql
+    init_script = None
+    migrations_dir = os.path.join(MIGRATION_ROOT, 'versions')
+
+    def connect(self, replica=None):
+        """Apre una connessione al primario o, se indicata, alla replica "host[:porta]" (stesse credenziali)"""
+        # Importato qui: chi usa SQLite non ha bisogno del connettore MySQL.
+        import mysql.connector
+
+        host, port = Config.DB_HOST, Config.DB_PORT
+        if replica:
+            host, _, replica_port = replica.partition(':')
+            port = int(replica_port) if replica_port else Config.DB_PORT
+
+        return mysql.connector.connect(
+            host=host,
+            port=port,
+            user=Config.DB_USER,
+            password=Config.DB_PASS,
+            database=Config.DB_NAME
+        )
+
+    def create_pool(self, replica=None):
+        return ConnectionPool(
+            lambda: self.connect(replica),
+            size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_POOL_MAX_OVERFLOW,
+            timeout=Config.DB_POOL_TIMEOUT,
+            recycle=Config.DB_POOL_RECYCLE,
+            pre_ping_after=Config.DB_POOL_PRE_PING_AFTER
+        )
+
+    def month(self, column):
+        """Espressione SQL che restituisce il mese (YYYY-MM) di una colonna DATE"""
+        return f"DATE_FORMAT({column}, '%Y-%m')"
+
+    def upsert_add(self, table, key_columns, add_columns):
+        """INSERT che, se la chiave esiste già, somma i valori di add_columns a quelli presenti"""
+        columns = key_columns + add_columns
+        updates = ', '.join(f"{c} = {c} + VALUES({c})" for c in add_columns)
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON DUPLICATE KEY UPDATE {updates}"
+        )
+
+    def fulltext_join(self, terms, user_id=None):
+        """
+        JOIN con le spese (dell'utente, se indicato) che contengono tutti i termini, anche come prefisso
+        (in descrizione o categoria), esposte come f.fts_id con il punteggio f.punteggio (più alto = più rilevante).
+        Ritorna (sql, parametri). Usa l'indice FULLTEXT ft_spese_testo (migrazione 0003): MySQL calcola
+        una sola volta le due MATCH identiche. Le parole che l'indice non contiene (più corte di
+        Config.DB_FT_MIN_TOKEN_SIZE o stopword) con +parola* non troverebbero nulla o verrebbero ignorate:
+        per quelle si cerca l'inizio di una parola con LIKE.
+        """
+        indexed = [t for t in terms if len(t) >= Config.DB_FT_MIN_TOKEN_SIZE and t not in MYSQL_FT_STOPWORDS]
+        others = [t for t in terms if t not in indexed]
+
+        conditions, params = [], []
+        if indexed:
+            expression = ' '.join(f"+{term}*" for term in indexed)
+            score = "MATCH(descrizione, categoria) AGAINST (%s IN BOOLEAN MODE)"
+            conditions.append(score)
+            params = [expression, expression]
+        else:
+            score = "0"
+        for term in others:
+            conditions.append("CONCAT(' ', descrizione, ' ', categoria) LIKE %s")
+            params.append('% ' + term.replace('_', '\\_') + '%')
+        # Il filtro sull'utente sta nella tabella derivata: la ricerca non elabora le spese degli altri utenti.
+        if user_id is not None:
+            conditions.append("user_id = %s")
+            params.append(user_id)
+
+        sql = (
+            f" JOIN (SELECT id AS fts_id, {score} AS punteggio FROM spese WHERE {' AND '.join(conditions)})"
+            " f ON f.fts_id = spese.id"
+        )
+        return sql, params
+
+    def explain(self, query):
+        return "EXPLAIN " + query
+
+    def normalize_explain(self, rows):
+        """Righe di EXPLAIN come dizionari con table, type, key, rows ed Extra (type 'ALL' = scansione completa)"""
+        return rows
+
+
+# ---------------------------------------------------------------------------
+# SQLite
+# ---------------------------------------------------------------------------
+
+# Conversioni fra i tipi Python usati dai modelli e le colonne SQLite (con detect_types=PARSE_DECLTYPES
+# il tipo dichiarato nella CREATE TABLE decide la conversione in lettura, come fa il connettore MySQL).
+CENTS = Decimal('0.01')
+
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode('ascii')))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode('ascii')))
+# SQLite legge i REAL come testo con 15 cifre significative: gli errori di arrotondamento delle somme spariscono.
+# Gli importi tornano con due decimali, come le colonne DECIMAL(…,2) di MySQL.
+sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode('ascii')).quantize(CENTS))
+
+# Statement compilati tenuti in cache per ogni connessione dal modulo sqlite3
+STATEMENT_CACHE_SIZE = 256
+
+_PLACEHOLDER_RE = re.compile(r'%s')
+
+
+@lru_cache(maxsize=1024)
+def _translate(query):
+    # I modelli usano i segnaposto %s di mysql-connector; sqlite3 usa ?.
+    return _PLACEHOLDER_RE.sub('?', query)
+
+
+class SQLiteCursor:
+    """Cursore sqlite3 con l'interfaccia di mysql-connector usata da db.py e dai modelli"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+        self._insert = False
+
+    def execute(self, query, params=None):
+        self._insert = query.lstrip()[:6].upper() == 'INSERT'
+        self._cursor.execute(_translate(query), params or ())
+
+    def executemany(self, query, seq_params):
+        self._insert = False
+        self._cursor.executemany(_translate(query), seq_params)
+
+    def _rows(self, rows):
+        if not self._dictionary or not rows:
+            return rows
+        names = [d[0] for d in self._cursor.description]
+        return [dict(zip(names, row)) for row in rows]
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return self._rows([row])[0] if row is not None else None
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    def fetchmany(self, size=1):
+        return self._rows(self._cursor.fetchmany(size))
+
+    @property
+    def lastrowid(self):
+        # sqlite3 restituisce l'ultimo id inserito sulla connessione anche dopo un UPDATE:
+        # come in MySQL, l'id ha senso solo dopo un INSERT eseguito con questo cursore.
+        return self._cursor.lastrowid if self._insert else None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """
+    Connessione sqlite3 con l'interfaccia di mysql-connector usata da db.py e pool.py
+    (autocommit, start_transaction, in_transaction, is_connected...).
+    Come in MySQL, con autocommit disattivato la prima scrittura apre implicitamente una transazione.
+    """
+
+    def __init__(self, path, timeout, read_only=False):
+        self._conn = sqlite3.connect(
+            # Sola lettura: ogni scrittura fallisce con "attempt to write a readonly database"
+            f"file:{os.path.abspath(path)}?mode=ro" if read_only else path,
+            uri=read_only,
+            timeout=timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level='',
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        # WAL: le letture non bloccano la scrittura in corso (e viceversa); synchronous=NORMAL è sicuro con WAL.
+        # La modalità del journal è una proprietà del file: una connessione in sola lettura non può cambiarla.
+        if not read_only:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+
+    @property
+    def autocommit(self):
+        return self._conn.isolation_level is None
+
+    @autocommit.setter
+    def autocommit(self, value):
+        self._conn.isolation_level = None if value else ''
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def cursor(self, dictionary=False, buffered=None, prepared=False):
+        # I risultati sqlite3 non occupano la connessione: buffered e prepared non servono
+        # (gli statement vengono già riusati grazie a cached_statements).
+        return SQLiteCursor(self._conn.cursor(), dictionary=dictionary)
+
+    def start_transaction(self):
+        # IMMEDIATE acquisisce subito il lock di scrittura: prende il posto di SELECT ... FOR UPDATE
+        # ed evita che due transazioni falliscano provando entrambe a passare da lettura a scrittura.
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self):
+        try:
+            self._conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteBackend:
+    """
+    Database SQLite incorporato in un file locale (Config.SQLITE_PATH): nessun server e nessun viaggio in rete.
+    Ogni thread riusa la propria connessione (vedi ThreadLocalPool).
+    """
+
+    name = BACKEND_SQLITE
+    supports_prepared = False
+    for_update = ""
+    # Lo schema viene creato da "flask db upgrade" (tutte le istruzioni usano IF NOT EXISTS)
+    init_script = os.path.join(MIGRATION_ROOT, 'sqlite', 'init.sql')
+    migrations_dir = os.path.join(MIGRATION_ROOT, 'sqlite', 'versions')
+
+    def connect(self, replica=None):
+        """
+        Apre il file SQLITE_PATH o, se indicato, il file replica in sola lettura.
+        SQLite non ha repliche vere: indicando lo stesso file (o una sua copia) si prova il
+        routing delle letture di db.py su una sola macchina, e ogni scrittura inviata per errore fallisce.
+        """
+        if replica:
+            return SQLiteConnection(replica, Config.SQLITE_TIMEOUT, read_only=True)
+
+        directory = os.path.dirname(os.path.abspath(Config.SQLITE_PATH))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        return SQLiteConnection(Config.SQLITE_PATH, Config.SQLITE_TIMEOUT)
+
+    def create_pool(self, replica=None):
+        return ThreadLocalPool(lambda: self.connect(replica), pre_ping_after=Config.DB_POOL_PRE_PING_AFTER)
+
+    def month(self, column):
+        return f"strftime('%Y-%m', {column})"
+
+    def upsert_add(self, table, key_columns, add_columns):
+        columns = key_columns + add_columns
+        updates = ', '.join(f"{c} = {c} + excluded.{c}" for c in add_columns)
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {updates}"
+        )
+
+    def fulltext_join(self, terms, user_id=None):
+        # Tabella FTS5 spese_fts (migrazione 0003), aggiornata dai trigger su spese. bm25 è più basso
+        # per i risultati migliori, quindi viene invertito; la descrizione pesa il doppio della categoria.
+        # FTS5 indicizza anche le parole di una lettera e non ha stopword; l'indice non contiene l'utente,
+        # quindi il filtro su user_id resta nella WHERE della query esterna.
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        sql = (
+            " JOIN (SELECT rowid AS fts_id, -bm25(spese_fts, 2.0, 1.0) AS punteggio"
+            " FROM spese_fts WHERE spese_fts MATCH %s) f ON f.fts_id = spese.id"
+        )
+        return sql, [expression]
+
+    def explain(self, query):
+        return "EXPLAIN QUERY PLAN " + query
+
+    def normalize_explain(self, rows):
+        # "SCAN spese" è una scansione completa, "SEARCH spese USING INDEX ..." usa un indice.
+        # "SCAN spese_fts VIRTUAL TABLE INDEX 0:M..." è una ricerca MATCH nell'indice FTS5 (type 'fulltext' in MySQL).
+        normalized = []
+
+        for row in rows:
+            detail = row.get('detail') or ''
+            words = detail.split()
+            index = re.search(r'USING (?:COVERING )?INDEX (\w+)', detail)
+            if words[:1] == ['SEARCH']:
+                tipo = 'ref'
+            elif words[:1] == ['SCAN'] and re.search(r'VIRTUAL TABLE INDEX \d+:\S*M', detail):
+                tipo = 'fulltext'
+            elif words[:1] == ['SCAN']:
+                tipo = 'index' if index else 'ALL'
+            else:
+                tipo = None
+            normalized.append({
+                'table': words[1] if len(words) > 1 else None,
+                'type': tipo,
+                'key': index.group(1) if index else None,
+                'rows': None,
+                'Extra': detail,
+            })
+
+        return normalized
+
+
+_BACKENDS = {
+    BACKEND_MYSQL: MySQLBackend,
+    BACKEND_SQLITE: SQLiteBackend,
+}
+
+
+def create_backend(name=None):
+    """Crea il backend indicato (default Config.DB_BACKEND)"""
+    name = (name or Config.DB_BACKEND).lower()
+
+    if name not in _BACKENDS:
+        raise ValueError(f"DB_BACKEND non supportato: {name} (valori ammessi: {', '.join(_BACKENDS)})")
+
+    return _BACKENDS[name]()
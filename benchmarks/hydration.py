@@ -0,0 +1,78 @@
+"""
+Micro-benchmark della costruzione degli oggetti Spesa a partire dalle righe lette dal database.
+
+Confronta il percorso precedente (righe come dizionari, Spesa.from_dict che passa da __init__)
+con quello attuale (righe come tuple, Spesa.from_row senza riconversioni), su righe sintetiche
+con gli stessi tipi restituiti dal connettore MySQL (int, date, str, Decimal).
+
+Uso:
+    python benchmarks/hydration.py [--rows 100000] [--repeat 5]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Spesa
+
+CATEGORIE = ['Alimentari', 'Trasporti', 'Casa', 'Svago', 'Salute', 'Abbigliamento']
+COLONNE = [c.strip() for c in Spesa.COLUMNS.split(',')]
+
+
+def genera_righe(n, seed=42):
+    """Genera n righe (tuple) con valori plausibili, nell'ordine di Spesa.COLUMNS"""
+    rnd = random.Random(seed)
+    inizio = date(2020, 1, 1)
+    return [
+        (
+            i,
+            rnd.randint(1, 100),
+            inizio + timedelta(days=rnd.randint(0, 1500)),
+            rnd.choice(CATEGORIE),
+            f"Spesa {i}",
+            Decimal(rnd.randint(100, 50000)) / 100,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def misura(fn, righe, repeat):
+    """Restituisce il miglior tempo (in secondi) su repeat esecuzioni"""
+    migliore = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(righe)
+        elapsed = time.perf_counter() - start
+        migliore = elapsed if migliore is None else min(migliore, elapsed)
+    return migliore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confronta from_dict e from_row su righe sintetiche")
+    parser.add_argument('--rows', type=int, default=100000, help="Numero di righe (default: 100000)")
+    parser.add_argument('--repeat', type=int, default=5, help="Ripetizioni per ogni misura (default: 5)")
+    args = parser.parse_args()
+
+    tuple_rows = genera_righe(args.rows)
+    dict_rows = [dict(zip(COLONNE, row)) for row in tuple_rows]
+
+    casi = [
+        ("dizionari + from_dict", lambda rows: [Spesa.from_dict(r) for r in rows], dict_rows),
+        ("tuple + from_row", lambda rows: [Spesa.from_row(r) for r in rows], tuple_rows),
+        ("dizionari + from_dict + to_dict", lambda rows: [Spesa.from_dict(r).to_dict() for r in rows], dict_rows),
+        ("tuple + from_row + to_dict", lambda rows: [Spesa.from_row(r).to_dict() for r in rows], tuple_rows),
+    ]
+
+    print(f"{args.rows} righe, miglior tempo su {args.repeat} ripetizioni")
+    for nome, fn, righe in casi:
+        elapsed = misura(fn, righe, args.repeat)
+        print(f"  {nome:<34} {elapsed:8.3f} s  {args.rows / elapsed:>12,.0f} righe/s")
+
+
+if __name__ == '__main__':
+    main()
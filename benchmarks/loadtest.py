@@ -0,0 +1,415 @@
+"""
+Test di carico: molti utenti simulati usano l'applicazione contemporaneamente, come farebbero dal browser
+(login, elenco, report, inserimenti, modifiche, eliminazioni ed esportazioni), per osservare come si comportano
+insieme il pool di connessioni, bcrypt e la scrittura dei CSV.
+
+Uso:
+    python benchmarks/loadtest.py [--users 20] [--duration 60] [--mix index=40,filter=25,add=10,edit=10,delete=5,export=10]
+                                  [--think 0.2] [--ramp-up 5] [--seed-rows 20] [--output report.json] [--compare base.json]
+
+Senza --url l'applicazione viene avviata in questo processo su una porta libera (server WSGI di sviluppo, multithread)
+con il database configurato in .env: usare un database dedicato, non quello di produzione. Con --url il carico
+viene inviato a un server già avviato (ad esempio con più processi), così client e server non si contendono la CPU.
+
+Gli utenti loadtest_NNNN vengono registrati se non esistono. Ogni utente simulato ha la propria sessione, segue
+i redirect come un browser (il POST e la pagina successiva sono misurati separatamente) e fra una richiesta e l'altra
+attende un tempo casuale intorno a --think secondi. Il report JSON contiene per ogni route numero di richieste,
+errori, throughput e percentili p50/p95/p99; il campo median (= p50) permette il confronto con suite.py compare.
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import math
+import logging
+import time
+import random
+import secrets
+import argparse
+import platform
+import threading
+import statistics
+import http.cookiejar
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from suite import git_revision, stampa_confronto
+
+USERNAME_PREFIX = 'loadtest_'
+CATEGORIE = ['Alimentari', 'Trasporti', 'Casa', 'Bollette', 'Svago', 'Ristoranti', 'Salute', 'Viaggi']
+ROUTES = ('index', 'filter', 'add', 'edit', 'delete', 'export')
+DEFAULT_MIX = 'index=40,filter=25,add=10,edit=10,delete=5,export=10'
+
+# Link di modifica presenti nell'elenco, da cui si ricavano gli id delle spese
+_EDIT_LINK_RE = re.compile(rb'/spese/edit/(\d+)')
+
+
+def parse_mix(value):
+    """Converte 'index=40,filter=25,...' in un dizionario route -> peso"""
+    mix = {}
+    for part in value.split(','):
+        nome, _, peso = part.partition('=')
+        nome = nome.strip()
+        if nome not in ROUTES:
+            raise argparse.ArgumentTypeError(f"route sconosciuta: {nome} (valori ammessi: {', '.join(ROUTES)})")
+        try:
+            mix[nome] = float(peso)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"peso non valido per {nome}: {peso}")
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("almeno una route deve avere peso maggiore di zero")
+    return mix
+
+
+def percentile(sorted_values, p):
+    """Percentile p (0-100) di una lista già ordinata, con il metodo nearest-rank"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+# ---------------------------------------------------------------------------
+# Utente simulato
+# ---------------------------------------------------------------------------
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # I redirect vengono seguiti a mano, per misurare separatamente il POST e la pagina successiva.
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class VirtualUser:
+    """Un utente con la propria sessione (cookie) che esegue richieste e ne registra i tempi"""
+
+    def __init__(self, base_url, username, password, rnd, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.rnd = rnd
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+        # (route, secondi, esito corretto)
+        self.samples = []
+        self.spese_ids = []
+
+    def request(self, route, path, data=None, expect=(200,), record=True, headers=None):
+        """Esegue una richiesta (POST se data non è None) e restituisce (status, corpo decompresso, Location)"""
+        body = urllib.parse.urlencode(data).encode('ascii') if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, headers={'Accept-Encoding': 'gzip', **(headers or {})})
+        start = time.perf_counter()
+
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                status, headers, content = response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            status, headers, content = e.code, e.headers, e.read()
+        except (urllib.error.URLError, OSError):
+            status, headers, content = None, {}, b''
+
+        elapsed = time.perf_counter() - start
+        location = headers.get('Location')
+
+        if record:
+            # Un redirect al login significa che la sessione è andata persa: è un errore anche se lo status è 302.
+            sessione_persa = location and '/auth/login' in location and route not in ('login', 'register')
+            ok = status in expect and not sessione_persa
+            self.samples.append((route, elapsed, ok))
+
+        if headers.get('Content-Encoding') == 'gzip':
+            content = gzip.decompress(content)
+        return status, content, location
+
+    def follow(self, location):
+        """Segue il redirect dopo un POST, come il browser (la pagina viene misurata come 'index')"""
+        if location:
+            url = urllib.parse.urlsplit(location)
+            self._index(url.path + ('?' + url.query if url.query else ''))
+
+    def register(self):
+        data = {'username': self.username, 'password': self.password, 'confirm_password': self.password}
+        # 302 se l'utente è stato creato, 200 (pagina con l'errore) se esisteva già
+        self.request('register', '/auth/register', data, expect=(200, 302))
+
+    def login(self):
+        status, _, location = self.request('login', '/auth/login', {'username': self.username, 'password': self.password},
+                                           expect=(302,))
+        return status == 302 and location and '/auth/login' not in location
+
+    def _index(self, path='/spese/'):
+        status, content, _ = self.request('index', path)
+        if status == 200:
+            # Gli id delle spese visibili nell'ultima pagina, da usare per modifiche ed eliminazioni
+            self.spese_ids = [int(spesa_id) for spesa_id in _EDIT_LINK_RE.findall(content)]
+
+    def _dati_spesa(self):
+        giorno = date.today() - timedelta(days=self.rnd.randint(0, 365))
+        return {
+            'data': giorno.isoformat(),
+            'categoria': self.rnd.choice(CATEGORIE),
+            'descrizione': f"Spesa di carico {self.rnd.randint(1, 100000)}",
+            'importo': f"{self.rnd.randint(100, 20000) / 100:.2f}",
+        }
+
+    def _spesa_esistente(self):
+        if not self.spese_ids:
+            self._index()
+        return self.rnd.choice(self.spese_ids) if self.spese_ids else None
+
+    def run(self, route):
+        """Esegue un'azione del mix"""
+        if route == 'index':
+            self._index()
+        elif route == 'filter':
+            mese = (date.today() - timedelta(days=30 * self.rnd.randint(0, 11))).strftime('%Y-%m')
+            params = {'categoria': self.rnd.choice(CATEGORIE)} if self.rnd.random() < 0.5 else {}
+            if self.rnd.random() < 0.7:
+                params['mese'] = mese
+            self.request('filter', '/spese/filter?' + urllib.parse.urlencode(params))
+        elif route == 'add':
+            _, _, location = self.request('add', '/spese/add', self._dati_spesa(), expect=(302,))
+            self.follow(location)
+        elif route == 'edit':
+            spesa_id = self._spesa_esistente()
+            if spesa_id is not None:
+                _, _, location = self.request('edit', f'/spese/edit/{spesa_id}', self._dati_spesa(), expect=(302,))
+                self.follow(location)
+        elif route == 'delete':
+            spesa_id = self._spesa_esistente()
+            if spesa_id is not None:
+                _, _, location = self.request('delete', f'/spese/delete/{spesa_id}', {}, expect=(302,))
+                self.spese_ids.remove(spesa_id)
+                self.follow(location)
+        elif route == 'export':
+            self.request('export', '/spese/export')
+
+
+def esegui_utente(user, mix, deadline, think, start_delay, seed_rows, errors):
+    """Corpo del thread di un utente simulato: login, eventuali spese iniziali, poi il mix fino a deadline"""
+    try:
+        time.sleep(start_delay)
+        if not user.login():
+            errors.append(f"{user.username}: login fallito")
+            return
+
+        for _ in range(seed_rows):
+            user.request('seed', '/spese/add', user._dati_spesa(), expect=(302,), record=False)
+        if seed_rows:
+            user._index('/spese/')
+
+        routes = list(mix)
+        weights = [mix[r] for r in routes]
+
+        while time.monotonic() < deadline:
+            user.run(user.rnd.choices(routes, weights=weights)[0])
+            if think:
+                # Attesa esponenziale intorno a think: richieste non sincronizzate fra gli utenti
+                time.sleep(min(user.rnd.expovariate(1 / think), think * 5))
+    except Exception as e:
+        errors.append(f"{user.username}: {e!r}")
+
+
+# ---------------------------------------------------------------------------
+# Server locale e report
+# ---------------------------------------------------------------------------
+
+def avvia_server():
+    """Avvia l'applicazione in un thread su una porta libera; restituisce (url, server)"""
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    # Il log di ogni richiesta del server di sviluppo rallenterebbe il test e coprirebbe il riepilogo.
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    # Senza METRICS_TOKEN le statistiche di /stats/* sono disattivate: per il server locale se ne usa uno temporaneo.
+    if not Config.METRICS_TOKEN:
+        Config.METRICS_TOKEN = secrets.token_hex(16)
+
+    app = create_app()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def statistiche(samples, durata):
+    """Statistiche per route: richieste, errori, throughput e percentili (in secondi)"""
+    per_route = {}
+    for route, elapsed, ok in samples:
+        per_route.setdefault(route, []).append((elapsed, ok))
+
+    results = {}
+    for route, values in sorted(per_route.items()):
+        times = sorted(elapsed for elapsed, _ in values)
+        errori = sum(1 for _, ok in values if not ok)
+        results[route] = {
+            'requests': len(values),
+            'errors': errori,
+            'error_rate': errori / len(values),
+            'throughput': len(values) / durata if durata else 0.0,
+            'mean': statistics.mean(times),
+            'median': percentile(times, 50),
+            'p50': percentile(times, 50),
+            'p95': percentile(times, 95),
+            'p99': percentile(times, 99),
+            'max': times[-1],
+        }
+    return results
+
+
+def leggi_stato_server(user):
+    """Statistiche di pool e bcrypt lette dal server con METRICS_TOKEN (None se non disponibili)"""
+    if not Config.METRICS_TOKEN:
+        return None
+
+    stato = {}
+    headers = {'Authorization': f"Bearer {Config.METRICS_TOKEN}"}
+    for nome, path in (('pool', '/stats/pool'), ('passwords', '/stats/passwords')):
+        status, content, _ = user.request(nome, path, record=False, headers=headers)
+        if status == 200:
+            stato[nome] = json.loads(content)
+    return stato or None
+
+
+def run(args):
+    server = None
+    base_url = args.url
+    if not base_url:
+        base_url, server = avvia_server()
+        print(f"Applicazione avviata su {base_url}", file=sys.stderr)
+
+    try:
+        rnd = random.Random(args.seed)
+        users = [
+            VirtualUser(base_url, f"{USERNAME_PREFIX}{i:04d}", args.password, random.Random(rnd.random()))
+            for i in range(1, args.users + 1)
+        ]
+
+        print(f"Registrazione di {len(users)} utenti...", file=sys.stderr)
+        for user in users:
+            user.register()
+
+        errors = []
+        start = time.perf_counter()
+        deadline = time.monotonic() + args.ramp_up + args.duration
+        threads = []
+        for i, user in enumerate(users):
+            delay = args.ramp_up * i / len(users)
+            thread = threading.Thread(
+                target=esegui_utente,
+                args=(user, args.mix, deadline, args.think, delay, args.seed_rows, errors),
+                name=f"vu-{i}"
+            )
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+        durata = time.perf_counter() - start
+
+        samples = [s for user in users for s in user.samples]
+        # La registrazione avviene prima dell'inizio del test: non entra nel throughput
+        samples_test = [s for s in samples if s[0] != 'register']
+        results = statistiche(samples_test, durata)
+        results.update({f"setup.{k}": v for k, v in statistiche(
+            [s for s in samples if s[0] == 'register'], durata).items()})
+
+        totale = len(samples_test)
+        errori_totali = sum(1 for s in samples_test if not s[2])
+        report = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'target': args.url or 'in-process',
+                'users': args.users,
+                'duration': args.duration,
+                'ramp_up': args.ramp_up,
+                'think': args.think,
+                'mix': args.mix,
+                'seed': args.seed,
+                'config': {
+                    'DB_BACKEND': Config.DB_BACKEND,
+                    'DB_POOL_SIZE': Config.DB_POOL_SIZE,
+                    'DB_POOL_MAX_OVERFLOW': Config.DB_POOL_MAX_OVERFLOW,
+                    'BCRYPT_ROUNDS': Config.BCRYPT_ROUNDS,
+                    'BCRYPT_WORKERS': Config.BCRYPT_WORKERS,
+                    'CSV_SYNC_MODE': Config.CSV_SYNC_MODE,
+                    'PAGE_CACHE_BACKEND': Config.PAGE_CACHE_BACKEND,
+                },
+            },
+            'summary': {
+                'requests': totale,
+                'errors': errori_totali,
+                'error_rate': errori_totali / totale if totale else 0.0,
+                'throughput': totale / durata if durata else 0.0,
+                'elapsed': durata,
+                'client_errors': errors,
+            },
+            'server': leggi_stato_server(users[0]) if users else None,
+            'results': results,
+        }
+
+        stampa_riepilogo(report)
+
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+        else:
+            print(output)
+
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                baseline = json.load(f)
+            return stampa_confronto(baseline, report, args.threshold)
+        return 1 if errors else 0
+
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+def stampa_riepilogo(report):
+    summary = report['summary']
+    print(f"\n{summary['requests']} richieste in {summary['elapsed']:.1f} s: {summary['throughput']:.1f} req/s, "
+          f"errori {summary['error_rate']:.2%}", file=sys.stderr)
+    print(f"{'route':<20} {'richieste':>9} {'req/s':>8} {'errori':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}",
+          file=sys.stderr)
+    for route, r in report['results'].items():
+        print(f"{route:<20} {r['requests']:>9} {r['throughput']:>8.1f} {r['error_rate']:>8.2%} "
+              f"{r['p50'] * 1000:>9.1f} {r['p95'] * 1000:>9.1f} {r['p99'] * 1000:>9.1f}", file=sys.stderr)
+    for error in summary['client_errors']:
+        print(f"Errore: {error}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test di carico di ShoppingTracker con utenti simulati")
+    parser.add_argument('--url', help="Indirizzo di un server già avviato (default: avvia l'app in questo processo)")
+    parser.add_argument('--users', type=int, default=20, help="Utenti simulati contemporanei (default: 20)")
+    parser.add_argument('--duration', type=float, default=60, help="Durata del test in secondi, dopo il ramp-up")
+    parser.add_argument('--ramp-up', type=float, default=5, help="Secondi in cui gli utenti vengono avviati")
+    parser.add_argument('--think', type=float, default=0.2, help="Pausa media fra due richieste (secondi)")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Pesi delle azioni (default: {DEFAULT_MIX})")
+    parser.add_argument('--seed-rows', type=int, default=20, help="Spese inserite da ogni utente prima del test")
+    parser.add_argument('--seed', type=int, default=42, help="Seme del generatore casuale")
+    parser.add_argument('--password', default='loadtest', help="Password degli utenti simulati")
+    parser.add_argument('--output', help="File JSON del report (default: standard output)")
+    parser.add_argument('--compare', help="Report JSON di riferimento con cui confrontare le mediane")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Soglia di regressione (default: 0.10)")
+
+    args = parser.parse_args()
+    sys.exit(run(args) or 0)
+
+
+if __name__ == '__main__':
+    main()
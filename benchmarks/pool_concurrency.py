@@ -0,0 +1,115 @@
+"""
+Verifica di concorrenza del pool di connessioni: molte richieste contemporanee su un pool piccolo
+devono completarsi tutte, attendendo in coda il proprio turno invece di fallire.
+
+Usa una connessione finta (nessun database): ogni "richiesta" prende una connessione, la tiene occupata
+per --hold secondi come farebbe una query e la restituisce. Al termine non devono esserci errori,
+richieste ancora in attesa né connessioni in uso, e le connessioni in uso non devono mai superare size + max_overflow.
+
+Uso:
+    python benchmarks/pool_concurrency.py [--requests 50] [--size 5] [--max-overflow 0] [--hold 0.05]
+
+Termina con codice 1 se una delle condizioni non è rispettata.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pool import ConnectionPool
+
+
+class StubConnection:
+    """Connessione finta con i soli metodi usati dal pool"""
+
+    in_transaction = False
+
+    def is_connected(self):
+        return True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def run(args):
+    pool = ConnectionPool(
+        StubConnection,
+        size=args.size,
+        max_overflow=args.max_overflow,
+        # L'attesa massima copre il caso peggiore: tutte le richieste servite in fila dalle connessioni disponibili
+        timeout=args.requests * args.hold * 2 + 5,
+        pre_ping_after=0
+    )
+    completate = []
+    errori = []
+    # Tutte le richieste partono insieme, come in un picco di traffico
+    barrier = threading.Barrier(args.requests)
+    max_in_use = [0]
+    lock = threading.Lock()
+
+    def richiesta():
+        barrier.wait()
+        try:
+            conn = pool.get_connection()
+            try:
+                with lock:
+                    max_in_use[0] = max(max_in_use[0], pool.stats()['in_use'])
+                time.sleep(args.hold)
+            finally:
+                conn.close()
+            completate.append(1)
+        except Exception as e:
+            errori.append(e)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=richiesta) for _ in range(args.requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    stats = pool.stats()
+    limite = args.size + args.max_overflow
+    print(f"{len(completate)}/{args.requests} richieste completate in {elapsed:.2f} s, errori {len(errori)}, "
+          f"massimo in uso {max_in_use[0]}/{limite}, attesa totale {stats['wait_seconds_total']:.2f} s")
+
+    problemi = []
+    if errori:
+        problemi.append(f"errori: {errori[:3]}")
+    if len(completate) != args.requests:
+        problemi.append(f"completate {len(completate)} richieste su {args.requests}")
+    if stats['waiters'] != 0:
+        problemi.append(f"{stats['waiters']} richieste ancora in attesa")
+    if stats['in_use'] != 0:
+        problemi.append(f"{stats['in_use']} connessioni ancora in uso")
+    # Le connessioni extra vengono chiuse appena restituite e ricreate al picco successivo: conta quante erano in uso
+    if max_in_use[0] > limite or stats['open'] > limite:
+        problemi.append(f"superato il limite di {limite} connessioni (in uso {max_in_use[0]}, aperte {stats['open']})")
+    if stats['checkouts'] != args.requests:
+        problemi.append(f"checkouts {stats['checkouts']} invece di {args.requests}")
+
+    for problema in problemi:
+        print(f"ERRORE: {problema}")
+    return 1 if problemi else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica di concorrenza del pool di connessioni")
+    parser.add_argument('--requests', type=int, default=50, help="Richieste contemporanee (default: 50)")
+    parser.add_argument('--size', type=int, default=5, help="Connessioni stabili del pool (default: 5)")
+    parser.add_argument('--max-overflow', type=int, default=0, help="Connessioni extra (default: 0)")
+    parser.add_argument('--hold', type=float, default=0.05, help="Secondi in cui ogni richiesta tiene la connessione")
+
+    args = parser.parse_args()
+    sys.exit(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Tempo di avvio a freddo: quanto impiega un processo nuovo (come un worker di gunicorn dopo un riavvio)
+a importare l'applicazione, crearla e prepararla a ricevere richieste.
+
+Uso:
+    python benchmarks/startup.py [--repeat 10] [--output avvio.json] [--compare baseline.json] [--threshold 0.10]
+
+Ogni misura avvia un interprete Python nuovo con -X importtime, che importa app.py ed esegue app.warm_up:
+il report contiene la durata di ogni fase (app.STARTUP_TIMES), il tempo totale del processo e il tempo
+di import cumulativo dei moduli più pesanti (Flask, bcrypt, mysql.connector...), così una dipendenza
+diventata più lenta da importare si vede separatamente. Il formato (campo median) è quello di suite.py compare.
+
+Il warm-up si connette al database configurato in .env: se non è raggiungibile la fase warmup_db
+misura solo il tentativo fallito.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config
+from suite import git_revision, stampa_confronto
+
+# Moduli di cui riportare il tempo di import cumulativo: comprende i moduli che importano a loro volta,
+# esclusi quelli già importati da un modulo precedente (ad esempio werkzeug all'interno di flask)
+MODULI = ('flask', 'jinja2', 'werkzeug', 'bcrypt', 'mysql.connector', 'dotenv', 'models')
+
+# Eseguito in ogni processo misurato: stampa su stdout le durate delle fasi in JSON
+SCRIPT = (
+    "import json, app\n"
+    "app.warm_up(app.app)\n"
+    "print(json.dumps(app.STARTUP_TIMES))\n"
+)
+
+
+def leggi_importtime(stderr):
+    """Tempi di import cumulativi (in secondi) dall'output di -X importtime"""
+    tempi = {}
+    for riga in stderr.splitlines():
+        if not riga.startswith('import time:'):
+            continue
+        parti = riga[len('import time:'):].split('|')
+        if len(parti) != 3 or not parti[1].strip().isdigit():
+            continue
+        nome = parti[2].strip()
+        if nome in MODULI and nome not in tempi:
+            tempi[nome] = int(parti[1]) / 1e6
+    return tempi
+
+
+def avvia_processo():
+    """Avvia un processo nuovo e restituisce le durate misurate (in secondi)"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    totale = time.perf_counter() - start
+
+    if result.returncode != 0:
+        sys.exit(f"Avvio dell'applicazione non riuscito:\n{result.stderr[-2000:]}")
+
+    fasi = json.loads(result.stdout.strip().splitlines()[-1])
+    tempi = {f"avvio.{fase}": seconds for fase, seconds in fasi.items()}
+    tempi['avvio.processo'] = totale
+    tempi.update({f"import.{nome}": seconds for nome, seconds in leggi_importtime(result.stderr).items()})
+    return tempi
+
+
+def run(args):
+    misure = {}
+    for i in range(args.warmup + args.repeat):
+        tempi = avvia_processo()
+        # Le prime esecuzioni riempiono la cache del sistema operativo (file .py e .pyc): non vengono contate.
+        if i < args.warmup:
+            continue
+        for nome, seconds in tempi.items():
+            misure.setdefault(nome, []).append(seconds)
+
+    results = {}
+    for nome, times in sorted(misure.items()):
+        times.sort()
+        results[nome] = {
+            'runs': len(times),
+            'min': times[0],
+            'median': statistics.median(times),
+            'mean': statistics.mean(times),
+            'max': times[-1],
+        }
+        print(f"  {nome:<36} mediana {results[nome]['median'] * 1000:10.2f} ms", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'config': {
+                'DB_BACKEND': Config.DB_BACKEND,
+                'DB_POOL_SIZE': Config.DB_POOL_SIZE,
+            },
+        },
+        'results': results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        return stampa_confronto(baseline, report, args.threshold)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo di avvio a freddo di ShoppingTracker")
+    parser.add_argument('--repeat', type=int, default=10, help="Processi misurati (default: 10)")
+    parser.add_argument('--warmup', type=int, default=1, help="Processi avviati prima delle misure")
+    parser.add_argument('--output', help="File JSON dei risultati (default: standard output)")
+    parser.add_argument('--compare', help="Report JSON di riferimento con cui confrontare le mediane")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Soglia di regressione (default: 0.10)")
+
+    args = parser.parse_args()
+    sys.exit(run(args) or 0)
+
+
+if __name__ == '__main__':
+    main()
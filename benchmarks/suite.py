@@ -0,0 +1,427 @@
+"""
+Benchmark riproducibili dei percorsi più usati dell'applicazione, su un database locale popolato con dati sintetici.
+
+Comandi:
+    python benchmarks/suite.py seed --rows 100k [--users 100] [--skew 1.2] [--seed 42]
+        Crea (o riusa) gli utenti bench_NNNN e vi distribuisce le spese con una distribuzione di Zipf:
+        pochi utenti hanno la maggior parte delle righe, come nei dati reali. Le spese già presenti
+        per gli utenti di benchmark vengono cancellate, quindi lo stesso seed produce sempre lo stesso dataset.
+
+    python benchmarks/suite.py run [--repeat 5] [--warmup 1] [--output risultati.json] [--compare baseline.json]
+        Misura i percorsi caldi sull'utente con più spese e su un utente "medio" e scrive i risultati in JSON.
+
+    python benchmarks/suite.py compare baseline.json risultati.json [--threshold 0.10]
+        Confronta le mediane di due esecuzioni e termina con codice 1 se qualche benchmark
+        è più lento del baseline oltre la soglia (default 10%).
+
+Il database usato è quello configurato in .env (DB_*): usare un database dedicato, non quello di produzione.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import date, timedelta, datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csv_mirror
+import csv_sync
+from app import create_app
+from config import Config
+from db import execute_query, transaction
+from models import User, Spesa, meta_cache, user_cache
+
+USERNAME_PREFIX = 'bench_'
+CATEGORIE = [
+    'Alimentari', 'Trasporti', 'Casa', 'Bollette', 'Svago', 'Ristoranti',
+    'Salute', 'Abbigliamento', 'Regali', 'Viaggi', 'Istruzione', 'Animali',
+]
+MESI_STORICO = 36
+
+
+def parse_rows(value):
+    """Converte '1k', '100k', '1M' (o un numero) nel numero di righe"""
+    value = value.strip().lower()
+    multiplier = 1
+    if value.endswith('k'):
+        multiplier, value = 1000, value[:-1]
+    elif value.endswith('m'):
+        multiplier, value = 1000000, value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Numero di righe non valido: {value}")
+
+
+def zipf_weights(n, skew):
+    """Pesi normalizzati di una distribuzione di Zipf con n elementi"""
+    weights = [1 / (rank ** skew) for rank in range(1, n + 1)]
+    total = sum(weights)
+    return [w / total for w in weights]
+
+
+def distribuisci(rows, weights):
+    """Divide rows fra gli elementi secondo i pesi; il resto degli arrotondamenti va al primo"""
+    counts = [int(rows * w) for w in weights]
+    counts[0] += rows - sum(counts)
+    return counts
+
+
+def get_bench_users():
+    """Restituisce gli utenti di benchmark come lista di (id, username), in ordine di username"""
+    result = execute_query(
+        "SELECT id, username FROM users WHERE username LIKE %s ORDER BY username",
+        (USERNAME_PREFIX + '%',), fetch=True
+    )
+    return [(row['id'], row['username']) for row in result]
+
+
+# ---------------------------------------------------------------------------
+# Seed
+# ---------------------------------------------------------------------------
+
+def genera_spese(rnd, user_id, count, category_weights, oggi):
+    """Genera count spese sintetiche per un utente, con categorie distribuite secondo category_weights"""
+    inizio = oggi - timedelta(days=MESI_STORICO * 30)
+    giorni = (oggi - inizio).days
+
+    for i in range(count):
+        categoria = rnd.choices(CATEGORIE, weights=category_weights)[0]
+        yield Spesa(
+            user_id=user_id,
+            data=inizio + timedelta(days=rnd.randint(0, giorni)),
+            categoria=categoria,
+            descrizione=f"{categoria} #{i + 1}",
+            importo=Decimal(rnd.randint(50, 30000)) / 100
+        )
+
+
+def seed(args):
+    rnd = random.Random(args.seed)
+    oggi = date.today()
+
+    # Un solo hash per tutti gli utenti: bcrypt costerebbe più dell'intero seed per i dataset piccoli.
+    password_hash = User.hash_password(args.password)
+    existing = dict((username, user_id) for user_id, username in get_bench_users())
+    users = []
+
+    for n in range(1, args.users + 1):
+        username = f"{USERNAME_PREFIX}{n:04d}"
+        user_id = existing.get(username)
+        if user_id is None:
+            user_id = User(username=username, password_hash=password_hash).save()
+        users.append(user_id)
+
+    all_ids = sorted(set(existing.values()) | set(users))
+    placeholders = ', '.join(['%s'] * len(all_ids))
+    with transaction() as cursor:
+        cursor.execute(f"DELETE FROM spese WHERE user_id IN ({placeholders})", tuple(all_ids))
+        cursor.execute(f"DELETE FROM riepilogo_mensile WHERE user_id IN ({placeholders})", tuple(all_ids))
+
+    for user_id in all_ids:
+        csv_mirror.invalidate(user_id)
+    meta_cache.clear()
+    user_cache.clear()
+
+    # L'ordine degli utenti viene mescolato, così l'utente più "pesante" non è sempre il primo creato.
+    ranking = users[:]
+    rnd.shuffle(ranking)
+    counts = distribuisci(args.rows, zipf_weights(len(ranking), args.skew))
+
+    start = time.perf_counter()
+    for user_id, count in zip(ranking, counts):
+        if not count:
+            continue
+        # Anche le categorie seguono una distribuzione sbilanciata, diversa per ogni utente.
+        category_weights = zipf_weights(len(CATEGORIE), 1.0)
+        rnd.shuffle(category_weights)
+        Spesa.bulk_insert(user_id, genera_spese(rnd, user_id, count, category_weights, oggi))
+
+    csv_sync.wait_idle()
+    elapsed = time.perf_counter() - start
+
+    print(f"Inserite {args.rows} spese per {len(ranking)} utenti in {elapsed:.1f} s "
+          f"(massimo {max(counts)} righe per utente, minimo {min(counts)})")
+    print(f"Password degli utenti {USERNAME_PREFIX}NNNN: {args.password}")
+
+
+# ---------------------------------------------------------------------------
+# Run
+# ---------------------------------------------------------------------------
+
+def misura(fn, repeat, warmup, setup=None):
+    """Esegue fn warmup + repeat volte e restituisce le statistiche (in secondi) delle ultime repeat"""
+    times = []
+
+    for i in range(warmup + repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            times.append(elapsed)
+
+    times.sort()
+    return {
+        'runs': len(times),
+        'min': times[0],
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'p95': times[min(len(times) - 1, int(round(0.95 * (len(times) - 1))))],
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def conta_spese(user_id):
+    result = execute_query(
+        "SELECT COALESCE(SUM(conteggio), 0) AS n FROM riepilogo_mensile WHERE user_id = %s", (user_id,), fetch=True
+    )
+    return int(result[0]['n'])
+
+
+def scegli_utenti():
+    """Restituisce l'utente con più spese e quello con il numero mediano di spese, con i rispettivi conteggi"""
+    users = [(conta_spese(user_id), user_id) for user_id, _ in get_bench_users()]
+    users = sorted(u for u in users if u[0] > 0)
+    if not users:
+        sys.exit("Nessuna spesa di benchmark: eseguire prima il comando seed")
+    return users[-1], users[len(users) // 2]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def login(client, user_id):
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+
+
+def get_ok(client, url, **kwargs):
+    response = client.get(url, **kwargs)
+    # get_data() consuma anche le risposte in streaming (export)
+    response.get_data()
+    response.close()
+    if response.status_code != 200:
+        raise RuntimeError(f"{url}: risposta {response.status_code}")
+
+
+def casi_utente(label, user_id, client):
+    """Costruisce i benchmark per un utente: (nome, funzione, setup)"""
+    mesi = Spesa.get_mesi(user_id=user_id)
+    categorie = Spesa.get_categorie(user_id=user_id)
+    mese = mesi[len(mesi) // 2] if mesi else date.today().strftime('%Y-%m')
+    categoria = categorie[0] if categorie else CATEGORIE[0]
+    filtro = {'categoria': categoria, 'mese': mese}
+
+    def save_con_csv():
+        spesa = Spesa(user_id=user_id, data=date.today(), categoria=categoria,
+                      descrizione='benchmark', importo=Decimal('12.34'))
+        spesa.save()
+        csv_sync.wait_idle()
+        saved.append(spesa)
+
+    saved = []
+    spese_utente = Spesa.get_all(user_id=user_id)
+    login(client, user_id)
+
+    casi = [
+        ('get_all', lambda: Spesa.get_all(user_id=user_id), None),
+        ('get_all_categoria', lambda: Spesa.get_all(user_id=user_id, filters={'categoria': categoria}), None),
+        ('get_all_mese', lambda: Spesa.get_all(user_id=user_id, filters={'mese': mese}), None),
+        ('get_all_categoria_mese', lambda: Spesa.get_all(user_id=user_id, filters=filtro), None),
+        ('get_page', lambda: Spesa.get_page(user_id=user_id), None),
+        ('search_prefisso', lambda: Spesa.search(categoria[:4], user_id=user_id), None),
+        ('search_filtrato', lambda: Spesa.search(f"{categoria} 1", user_id=user_id, filters={'mese': mese}), None),
+        ('get_categorie_cold', lambda: Spesa.get_categorie(user_id=user_id), meta_cache.clear),
+        ('get_mesi_cold', lambda: Spesa.get_mesi(user_id=user_id), meta_cache.clear),
+        ('get_categorie_warm', lambda: Spesa.get_categorie(user_id=user_id), None),
+        ('get_mesi_warm', lambda: Spesa.get_mesi(user_id=user_id), None),
+        ('save_to_csv', lambda: Spesa.save_to_csv(user_id, spese_utente), None),
+        ('save_csv_sync', save_con_csv, None),
+        ('route_index', lambda: get_ok(client, '/spese/'), None),
+        ('route_filter', lambda: get_ok(client, '/spese/filter', query_string=filtro), None),
+        ('route_index_streaming', lambda: get_ok(client, '/spese/', query_string={'tutte': 1}), None),
+        ('route_export', lambda: get_ok(client, '/spese/export'), None),
+        ('route_export_filtrato', lambda: get_ok(client, '/spese/export', query_string=filtro), None),
+    ]
+
+    def cleanup():
+        for spesa in saved:
+            spesa.delete()
+        csv_sync.wait_idle()
+
+    return [(f"{label}.{nome}", fn, setup) for nome, fn, setup in casi], cleanup
+
+
+def run(args):
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+
+    (heavy_rows, heavy_id), (median_rows, median_id) = scegli_utenti()
+    totale = execute_query(
+        "SELECT COALESCE(SUM(conteggio), 0) AS n FROM riepilogo_mensile r "
+        "JOIN users u ON u.id = r.user_id WHERE u.username LIKE %s",
+        (USERNAME_PREFIX + '%',), fetch=True
+    )[0]['n']
+
+    results = {}
+    for label, user_id in (('heavy', heavy_id), ('median', median_id)):
+        casi, cleanup = casi_utente(label, user_id, client)
+        try:
+            for nome, fn, setup in casi:
+                if args.only and not any(pattern in nome for pattern in args.only):
+                    continue
+                results[nome] = misura(fn, args.repeat, args.warmup, setup)
+                print(f"  {nome:<36} mediana {results[nome]['median'] * 1000:10.2f} ms", file=sys.stderr)
+        finally:
+            cleanup()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rows_total': int(totale),
+            'heavy_user_rows': heavy_rows,
+            'median_user_rows': median_rows,
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'config': {
+                'CSV_SYNC_MODE': Config.CSV_SYNC_MODE,
+                'DB_POOL_SIZE': Config.DB_POOL_SIZE,
+                'DB_PREPARED_STATEMENTS': Config.DB_PREPARED_STATEMENTS,
+                'PAGE_SIZE': Config.PAGE_SIZE,
+            },
+        },
+        'results': results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        return stampa_confronto(baseline, report, args.threshold)
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Compare
+# ---------------------------------------------------------------------------
+
+def confronta(baseline, current, threshold):
+    """
+    Confronta le mediane di due report. Restituisce una lista di
+    (nome, mediana baseline, mediana attuale, variazione relativa, esito) con esito 'regressione',
+    'miglioramento', 'ok', 'nuovo' o 'mancante'.
+    """
+    righe = []
+    base_results = baseline.get('results', {})
+    curr_results = current.get('results', {})
+
+    for nome in sorted(set(base_results) | set(curr_results)):
+        base = base_results.get(nome)
+        curr = curr_results.get(nome)
+
+        if base is None:
+            righe.append((nome, None, curr['median'], None, 'nuovo'))
+            continue
+        if curr is None:
+            righe.append((nome, base['median'], None, None, 'mancante'))
+            continue
+
+        delta = curr['median'] / base['median'] - 1 if base['median'] else 0.0
+        if delta > threshold:
+            esito = 'regressione'
+        elif delta < -threshold:
+            esito = 'miglioramento'
+        else:
+            esito = 'ok'
+        righe.append((nome, base['median'], curr['median'], delta, esito))
+
+    return righe
+
+
+def stampa_confronto(baseline, current, threshold):
+    righe = confronta(baseline, current, threshold)
+    regressioni = [r for r in righe if r[4] == 'regressione']
+
+    def ms(value):
+        return f"{value * 1000:10.2f}" if value is not None else f"{'-':>10}"
+
+    print(f"{'benchmark':<36} {'base ms':>10} {'ora ms':>10} {'delta':>8}  esito")
+    for nome, base, curr, delta, esito in righe:
+        delta_str = f"{delta:+.1%}" if delta is not None else '-'
+        print(f"{nome:<36} {ms(base)} {ms(curr)} {delta_str:>8}  {esito}")
+
+    if baseline.get('meta', {}).get('rows_total') != current.get('meta', {}).get('rows_total'):
+        print("Attenzione: i due report sono stati eseguiti su dataset di dimensioni diverse")
+
+    if regressioni:
+        print(f"{len(regressioni)} regressioni oltre la soglia del {threshold:.0%}")
+        return 1
+    return 0
+
+
+def compare(args):
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    return stampa_confronto(baseline, current, args.threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dei percorsi caldi di ShoppingTracker")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p_seed = subparsers.add_parser('seed', help="Popola il database con utenti e spese sintetiche")
+    p_seed.add_argument('--rows', type=parse_rows, default=parse_rows('100k'), help="Spese totali: 1k, 100k, 1M...")
+    p_seed.add_argument('--users', type=int, default=100, help="Numero di utenti (default: 100)")
+    p_seed.add_argument('--skew', type=float, default=1.2, help="Esponente di Zipf della distribuzione per utente")
+    p_seed.add_argument('--seed', type=int, default=42, help="Seme del generatore casuale")
+    p_seed.add_argument('--password', default='benchmark', help="Password degli utenti creati")
+    p_seed.set_defaults(func=seed)
+
+    p_run = subparsers.add_parser('run', help="Esegue i benchmark e scrive i risultati in JSON")
+    p_run.add_argument('--repeat', type=int, default=5, help="Misure per benchmark (default: 5)")
+    p_run.add_argument('--warmup', type=int, default=1, help="Esecuzioni di riscaldamento non misurate")
+    p_run.add_argument('--only', nargs='*', help="Esegue solo i benchmark il cui nome contiene uno di questi testi")
+    p_run.add_argument('--output', help="File JSON dei risultati (default: standard output)")
+    p_run.add_argument('--compare', help="Report JSON di riferimento con cui confrontare i risultati")
+    p_run.add_argument('--threshold', type=float, default=0.10, help="Soglia di regressione (default: 0.10)")
+    p_run.set_defaults(func=run)
+
+    p_compare = subparsers.add_parser('compare', help="Confronta due report JSON")
+    p_compare.add_argument('baseline')
+    p_compare.add_argument('current')
+    p_compare.add_argument('--threshold', type=float, default=0.10, help="Soglia di regressione (default: 0.10)")
+    p_compare.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args) or 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache in memoria thread-safe con politica LRU e scadenza delle voci.
+    Quando supera maxsize elementi elimina quello usato meno di recente; ogni voce scade dopo ttl secondi.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Restituisce il valore associato a key, oppure default se assente o scaduto"""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+
+            if item is not _MISSING:
+                expires_at, value = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """Come get, ma senza aggiornare l'ordine LRU né i contatori"""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and item[0] > time.monotonic():
+                return item[1]
+            return default
+
+    def set(self, key, value):
+        """Memorizza value per key, eliminando la voce meno recente se la cache è piena"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Elimina la voce associata a key, se presente"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Svuota la cache (i contatori restano invariati)"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Restituisce i contatori di utilizzo della cache"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class MemoryPageCache:
+    """
+    Cache delle pagine HTML già generate, in memoria del processo.
+    Le voci sono raggruppate per utente (per poterle invalidare tutte insieme) e il limite è in byte:
+    quando la somma delle pagine supera max_bytes vengono eliminate quelle usate meno di recente.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._by_user = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id, key):
+        """Restituisce la pagina (bytes) memorizzata per key, oppure None"""
+        with self._lock:
+            body = self._data.get((user_id, key))
+            if body is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end((user_id, key))
+            self.hits += 1
+            return body
+
+    def set(self, user_id, key, body):
+        """Memorizza la pagina body (bytes); le pagine più grandi dell'intero limite non vengono tenute"""
+        if len(body) > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove((user_id, key))
+            self._data[(user_id, key)] = body
+            self._by_user.setdefault(user_id, set()).add(key)
+            self._bytes += len(body)
+
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, item):
+        body = self._data.pop(item, None)
+        if body is None:
+            return
+        self._bytes -= len(body)
+        keys = self._by_user.get(item[0])
+        if keys is not None:
+            keys.discard(item[1])
+            if not keys:
+                del self._by_user[item[0]]
+
+    def invalidate(self, user_id):
+        """Elimina tutte le pagine dell'utente"""
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove((user_id, key))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_user.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+class FilesystemPageCache:
+    """
+    Cache delle pagine HTML in una directory condivisa: più processi (o worker) sulla stessa macchina
+    si scambiano le pagine già generate. Ogni utente ha una sottodirectory, così l'invalidazione
+    elimina i suoi file senza scorrere quelli degli altri.
+    L'ordine LRU è dato dalla data di modifica dei file, aggiornata a ogni lettura. Ogni processo stima
+    lo spazio occupato e, quando supera max_bytes, riconta i file e cancella i meno recenti fino al 90% del limite.
+    """
+
+    # Frazione del limite a cui si scende dopo una pulizia, per non ripeterla a ogni scrittura
+    PRUNE_TARGET = 0.9
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._bytes = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, user_id, key):
+        return os.path.join(self.directory, str(user_id), key + '.html')
+
+    def get(self, user_id, key):
+        path = self._path(user_id, key)
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return body
+
+    def set(self, user_id, key, body):
+        if len(body) > self.max_bytes:
+            return
+
+        path = self._path(user_id, key)
+        # Scrittura su un file temporaneo e rename atomico: gli altri processi non leggono mai pagine troncate.
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._scan_bytes()
+            else:
+                self._bytes += len(body)
+            if self._bytes <= self.max_bytes:
+                return
+        self._prune()
+
+    def _files(self):
+        try:
+            users = list(os.scandir(self.directory))
+        except OSError:
+            return
+
+        for user_dir in users:
+            if not user_dir.is_dir():
+                continue
+            try:
+                for entry in os.scandir(user_dir.path):
+                    if entry.name.endswith('.html'):
+                        yield entry
+            except OSError:
+                continue
+
+    def _scan_bytes(self):
+        total = 0
+        for entry in self._files():
+            try:
+                total += entry.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def _prune(self):
+        files = []
+        for entry in self._files():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * self.PRUNE_TARGET
+        evicted = 0
+
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except OSError:
+                pass
+            total -= size
+
+        with self._lock:
+            self._bytes = total
+            self.evictions += evicted
+
+    def invalidate(self, user_id):
+        user_dir = os.path.join(self.directory, str(user_id))
+        try:
+            entries = list(os.scandir(user_dir))
+        except OSError:
+            return
+
+        for entry in entries:
+            if entry.name.endswith('.html'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        for entry in list(self._files()):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        with self._lock:
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'directory': self.directory,
+            }
@@ -0,0 +1,80 @@
+import click
+from flask.cli import AppGroup
+import migrate
+from models import RiepilogoMensile
+
+riepilogo_cli = AppGroup('riepilogo', help='Gestione della tabella riepilogo_mensile.')
+db_cli = AppGroup('db', help='Migrazioni dello schema del database.')
+
+
+@riepilogo_cli.command('rebuild')
+@click.option('--user-id', type=int, default=None, help='Ricostruisce solo il riepilogo di questo utente.')
+def riepilogo_rebuild(user_id):
+    """Ricalcola da zero il riepilogo mensile a partire dalle spese"""
+    buckets = RiepilogoMensile.rebuild(user_id=user_id)
+    click.echo(f"Riepilogo ricostruito: {buckets} righe.")
+
+
+@riepilogo_cli.command('verify')
+@click.option('--user-id', type=int, default=None, help='Verifica solo il riepilogo di questo utente.')
+def riepilogo_verify(user_id):
+    """Confronta il riepilogo mensile con le spese e segnala eventuali differenze"""
+    differenze = RiepilogoMensile.verify(user_id=user_id)
+    
+    for user, mese, categoria, atteso, trovato in differenze:
+        click.echo(f"utente {user}, {mese}, {categoria}: atteso {atteso}, trovato {trovato}")
+    
+    if differenze:
+        click.echo(f"{len(differenze)} differenze trovate. Usa 'flask riepilogo rebuild' per correggerle.")
+        raise SystemExit(1)
+    
+    click.echo("Riepilogo coerente con le spese.")
+
+
+@db_cli.command('upgrade')
+@click.option('--target', type=int, default=None, help='Applica le migrazioni fino a questa versione.')
+def db_upgrade(target):
+    """Applica le migrazioni non ancora eseguite"""
+    done = migrate.upgrade(target=target)
+    
+    for version, nome in done:
+        click.echo(f"Applicata {version:04d}_{nome}")
+    
+    if not done:
+        click.echo("Lo schema è già aggiornato.")
+
+
+@db_cli.command('status')
+def db_status():
+    """Mostra lo stato delle migrazioni"""
+    applied = migrate.get_applied()
+    
+    for version, nome, _ in migrate.list_migrations():
+        stato = 'applicata' if version in applied else 'da applicare'
+        click.echo(f"{version:04d}_{nome}: {stato}")
+
+
+@db_cli.command('explain')
+@click.option('--user-id', type=int, required=True, help='Utente su cui eseguire le query.')
+def db_explain(user_id):
+    """Esegue EXPLAIN sulle query più frequenti e segnala le scansioni complete di tabella"""
+    full_scans = 0
+    
+    for nome, rows, full_scan in migrate.explain_hot_queries(user_id):
+        if full_scan:
+            full_scans += 1
+        for row in rows:
+            click.echo(f"{nome}: tabella={row.get('table')} tipo={row.get('type')} "
+                       f"indice={row.get('key')} righe={row.get('rows')} extra={row.get('Extra')}")
+    
+    if full_scans:
+        click.echo(f"{full_scans} query eseguono una scansione completa.")
+        raise SystemExit(1)
+    
+    click.echo("Nessuna scansione completa.")
+
+
+def register_commands(app):
+    """Registra i comandi CLI dell'applicazione (flask <comando>)"""
+    app.cli.add_command(riepilogo_cli)
+    app.cli.add_command(db_cli)
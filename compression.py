@@ -0,0 +1,113 @@
+import zlib
+from flask import request
+from config import Config
+
+# Compressione delle risposte negoziata con Accept-Encoding: gzip sempre, brotli se il modulo è installato
+# (pip install brotli). Le risposte in streaming vengono compresse blocco per blocco, senza accumularle.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODING_GZIP = 'gzip'
+ENCODING_BROTLI = 'br'
+
+# Tipi di contenuto testuali, per cui la compressione conviene (immagini e archivi sono già compressi)
+COMPRESSIBLE_TYPES = frozenset((
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+))
+
+
+def available_encodings():
+    """Codifiche supportate, in ordine di preferenza a parità di qualità indicata dal client"""
+    return (ENCODING_BROTLI, ENCODING_GZIP) if brotli is not None else (ENCODING_GZIP,)
+
+
+def negotiate(encodings=None):
+    """Sceglie fra encodings (default available_encodings()) la codifica migliore accettata dal client, o None"""
+    return request.accept_encodings.best_match(encodings or available_encodings())
+
+
+class Compressor:
+    """Compressore incrementale: compress restituisce subito i byte già decodificabili dal client, finish chiude il flusso"""
+
+    def __init__(self, encoding, level=None):
+        self.encoding = encoding
+        if encoding == ENCODING_BROTLI:
+            self._brotli = brotli.Compressor(quality=level if level is not None else Config.COMPRESS_BROTLI_QUALITY)
+        else:
+            # wbits=31: formato gzip (intestazione e CRC) invece di zlib
+            self._zlib = zlib.compressobj(level if level is not None else Config.COMPRESS_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        # Il flush a ogni blocco fa arrivare al browser le righe già generate invece di tenerle nel buffer del compressore.
+        if self.encoding == ENCODING_BROTLI:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == ENCODING_BROTLI:
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+def compress(data, encoding, level=None):
+    """Comprime data (bytes) in un colpo solo"""
+    if encoding == ENCODING_BROTLI:
+        return brotli.compress(data, quality=level if level is not None else Config.COMPRESS_BROTLI_QUALITY)
+    return zlib.compress(data, level if level is not None else Config.COMPRESS_LEVEL, 31)
+
+
+def _compress_stream(chunks, compressor):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compressor.compress(chunk)
+        yield compressor.finish()
+    finally:
+        # Se il client si disconnette, il generatore originale (e la connessione al database che tiene) va chiuso.
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    """Hook after_request: comprime la risposta se il client lo accetta e se ne vale la pena"""
+    if (response.status_code != 200 or request.method == 'HEAD' or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES
+            or request.endpoint == 'static'):
+        # I file statici hanno già le varianti precompresse (vedi assets.py)
+        return response
+
+    # La risposta cambia in base ad Accept-Encoding anche quando alla fine non viene compressa.
+    response.vary.add('Accept-Encoding')
+
+    if not response.is_streamed and (response.content_length or 0) < Config.COMPRESS_MIN_SIZE:
+        return response
+
+    encoding = negotiate()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, Compressor(encoding))
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compress(response.get_data(), encoding))
+
+    response.headers['Content-Encoding'] = encoding
+
+    # I byte inviati non sono più quelli descritti da un ETag forte: l'ETag diventa debole (W/"...").
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+
+def init_app(app):
+    """Registra la compressione delle risposte (solo se COMPRESS_ENABLED)"""
+    if Config.COMPRESS_ENABLED:
+        app.after_request(compress_response)
@@ -1,24 +1,126 @@
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY', 'default-dev-key-change-in-production')
-    DEBUG = os.environ.get('DEBUG', 'True').lower() in ('true', '1', 't')
-    
-    # Connessione database
-    DB_HOST = os.environ.get('DB_HOST', 'localhost')
-    DB_PORT = int(os.environ.get('DB_PORT', 3306))
-    DB_USER = os.environ.get('DB_USER', 'root')
-    DB_PASS = os.environ.get('DB_PASS', '')
-    DB_NAME = os.environ.get('DB_NAME', 'shopping_tracker')
-    
-    # Directory dove vengono salvati eventuali file CSV esportati o di backup.
-    CSV_DIR = os.environ.get('CSV_DIR', 'data')
-    
-    @classmethod
-    def init_app(cls):
-        # Pattern utile in fase di scrittura/lettura file per assicurarsi che la dir per i CSV esista.
-        if not os.path.exists(cls.CSV_DIR):
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'default-dev-key-change-in-production')
+    DEBUG = os.environ.get('DEBUG', 'True').lower() in ('true', '1', 't')
+    
+    # Database: "mysql" (server MySQL/MariaDB, parametri DB_*) oppure "sqlite" (file locale SQLITE_PATH,
+    # senza server: adatto alle installazioni su una sola macchina e per lavorare offline)
+    DB_BACKEND = os.environ.get('DB_BACKEND', 'mysql').lower()
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join('data', 'shopping_tracker.db'))
+    # Secondi di attesa quando il file SQLite è bloccato da un'altra scrittura
+    SQLITE_TIMEOUT = float(os.environ.get('SQLITE_TIMEOUT', 5))
+    
+    # Connessione database (MySQL)
+    DB_HOST = os.environ.get('DB_HOST', 'localhost')
+    DB_PORT = int(os.environ.get('DB_PORT', 3306))
+    DB_USER = os.environ.get('DB_USER', 'root')
+    DB_PASS = os.environ.get('DB_PASS', '')
+    DB_NAME = os.environ.get('DB_NAME', 'shopping_tracker')
+    # Lunghezza minima delle parole nell'indice FULLTEXT (innodb_ft_min_token_size del server MySQL):
+    # le parole più corte si cercano con LIKE
+    DB_FT_MIN_TOKEN_SIZE = int(os.environ.get('DB_FT_MIN_TOKEN_SIZE', 3))
+    
+    # Pool di connessioni: connessioni stabili, connessioni extra nei picchi, secondi di attesa massima
+    # per una connessione libera, età massima di una connessione e inattività oltre la quale viene verificata
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 3600))
+    DB_POOL_PRE_PING_AFTER = float(os.environ.get('DB_POOL_PRE_PING_AFTER', 10))
+    # Statement preparati lato server per le query fisse dei modelli
+    DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', 'True').lower() in ('true', '1', 't')
+    
+    # Repliche in sola lettura, separate da virgole ("host[:porta]" con MySQL, percorsi di file con SQLite):
+    # le SELECT delle richieste vengono distribuite a turno fra le repliche, le scritture vanno sempre al primario.
+    # Dopo una scrittura la sessione dell'utente legge dal primario per DB_READ_YOUR_WRITES secondi, così vede
+    # subito le proprie modifiche anche se le repliche sono in ritardo; una replica irraggiungibile viene
+    # esclusa per DB_REPLICA_RETRY_AFTER secondi.
+    DB_REPLICAS = [r.strip() for r in os.environ.get('DB_REPLICAS', '').split(',') if r.strip()]
+    DB_READ_YOUR_WRITES = float(os.environ.get('DB_READ_YOUR_WRITES', 5))
+    DB_REPLICA_RETRY_AFTER = float(os.environ.get('DB_REPLICA_RETRY_AFTER', 30))
+    
+    # Password: costo bcrypt, thread dedicati al calcolo degli hash, operazioni ammesse in coda
+    # e secondi di attesa per un posto in coda prima di rifiutare la richiesta
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+    BCRYPT_MAX_PENDING = int(os.environ.get('BCRYPT_MAX_PENDING', 32))
+    BCRYPT_ACQUIRE_TIMEOUT = float(os.environ.get('BCRYPT_ACQUIRE_TIMEOUT', 5))
+    
+    # Cache degli utenti: numero massimo di voci e durata in secondi
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    
+    # Cache per utente di categorie e mesi: numero massimo di utenti e durata in secondi
+    META_CACHE_SIZE = int(os.environ.get('META_CACHE_SIZE', 1024))
+    META_CACHE_TTL = int(os.environ.get('META_CACHE_TTL', 300))
+    
+    # Cache delle pagine già generate (elenco e report): "memory" (nel processo), "filesystem" (directory
+    # PAGE_CACHE_DIR condivisa fra più processi) oppure "none"; PAGE_CACHE_MAX_BYTES è lo spazio massimo occupato
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory').lower()
+    PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR', os.path.join('data', 'page_cache'))
+    
+    # Compressione delle risposte (gzip, e brotli se installato): livello gzip (1-9), qualità brotli (0-11)
+    # e dimensione minima in byte sotto la quale la risposta viene inviata così com'è
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'True').lower() in ('true', '1', 't')
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+    # Secondi di cache nel browser per i file statici richiesti con l'impronta del contenuto (?v=...)
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 365 * 24 * 3600))
+    
+    # Server di produzione (gunicorn.conf.py): indirizzo di ascolto, processi worker (default uno per CPU),
+    # thread per worker e secondi concessi alle richieste in corso per terminare quando il server viene arrestato.
+    # Ogni worker ha il proprio pool: le connessioni al database possono arrivare a WEB_WORKERS × (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW).
+    WEB_BIND = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 4))
+    WEB_GRACEFUL_TIMEOUT = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+    
+    # Metriche in formato Prometheus su /metrics. /metrics e /stats/* rispondono solo con METRICS_TOKEN impostato,
+    # a chi presenta "Authorization: Bearer <token>"; senza token sono disattivati
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() in ('true', '1', 't')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    # Con più processi (gunicorn) ogni worker scrive le proprie metriche in METRICS_DIR ogni METRICS_DUMP_INTERVAL
+    # secondi e /metrics le riporta tutte con l'etichetta pid; vuota = solo le metriche del processo che risponde
+    METRICS_DIR = os.environ.get('METRICS_DIR', '')
+    METRICS_DUMP_INTERVAL = float(os.environ.get('METRICS_DUMP_INTERVAL', 5))
+    # Millisecondi oltre i quali una query viene scritta nel log delle query lente (0 per disattivarlo)
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+    # Livello dei messaggi di log (DEBUG, INFO, WARNING, ERROR)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    
+    # Numero di spese mostrate per pagina negli elenchi
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50))
+    
+    # Numero di righe lette dal database per ogni blocco durante l'esportazione CSV e le pagine in streaming
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+    
+    # Byte di HTML accumulati prima di ogni invio al client nelle pagine generate in streaming
+    STREAM_BUFFER_SIZE = int(os.environ.get('STREAM_BUFFER_SIZE', 16 * 1024))
+    
+    # Numero di righe inserite con ogni INSERT multi-riga durante l'importazione CSV
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+    
+    # Directory dove vengono salvati eventuali file CSV esportati o di backup.
+    CSV_DIR = os.environ.get('CSV_DIR', 'data')
+    
+    # Soglia (in byte) oltre la quale il journal delle modifiche viene compattato nello snapshot CSV.
+    CSV_JOURNAL_MAX_BYTES = int(os.environ.get('CSV_JOURNAL_MAX_BYTES', 1024 * 1024))
+    
+    # Sincronizzazione CSV in background: "thread" (default), "process" oppure "sync" (immediata, nella richiesta).
+    CSV_SYNC_MODE = os.environ.get('CSV_SYNC_MODE', 'thread').lower()
+    # Numero massimo di modifiche in attesa di essere scritte prima che le richieste vengano messe in attesa.
+    CSV_SYNC_MAX_PENDING = int(os.environ.get('CSV_SYNC_MAX_PENDING', 10000))
+    # Secondi di attesa prima del flush, per raccogliere in un'unica scrittura le modifiche ravvicinate.
+    CSV_SYNC_DELAY = float(os.environ.get('CSV_SYNC_DELAY', 0.5))
+    
+    @classmethod
+    def init_app(cls):
+        # Pattern utile in fase di scrittura/lettura file per assicurarsi che la dir per i CSV esista.
+        if not os.path.exists(cls.CSV_DIR):
             os.makedirs(cls.CSV_DIR)
\ No newline at end of file
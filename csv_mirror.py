@@ -0,0 +1,240 @@
+import os
+import csv
+import tempfile
+import threading
+from contextlib import contextmanager
+from config import Config
+
+# I worker di gunicorn (e i loro thread di csv_sync) scrivono sugli stessi file: i lock per utente
+# sono anche lock su file (flock), dove disponibili. Senza fcntl (Windows) valgono solo tra i thread del processo.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+FIELDNAMES = ['id', 'user_id', 'data', 'categoria', 'descrizione', 'importo']
+JOURNAL_FIELDNAMES = ['op'] + FIELDNAMES
+
+OP_INSERT = 'insert'
+OP_UPDATE = 'update'
+OP_DELETE = 'delete'
+
+# Lock per utente: serializzano append, compattazione e lettura sugli stessi file (vedi _locked).
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _get_lock(user_id, name='files'):
+    with _locks_guard:
+        lock = _locks.get((name, user_id))
+        if lock is None:
+            lock = _locks[(name, user_id)] = threading.Lock()
+        return lock
+
+
+def _get_lock_path(user_id, name='files'):
+    return os.path.join(Config.CSV_DIR, f"spese_{user_id}.{name}.lock")
+
+
+@contextmanager
+def _locked(user_id):
+    """Lock esclusivo sui file di un utente, tra i thread del processo e tra processi diversi"""
+    with _get_lock(user_id):
+        if fcntl is None:
+            yield
+            return
+        # Il lock è rilasciato alla chiusura del file, anche se il processo termina all'improvviso
+        with open(_get_lock_path(user_id), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+
+@contextmanager
+def _try_compaction_lock(user_id):
+    """
+    Lock della compattazione, preso senza attendere: restituisce False se un altro thread o processo
+    sta già compattando il journal dell'utente. Un journal congelato rimasto senza lock appartiene
+    a una compattazione interrotta e può essere ripreso.
+    """
+    lock = _get_lock(user_id, 'compact')
+    if not lock.acquire(blocking=False):
+        yield False
+        return
+    try:
+        if fcntl is None:
+            yield True
+            return
+        with open(_get_lock_path(user_id, 'compact'), 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+    finally:
+        lock.release()
+
+
+def get_snapshot_path(user_id):
+    """Restituisce il percorso dello snapshot CSV di un utente"""
+    return os.path.join(Config.CSV_DIR, f"spese_{user_id}.csv")
+
+
+def get_journal_path(user_id):
+    """Restituisce il percorso del journal delle modifiche di un utente"""
+    return os.path.join(Config.CSV_DIR, f"spese_{user_id}.journal.csv")
+
+
+def _get_compacting_path(user_id):
+    # Journal "congelato" durante la compattazione: le nuove modifiche continuano ad andare nel journal principale.
+    return os.path.join(Config.CSV_DIR, f"spese_{user_id}.journal.compacting.csv")
+
+
+def has_snapshot(user_id):
+    """Indica se per l'utente esiste già uno snapshot da cui partire"""
+    return os.path.exists(get_snapshot_path(user_id))
+
+
+def _sort_key(row):
+    return (row.get('data') or '', int(row['id']))
+
+
+def _read_snapshot(path):
+    state = {}
+    if os.path.exists(path):
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get('id'):
+                    state[row['id']] = row
+    return state
+
+
+def _replay(path, state):
+    """
+    Applica al dizionario id -> riga i record di un journal.
+    Ogni record contiene lo stato completo della riga, quindi il replay è idempotente:
+    riapplicare lo stesso journal più volte porta sempre allo stesso risultato.
+    """
+    if not os.path.exists(path):
+        return state
+
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        for record in csv.DictReader(f):
+            op = record.pop('op', None)
+            row_id = record.get('id')
+            if not row_id:
+                continue
+            if op == OP_DELETE:
+                state.pop(row_id, None)
+            elif op in (OP_INSERT, OP_UPDATE):
+                state[row_id] = record
+    return state
+
+
+def _write_rows(path, rows):
+    # Scrittura atomica: il file temporaneo sostituisce lo snapshot solo a scrittura completata.
+    # Il nome è unico, così due processi non scrivono mai sullo stesso file temporaneo.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with open(fd, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES, extrasaction='ignore')
+            writer.writeheader()
+            for row in sorted(rows, key=_sort_key, reverse=True):
+                writer.writerow(row)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_rows(user_id):
+    """
+    Ricostruisce lo stato corrente delle spese di un utente:
+    legge lo snapshot e riapplica in ordine l'eventuale journal in compattazione e il journal corrente.
+    Le righe sono restituite ordinate per data decrescente, come in Spesa.get_all.
+    """
+    with _locked(user_id):
+        state = _read_snapshot(get_snapshot_path(user_id))
+        _replay(_get_compacting_path(user_id), state)
+        _replay(get_journal_path(user_id), state)
+
+    return sorted(state.values(), key=_sort_key, reverse=True)
+
+
+def write_snapshot(user_id, rows):
+    """Riscrive da zero lo snapshot di un utente e azzera il journal"""
+    with _locked(user_id):
+        _write_rows(get_snapshot_path(user_id), rows)
+        for path in (get_journal_path(user_id), _get_compacting_path(user_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def invalidate(user_id):
+    """
+    Elimina snapshot e journal di un utente.
+    Usato quando una scrittura fallisce: alla modifica successiva lo snapshot viene ricreato dal database.
+    """
+    with _locked(user_id):
+        for path in (get_snapshot_path(user_id), get_journal_path(user_id), _get_compacting_path(user_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def append(user_id, records):
+    """
+    Aggiunge in coda al journal una lista di record (op, riga).
+    Costa O(1) rispetto allo storico dell'utente. Restituisce la dimensione del journal in byte.
+    """
+    path = get_journal_path(user_id)
+    with _locked(user_id):
+        is_new = not os.path.exists(path)
+        with open(path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=JOURNAL_FIELDNAMES, extrasaction='ignore')
+            if is_new:
+                writer.writeheader()
+            for op, row in records:
+                writer.writerow(dict(row, op=op))
+        return os.path.getsize(path)
+
+
+def flush(user_id, records):
+    """Scrive i record nel journal e lo compatta se supera Config.CSV_JOURNAL_MAX_BYTES"""
+    if records and append(user_id, records) >= Config.CSV_JOURNAL_MAX_BYTES:
+        compact(user_id)
+
+
+def compact(user_id):
+    """
+    Consolida il journal nello snapshot.
+    Il journal viene "congelato" rinominandolo, così le scritture concorrenti possono proseguire
+    su un journal nuovo mentre lo snapshot viene ricalcolato fuori dal lock.
+    Una sola compattazione per utente alla volta: se ce n'è già una in corso restituisce False.
+    """
+    journal_path = get_journal_path(user_id)
+    compacting_path = _get_compacting_path(user_id)
+    snapshot_path = get_snapshot_path(user_id)
+
+    with _try_compaction_lock(user_id) as acquired:
+        if not acquired:
+            return False
+
+        with _locked(user_id):
+            # Un journal congelato rimasto da una compattazione interrotta viene consolidato prima di quello corrente.
+            if not os.path.exists(compacting_path):
+                if not os.path.exists(journal_path):
+                    return False
+                os.replace(journal_path, compacting_path)
+
+        state = _replay(compacting_path, _read_snapshot(snapshot_path))
+
+        with _locked(user_id):
+            if not os.path.exists(compacting_path):
+                # Snapshot riscritto da zero (o eliminato) nel frattempo: il risultato della compattazione è obsoleto.
+                return False
+            _write_rows(snapshot_path, state.values())
+            os.remove(compacting_path)
+
+    return True
+
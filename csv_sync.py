@@ -0,0 +1,255 @@
+import os
+import time
+import atexit
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import csv_mirror
+import metrics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MODE_THREAD = 'thread'
+MODE_PROCESS = 'process'
+MODE_SYNC = 'sync'
+
+# Stato condiviso tra le richieste e il worker, protetto da un'unica Condition.
+#   _pending:  user_id -> {id spesa: (op, riga)}; per ogni spesa resta solo l'ultima modifica,
+#              così una raffica di modifiche dello stesso utente diventa un unico flush.
+#   _rebuilds: user_id -> funzione che rilegge dal database tutte le spese dell'utente.
+#   _dirty:    coda FIFO degli utenti da sincronizzare, con l'istante in cui sono diventati "sporchi".
+_cond = threading.Condition()
+_pending = {}
+_rebuilds = {}
+_dirty = deque()
+_dirty_users = set()
+_in_flight = set()
+_pending_count = 0
+_waiters = 0
+_stopping = False
+
+_worker = None
+_executor = None
+
+
+def _get_mode():
+    return Config.CSV_SYNC_MODE if Config.CSV_SYNC_MODE in (MODE_THREAD, MODE_PROCESS, MODE_SYNC) else MODE_THREAD
+
+
+def _call(fn, *args):
+    # In modalità "process" le scritture su file avvengono in un processo dedicato.
+    if _executor is not None:
+        try:
+            future = _executor.submit(fn, *args)
+        except RuntimeError:
+            # Con l'interprete in chiusura il pool non accetta più lavoro: si scrive direttamente.
+            return fn(*args)
+        return future.result()
+    return fn(*args)
+
+
+def _observe(operazione, start, user_id):
+    if not metrics.enabled:
+        return
+
+    sizes = {}
+    paths = {'snapshot': csv_mirror.get_snapshot_path(user_id), 'journal': csv_mirror.get_journal_path(user_id)}
+    for file, path in paths.items():
+        try:
+            sizes[file] = os.path.getsize(path)
+        except OSError:
+            pass
+    metrics.observe_csv_sync(operazione, time.perf_counter() - start, sizes)
+
+
+def _flush_user(user_id, records, loader):
+    """Scrive su disco le modifiche accumulate per un utente"""
+    try:
+        if loader is not None:
+            start = time.perf_counter()
+            rows = [spesa.to_csv_dict() for spesa in loader()]
+            _call(csv_mirror.write_snapshot, user_id, rows)
+            _observe('rebuild', start, user_id)
+        if records:
+            start = time.perf_counter()
+            _call(csv_mirror.flush, user_id, list(records.values()))
+            _observe('flush', start, user_id)
+    except Exception as e:
+        logger.error("Errore sincronizzazione CSV: %s", e)
+        # Meglio nessun backup che un backup incoerente: il prossimo salvataggio lo ricrea dal database.
+        try:
+            _call(csv_mirror.invalidate, user_id)
+        except Exception:
+            pass
+
+
+def _ensure_worker():
+    global _worker, _executor
+
+    if _worker is not None and _worker.is_alive():
+        return
+
+    if _get_mode() == MODE_PROCESS and _executor is None:
+        # "spawn" evita che il processo figlio erediti lock acquisiti da altri thread al momento del fork.
+        _executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+
+    _worker = threading.Thread(target=_run, name='csv-sync', daemon=True)
+    _worker.start()
+
+
+def _mark_dirty(user_id):
+    if user_id not in _dirty_users:
+        _dirty_users.add(user_id)
+        _dirty.append((user_id, time.monotonic()))
+        _cond.notify_all()
+
+
+def record(user_id, op, row):
+    """
+    Registra una modifica da sincronizzare sul CSV dell'utente.
+    Se la coda ha raggiunto Config.CSV_SYNC_MAX_PENDING modifiche, il chiamante attende
+    che il worker liberi spazio (backpressure) invece di far crescere la memoria senza limiti.
+    """
+    global _pending_count
+
+    if _get_mode() == MODE_SYNC:
+        _flush_user(user_id, {row['id']: (op, row)}, None)
+        return
+
+    with _cond:
+        _ensure_worker()
+
+        user_pending = _pending.setdefault(user_id, {})
+        if row['id'] not in user_pending:
+            _cond.wait_for(lambda: _pending_count < Config.CSV_SYNC_MAX_PENDING or _stopping)
+            user_pending = _pending.setdefault(user_id, {})
+            if row['id'] not in user_pending:
+                _pending_count += 1
+
+        # Le chiavi vengono reinserite per mantenere l'ordine dell'ultima modifica.
+        user_pending.pop(row['id'], None)
+        user_pending[row['id']] = (op, row)
+        _mark_dirty(user_id)
+
+
+def request_rebuild(user_id, loader):
+    """
+    Richiede la riscrittura completa dello snapshot di un utente.
+    loader viene chiamato dal worker e deve restituire le spese correnti dell'utente;
+    le modifiche ancora in coda sono già incluse nella rilettura e vengono scartate.
+    """
+    global _pending_count
+
+    if _get_mode() == MODE_SYNC:
+        _flush_user(user_id, None, loader)
+        return
+
+    with _cond:
+        _ensure_worker()
+        _pending_count -= len(_pending.pop(user_id, {}))
+        _rebuilds[user_id] = loader
+        _mark_dirty(user_id)
+
+
+def _run():
+    global _pending_count
+
+    while True:
+        with _cond:
+            while True:
+                if _dirty:
+                    user_id, dirty_since = _dirty[0]
+                    # Attesa di coalescenza: si lascia tempo alle modifiche ravvicinate di accumularsi.
+                    delay = dirty_since + Config.CSV_SYNC_DELAY - time.monotonic()
+                    if delay <= 0 or _waiters or _stopping:
+                        break
+                    _cond.wait(delay)
+                elif _stopping:
+                    return
+                else:
+                    _cond.wait()
+
+            _dirty.popleft()
+            _dirty_users.discard(user_id)
+            records = _pending.pop(user_id, None)
+            loader = _rebuilds.pop(user_id, None)
+            _pending_count -= len(records or ())
+            _in_flight.add(user_id)
+            _cond.notify_all()
+
+        try:
+            _flush_user(user_id, records, loader)
+        finally:
+            with _cond:
+                _in_flight.discard(user_id)
+                _cond.notify_all()
+
+
+def is_idle():
+    """Indica se non ci sono modifiche in coda né flush in corso"""
+    with _cond:
+        return not _dirty and not _in_flight
+
+
+def wait_idle(timeout=None):
+    """
+    Attende che il worker abbia scritto tutte le modifiche in coda (utile nei test).
+    Durante l'attesa il ritardo di coalescenza viene ignorato. Restituisce False se scade il timeout.
+    """
+    global _waiters
+
+    with _cond:
+        _waiters += 1
+        _cond.notify_all()
+        try:
+            return _cond.wait_for(lambda: not _dirty and not _in_flight, timeout)
+        finally:
+            _waiters -= 1
+
+
+def shutdown(timeout=None):
+    """Scrive tutte le modifiche ancora in coda e arresta il worker"""
+    global _stopping, _worker, _executor
+
+    with _cond:
+        _stopping = True
+        _cond.notify_all()
+
+    if _worker is not None:
+        _worker.join(timeout)
+        _worker = None
+
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+    with _cond:
+        _stopping = False
+
+
+def _after_fork():
+    """
+    Il processo figlio di un fork riparte con la coda vuota: le modifiche in attesa appartengono al padre,
+    che le scriverà, e il thread worker (o il processo dedicato) non esiste nel figlio.
+    """
+    global _cond, _pending_count, _waiters, _stopping, _worker, _executor
+
+    _cond = threading.Condition()
+    _pending.clear()
+    _rebuilds.clear()
+    _dirty.clear()
+    _dirty_users.clear()
+    _in_flight.clear()
+    _pending_count = 0
+    _waiters = 0
+    _stopping = False
+    _worker = None
+    _executor = None
+
+
+atexit.register(shutdown)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
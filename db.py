@@ -1,80 +1,510 @@
-import mysql.connector
-from mysql.connector import pooling
-from config import Config
-
-db_pool = None
-
-def init_db_pool():
-    """
-    Inizializza il pool di connessioni MySQL solo se non è già stato creato.
-    Questo pattern evita di aprire nuove connessioni ad ogni richiesta, riducendo il carico sul database e velocizzando le operazioni.
-    """
-    global db_pool
-    
-    if db_pool is None:
-        db_pool = mysql.connector.pooling.MySQLConnectionPool(
-            pool_name="shopping_tracker_pool",
-            pool_size=5, 
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            user=Config.DB_USER,
-            password=Config.DB_PASS,
-            database=Config.DB_NAME
-        )
-    
-    return db_pool
-
-def get_connection():
-    """
-    Restituisce una connessione dal pool.
-    Se il pool non è ancora stato inizializzato, lo crea automaticamente.
-    """
-    if db_pool is None:
-        init_db_pool()
-    
-    return db_pool.get_connection()
-
-def execute_query(query, params=None, fetch=False, commit=False):
-    """
-    Esegue una query SQL parametrizzata in modo sicuro e gestisce automaticamente le transazioni.
-    Argomenti:
-        query (str): Query SQL da eseguire.
-        params (tuple, opzionale): Parametri da passare alla query per evitare SQL injection.
-        fetch (bool): Se True, restituisce i risultati della query (per SELECT).
-        commit (bool): Se True, effettua il commit della transazione (per INSERT/UPDATE/DELETE).
-    Ritorna:
-        list o int: Risultati della query (lista di dizionari) o ID dell'ultima riga inserita.
-    """
-    conn = None
-    cursor = None
-    result = None
-    
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        
-        if fetch:
-            result = cursor.fetchall()
-        
-        if commit:
-            conn.commit()
-            if cursor.lastrowid:
-                result = cursor.lastrowid
-        
-        return result
-    
-    except Exception as e:
-        if conn and commit:
-            conn.rollback()  
-        raise e
-    
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
\ No newline at end of file
+import os
+import time
+import logging
+import weakref
+import threading
+from contextlib import contextmanager
+from flask import g, has_app_context, has_request_context, session
+from config import Config
+from backends import create_backend
+import metrics
+from pool import PoolTimeoutError, ReplicaSet
+
+# Backend scelto con Config.DB_BACKEND ("mysql" o "sqlite"): apre le connessioni e fornisce
+# i frammenti SQL specifici del database (vedi backends.py).
+backend = create_backend()
+
+logger = logging.getLogger(__name__)
+
+db_pool = None
+# Pool delle repliche in sola lettura (Config.DB_REPLICAS), None se non ce ne sono
+replica_set = None
+_pool_lock = threading.Lock()
+
+# Chiave di sessione con l'istante (time.time()) fino al quale l'utente legge dal primario
+PRIMARY_UNTIL_KEY = '_db_primary_until'
+
+# Cursori preparati per ogni connessione fisica: spariscono insieme alla connessione quando il pool la chiude.
+_prepared_cursors = weakref.WeakKeyDictionary()
+
+# Stato della unit of work per i thread che non hanno un contesto Flask (worker, script).
+_local = threading.local()
+
+
+class _Scope:
+    """Connessione condivisa da più query e profondità delle transazioni aperte su di essa"""
+    
+    def __init__(self):
+        self.conn = None
+        self.depth = 0
+        # Connessione a una replica per le letture e indice della replica scelta: le letture della richiesta,
+        # stream compresi, vanno tutte alla stessa replica invece che a repliche con ritardi diversi.
+        # Ogni SELECT in autocommit legge comunque il proprio snapshot: fra una query e l'altra la replica può avanzare.
+        self.read_conn = None
+        self.replica = None
+        # Dopo una scrittura anche le letture della stessa unit of work vanno al primario
+        self.pinned = False
+    
+    def get_connection(self):
+        if self.conn is None:
+            self.conn = get_connection()
+            # Fuori dalle transazioni esplicite ogni istruzione viene confermata subito,
+            # così le letture successive vedono sempre i dati aggiornati.
+            self.conn.autocommit = True
+        return self.conn
+    
+    def get_read_connection(self):
+        """Connessione per una SELECT fuori transazione: una replica se possibile, altrimenti quella del primario"""
+        if self.pinned or self.depth or not use_replicas():
+            return self.get_connection()
+        
+        if self.read_conn is None:
+            self.read_conn = self._get_replica_connection()
+            if self.read_conn is None:
+                return self.get_connection()
+            self.read_conn.autocommit = True
+        return self.read_conn
+    
+    def get_stream_connection(self):
+        """
+        Connessione separata per uno stream (il cursore non bufferizzato la occupa fino alla fine):
+        dalla stessa replica delle altre letture della richiesta, oppure dal primario.
+        """
+        if self.pinned or self.depth or not use_replicas():
+            return get_connection()
+        return self._get_replica_connection() or get_connection()
+    
+    def _get_replica_connection(self):
+        conn = get_replica_connection(self.replica)
+        if conn is not None and self.replica is None:
+            self.replica = replica_set.index_of(conn)
+        return conn
+    
+    def close(self):
+        if self.read_conn is not None:
+            try:
+                self.read_conn.autocommit = False
+            finally:
+                self.read_conn.close()
+                self.read_conn = None
+        
+        if self.conn is None:
+            return
+        
+        try:
+            if self.depth:
+                self.conn.rollback()
+            self.conn.autocommit = False
+        finally:
+            self.conn.close()
+            self.conn = None
+            self.depth = 0
+
+def init_db_pool():
+    """
+    Inizializza il pool di connessioni solo se non è già stato creato.
+    Questo pattern evita di aprire nuove connessioni ad ogni richiesta, riducendo il carico sul database e velocizzando le operazioni.
+    Con MySQL dimensione, overflow e timeout di attesa si configurano in Config (DB_POOL_*): quando tutte le connessioni
+    sono occupate le richieste attendono in coda invece di fallire subito. Con SQLite ogni thread riusa la propria connessione.
+    """
+    global db_pool, replica_set
+    
+    if db_pool is None:
+        with _pool_lock:
+            if db_pool is None:
+                if Config.DB_REPLICAS:
+                    replica_set = ReplicaSet(
+                        [backend.create_pool(replica) for replica in Config.DB_REPLICAS],
+                        names=Config.DB_REPLICAS,
+                        retry_after=Config.DB_REPLICA_RETRY_AFTER
+                    )
+                db_pool = backend.create_pool()
+    
+    return db_pool
+
+def warm_up(connections=None):
+    """
+    Apre in anticipo le connessioni al primario (connections, default le connessioni stabili del pool:
+    DB_POOL_SIZE con MySQL, quella del thread corrente con SQLite) e una per replica, così le prime
+    richieste di un processo appena avviato non pagano la connessione al database.
+    Restituisce il numero di connessioni aperte e verificate.
+    """
+    pool = init_db_pool()
+    pools = [(pool, connections or getattr(pool, 'size', 1))]
+    if replica_set is not None:
+        pools.append((replica_set, len(replica_set)))
+    
+    opened = 0
+    for target, count in pools:
+        borrowed = []
+        try:
+            # Prese insieme e poi restituite: restano aperte nel pool
+            for _ in range(count):
+                conn = target.get_connection()
+                borrowed.append(conn)
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+                cursor.close()
+                opened += 1
+        finally:
+            for conn in borrowed:
+                conn.close()
+    
+    return opened
+
+def dispose():
+    """Chiude tutte le connessioni inattive del primario e delle repliche (ad esempio allo spegnimento del processo)"""
+    if db_pool is not None:
+        db_pool.close_all()
+    if replica_set is not None:
+        replica_set.close_all()
+
+def _after_fork():
+    """
+    Nel processo figlio di un fork (server con più processi e app precaricata) il pool ereditato non si usa:
+    le sue connessioni condividono il socket con il padre. Vengono solo dimenticate, senza chiuderle,
+    perché la chiusura invierebbe al server la disconnessione anche per il padre; il figlio crea il proprio pool.
+    """
+    global db_pool, replica_set, _pool_lock, _local, _prepared_cursors
+    
+    _inherited.append((db_pool, replica_set, _prepared_cursors))
+    db_pool = None
+    replica_set = None
+    _pool_lock = threading.Lock()
+    _local = threading.local()
+    _prepared_cursors = weakref.WeakKeyDictionary()
+
+# Pool ereditati dal padre: tenuti in vita perché il garbage collector non chiuda le loro connessioni
+_inherited = []
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+def get_connection():
+    """
+    Restituisce una connessione dal pool.
+    Se il pool non è ancora stato inizializzato, lo crea automaticamente.
+    """
+    if db_pool is None:
+        init_db_pool()
+    
+    return db_pool.get_connection()
+
+def get_replica_connection(replica=None):
+    """
+    Restituisce una connessione alla replica di indice replica o, se non indicata, a una replica
+    scelta a turno fra quelle raggiungibili,
+    oppure None se non ci sono repliche configurate o nessuna ha subito una connessione libera:
+    in quel caso si legge dal primario.
+    """
+    if db_pool is None:
+        init_db_pool()
+    
+    if replica_set is None:
+        return None
+    
+    try:
+        # Senza attesa: con le repliche sature conviene leggere subito dal primario invece di attendere
+        # DB_POOL_TIMEOUT secondi su ognuna.
+        return replica_set.get_connection(timeout=0, replica=replica)
+    except PoolTimeoutError:
+        # Repliche già escluse o sature: niente da segnalare a ogni query
+        return None
+    except Exception as e:
+        logger.warning("Replica non raggiungibile, lettura dal primario: %s", e)
+        return None
+
+def use_replicas():
+    """
+    Indica se le letture correnti possono andare a una replica: solo durante una richiesta
+    (i worker in background leggono spesso dati appena scritti) e se la sessione non è vincolata al primario.
+    """
+    if replica_set is None or not has_request_context():
+        return False
+    return session.get(PRIMARY_UNTIL_KEY, 0) <= time.time()
+
+def pin_primary():
+    """
+    Dopo una scrittura manda al primario le letture della unit of work corrente e, per
+    Config.DB_READ_YOUR_WRITES secondi, quelle delle richieste successive della stessa sessione:
+    la pagina a cui l'utente viene reindirizzato mostra le sue modifiche anche se le repliche sono in ritardo.
+    """
+    if replica_set is None:
+        return
+    
+    scope = _get_scope()
+    if scope is not None:
+        scope.pinned = True
+    
+    if has_request_context():
+        session[PRIMARY_UNTIL_KEY] = time.time() + Config.DB_READ_YOUR_WRITES
+
+def _get_scope():
+    """Restituisce la unit of work attiva: quella della richiesta Flask o quella aperta con unit_of_work()"""
+    if has_app_context():
+        if '_db_scope' not in g:
+            g._db_scope = _Scope()
+        return g._db_scope
+    
+    return getattr(_local, 'scope', None)
+
+def get_db():
+    """
+    Restituisce la connessione della unit of work corrente.
+    Durante una richiesta è sempre la stessa connessione, presa dal pool alla prima query
+    e restituita da close_db alla fine della richiesta. Fuori da Flask restituisce None
+    se non è attiva una unit_of_work().
+    """
+    scope = _get_scope()
+    return scope.get_connection() if scope else None
+
+def close_db(e=None):
+    """Restituisce al pool la connessione della richiesta (registrata con teardown_appcontext)"""
+    scope = g.pop('_db_scope', None)
+    
+    if scope is not None:
+        scope.close()
+
+def release_db():
+    """
+    Restituisce subito al pool le connessioni della unit of work corrente, senza chiuderla: una query successiva
+    ne prende di nuove (dalla stessa replica). Serve prima di una risposta in streaming, che tiene vivo il contesto
+    della richiesta finché il client non ha scaricato tutto. All'interno di una transazione non fa nulla.
+    """
+    scope = _get_scope()
+    
+    if scope is not None and not scope.depth:
+        scope.close()
+
+def init_app(app):
+    """Collega la gestione delle connessioni al ciclo di vita delle richieste dell'applicazione"""
+    app.teardown_appcontext(close_db)
+
+@contextmanager
+def unit_of_work():
+    """
+    Condivide una sola connessione fra tutte le query del blocco.
+    Serve ai thread senza contesto Flask (ad esempio i worker in background); durante una richiesta
+    la connessione è già condivisa e il blocco non cambia nulla.
+    """
+    if _get_scope() is not None:
+        yield get_db()
+        return
+    
+    _local.scope = _Scope()
+    try:
+        yield _local.scope.get_connection()
+    finally:
+        scope = _local.scope
+        _local.scope = None
+        scope.close()
+
+def _is_select(query):
+    return query.lstrip()[:6].upper() == 'SELECT'
+
+def _get_prepared_cursor(conn, query):
+    """
+    Restituisce un cursore con statement preparato lato server per query, riusato finché la connessione vive:
+    la query viene preparata una sola volta per connessione e le esecuzioni successive inviano solo i parametri.
+    """
+    raw = getattr(conn, 'raw_connection', conn)
+    cursors = _prepared_cursors.get(raw)
+    
+    if cursors is None:
+        cursors = _prepared_cursors[raw] = {}
+    
+    cursor = cursors.get(query)
+    if cursor is None:
+        cursor = cursors[query] = raw.cursor(prepared=True)
+    return cursor
+
+def _drop_prepared_cursor(conn, query):
+    raw = getattr(conn, 'raw_connection', conn)
+    cursor = _prepared_cursors.get(raw, {}).pop(query, None)
+    
+    if cursor is not None:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+def execute_query(query, params=None, fetch=False, commit=False, dictionary=True, prepared=False):
+    """
+    Esegue una query SQL parametrizzata in modo sicuro e gestisce automaticamente le transazioni.
+    Se è attiva una unit of work (sempre, durante una richiesta) usa la sua connessione;
+    all'interno di un blocco transaction() il commit viene rimandato alla fine del blocco.
+    Con le repliche configurate (Config.DB_REPLICAS) le SELECT fuori transazione vengono lette da una replica,
+    a meno che la sessione non abbia scritto da poco (vedi pin_primary).
+    Argomenti:
+        query (str): Query SQL da eseguire.
+        params (tuple, opzionale): Parametri da passare alla query per evitare SQL injection.
+        fetch (bool): Se True, restituisce i risultati della query (per SELECT).
+        commit (bool): Se True, effettua il commit della transazione (per INSERT/UPDATE/DELETE).
+        dictionary (bool): Se False le righe sono tuple nell'ordine delle colonne della SELECT (più leggere dei dizionari).
+        prepared (bool): Se True (e Config.DB_PREPARED_STATEMENTS è attivo) usa uno statement preparato lato server,
+            riusato per la stessa query sulla stessa connessione. Le righe sono sempre tuple.
+            Con SQLite viene ignorato: sqlite3 tiene già in cache gli statement compilati di ogni connessione.
+    Ritorna:
+        list o int: Risultati della query (lista di dizionari o tuple) o ID dell'ultima riga inserita.
+    """
+    scope = _get_scope()
+    in_transaction = scope is not None and scope.depth > 0
+    prepared = prepared and Config.DB_PREPARED_STATEMENTS and backend.supports_prepared
+    # Le SELECT fuori transazione possono andare a una replica; tutto il resto al primario
+    read_only = fetch and not commit and _is_select(query)
+    conn = None
+    cursor = None
+    result = None
+    # Il tempo di attesa per la connessione è misurato dal pool: qui si cronometra solo la query.
+    timed = metrics.is_timing()
+    
+    if commit:
+        pin_primary()
+    
+    try:
+        if scope:
+            conn = scope.get_read_connection() if read_only else scope.get_connection()
+        else:
+            conn = get_connection()
+        cursor = _get_prepared_cursor(conn, query) if prepared else conn.cursor(dictionary=dictionary)
+        start = time.perf_counter() if timed else 0
+        
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        
+        if fetch:
+            result = cursor.fetchall()
+        
+        if timed:
+            metrics.observe_query(query, time.perf_counter() - start, len(result) if fetch else cursor.rowcount)
+        
+        if commit:
+            if not in_transaction:
+                conn.commit()
+            if cursor.lastrowid:
+                result = cursor.lastrowid
+        
+        return result
+    
+    except Exception as e:
+        if timed:
+            metrics.observe_query_error(query)
+        if prepared and conn:
+            _drop_prepared_cursor(conn, query)
+            cursor = None
+        if conn and commit and not in_transaction:
+            conn.rollback()  
+        raise e
+    
+    finally:
+        if cursor and not prepared:
+            cursor.close()
+        if conn and not scope:
+            conn.close()
+
+@contextmanager
+def transaction():
+    """
+    Apre una transazione sulla connessione della unit of work corrente e restituisce un cursore (a dizionario).
+    Tutte le query del blocco, sia con il cursore sia con execute_query, vengono confermate insieme con un unico
+    commit, oppure annullate con un rollback se il blocco solleva un'eccezione.
+    I blocchi annidati diventano savepoint: un errore in un blocco interno annulla solo le sue modifiche.
+    
+    Esempio:
+        with transaction() as cursor:
+            cursor.execute(query1, params1)
+            with transaction() as inner:
+                inner.execute(query2, params2)
+    """
+    if _get_scope() is None:
+        with unit_of_work():
+            with transaction() as cursor:
+                yield cursor
+        return
+    
+    scope = _get_scope()
+    conn = scope.get_connection()
+    savepoint = f"sp_{scope.depth}" if scope.depth else None
+    # Le transazioni servono solo a scrivere: da qui in poi la sessione legge dal primario
+    pin_primary()
+    # Cursore bufferizzato: le righe lette con fetchone() non bloccano le query successive sulla stessa connessione.
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    
+    if savepoint:
+        cursor.execute(f"SAVEPOINT {savepoint}")
+    else:
+        conn.start_transaction()
+    scope.depth += 1
+    
+    try:
+        yield cursor
+        
+        if savepoint:
+            cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+        else:
+            conn.commit()
+    
+    except Exception as e:
+        if savepoint:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+        else:
+            conn.rollback()
+        raise e
+    
+    finally:
+        scope.depth -= 1
+        cursor.close()
+
+def stream_query(query, params=None, chunk_size=1000, dictionary=True):
+    """
+    Esegue una SELECT con un cursore non bufferizzato e restituisce le righe a blocchi
+    (liste di dizionari, o di tuple se dictionary è False).
+    Le righe vengono lette dal server man mano che il generatore viene consumato, quindi la memoria usata
+    non dipende dal numero di righe. La connessione torna al pool quando il generatore termina o viene chiuso
+    (ad esempio perché il client ha interrotto il download).
+    Se ci sono repliche e la sessione non è vincolata al primario, le righe vengono lette dalla stessa replica
+    usata dalle altre query della richiesta.
+    """
+    scope = _get_scope()
+    conn = scope.get_stream_connection() if scope else get_connection()
+    cursor = None
+    timed = metrics.is_timing()
+    start = time.perf_counter() if timed else 0
+    total = 0
+    
+    try:
+        cursor = conn.cursor(dictionary=dictionary, buffered=False)
+        
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            total += len(rows)
+            yield rows
+        
+        # La durata comprende anche il tempo in cui il client consuma le righe.
+        if timed:
+            metrics.observe_query(query, time.perf_counter() - start, total)
+    
+    except Exception:
+        if timed:
+            metrics.observe_query_error(query)
+        raise
+    
+    finally:
+        # Se lo stream si interrompe a metà, le righe non lette vanno scartate prima di riusare la connessione.
+        try:
+            conn.consume_results()
+        except Exception:
+            pass
+        if cursor:
+            cursor.close()
+        conn.close()
\ No newline at end of file
@@ -0,0 +1,67 @@
+import os
+import glob
+import time
+import tempfile
+from dotenv import load_dotenv
+
+# Avvio in produzione con gunicorn (Linux/macOS), che legge questo file dalla directory corrente:
+#     gunicorn
+# L'app viene importata una sola volta nel processo principale (preload_app), che poi crea WEB_WORKERS processi
+# con WEB_THREADS thread ciascuno. Ogni worker crea il proprio pool di connessioni dopo il fork (vedi db._after_fork)
+# e, prima di accettare richieste, apre le connessioni e compila i template (app.warm_up).
+# Con SIGTERM (o Ctrl+C) i worker smettono di accettare connessioni, completano le richieste in corso
+# entro WEB_GRACEFUL_TIMEOUT secondi, scrivono i CSV ancora in coda e chiudono le connessioni.
+_started = time.perf_counter()
+
+# In produzione DEBUG è disattivato, a meno che non venga impostato esplicitamente (anche nel file .env)
+load_dotenv()
+os.environ.setdefault('DEBUG', 'False')
+# Ogni worker ha i propri contatori: /metrics riporta quelli di tutti i worker leggendoli da METRICS_DIR.
+# Se più istanze girano sulla stessa macchina, ognuna deve avere la propria directory.
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'shopping_tracker_metrics'))
+
+from config import Config
+
+wsgi_app = 'app:app'
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS
+worker_class = 'gthread'
+threads = Config.WEB_THREADS
+preload_app = True
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+
+
+def on_starting(server):
+    # Le metriche dei worker di un avvio precedente non appartengono più a nessun processo
+    os.makedirs(Config.METRICS_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(Config.METRICS_DIR, '*.json')):
+        os.remove(path)
+
+
+def when_ready(server):
+    server.log.info("Applicazione caricata in %.0f ms, avvio di %d worker", (time.perf_counter() - _started) * 1000,
+                    server.num_workers)
+    if Config.DEBUG:
+        server.log.warning("DEBUG è attivo: non usarlo in produzione")
+
+
+def post_worker_init(worker):
+    # Chiamato nel worker dopo il fork e prima che inizi ad accettare connessioni
+    from app import warm_up
+    import metrics
+    warm_up(worker.wsgi)
+    metrics.start_dump_thread()
+
+
+def child_exit(server, worker):
+    # Chiamato nel processo principale: le metriche di un worker terminato spariscono da /metrics
+    import metrics
+    metrics.remove_snapshot(worker.pid)
+
+
+def worker_exit(server, worker):
+    # Le richieste in corso sono terminate: restano da scrivere i CSV in coda e da chiudere le connessioni
+    import csv_sync
+    import db
+    csv_sync.shutdown(Config.WEB_GRACEFUL_TIMEOUT)
+    db.dispose()
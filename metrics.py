@@ -0,0 +1,346 @@
+import os
+import re
+import hmac
+import json
+import time
+import bisect
+import logging
+import tempfile
+import threading
+from functools import lru_cache, wraps
+from flask import Response, g, request, abort
+from config import Config
+
+# Metriche dell'applicazione esposte in formato testo Prometheus su /metrics.
+# Con METRICS_ENABLED=False nessun hook viene registrato e execute_query non misura nulla:
+# il costo si riduce a un controllo di un attributo per query.
+enabled = Config.METRICS_ENABLED
+
+# Soglia (in secondi) oltre la quale una query viene scritta nel log delle query lente (0 = disattivato)
+slow_query_threshold = Config.SLOW_QUERY_MS / 1000
+
+slow_query_log = logging.getLogger('shopping_tracker.slow_query')
+
+# Con più worker (gunicorn) ogni processo ha i propri contatori e /metrics viene servito da un worker qualsiasi.
+# Con METRICS_DIR ogni worker scrive le proprie metriche in METRICS_DIR/<pid>.json ogni METRICS_DUMP_INTERVAL
+# secondi (vedi start_dump_thread) e /metrics le riporta tutte, distinte dall'etichetta pid.
+metrics_dir = Config.METRICS_DIR
+_dump_thread = None
+
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ROWS_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 10000, 100000)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
+_metrics = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in labels.items()]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contatore monotono con etichette"""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.name, 'counter', self.help, [('', dict(zip(self.labelnames, labels)), value) for labels, value in items]
+
+
+class Histogram:
+    """Istogramma con intervalli fissi ed etichette; i conteggi per intervallo vengono resi cumulativi solo in collect"""
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def collect(self):
+        with self._lock:
+            items = sorted((labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items())
+
+        samples = []
+        for labels, (counts, total, count) in items:
+            base = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', dict(base, le=str(bound)), cumulative))
+            samples.append(('_sum', base, total))
+            samples.append(('_count', base, count))
+        return self.name, 'histogram', self.help, samples
+
+
+query_duration = Histogram(
+    'db_query_duration_seconds', "Durata delle query eseguite con execute_query/stream_query", ('query',)
+)
+query_rows = Histogram(
+    'db_query_rows', "Righe lette (SELECT) o modificate dalle query", ('query',), buckets=ROWS_BUCKETS
+)
+query_errors = Counter('db_query_errors_total', "Query terminate con un errore", ('query',))
+slow_queries = Counter('db_slow_queries_total', "Query più lente di SLOW_QUERY_MS", ('query',))
+request_duration = Histogram(
+    'http_request_duration_seconds', "Durata delle richieste HTTP per route", ('method', 'route', 'status')
+)
+csv_sync_duration = Histogram(
+    'csv_sync_duration_seconds', "Durata delle scritture del backup CSV", ('operazione',)
+)
+csv_file_size = Histogram(
+    'csv_file_bytes', "Dimensione dei file CSV dopo ogni scrittura", ('file',), buckets=SIZE_BUCKETS
+)
+
+
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+(?:\.\d+)?\b|%s|\?")
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    """
+    Forma normalizzata di una query, usata come etichetta: spazi compattati, valori letterali e segnaposto
+    sostituiti da ?, liste IN (...) ridotte a una sola forma. Query che differiscono solo nei valori
+    hanno la stessa impronta.
+    """
+    normalized = _SPACE_RE.sub(' ', query).strip()
+    normalized = _LITERAL_RE.sub('?', normalized)
+    normalized = _IN_LIST_RE.sub('IN (...)', normalized)
+    return normalized[:300]
+
+
+def is_timing():
+    """Indica se le query vanno cronometrate (metriche attive o log delle query lente attivo)"""
+    return enabled or slow_query_threshold > 0
+
+
+def observe_query(query, seconds, rows):
+    """Registra durata e righe di una query e la scrive nel log se supera la soglia delle query lente"""
+    fp = fingerprint(query)
+
+    if enabled:
+        query_duration.observe(seconds, fp)
+        if rows is not None and rows >= 0:
+            query_rows.observe(rows, fp)
+
+    if slow_query_threshold and seconds >= slow_query_threshold:
+        if enabled:
+            slow_queries.inc(fp)
+        slow_query_log.warning("Query lenta (%.1f ms, %s righe): %s", seconds * 1000, rows, fp)
+
+
+def observe_query_error(query):
+    if enabled:
+        query_errors.inc(fingerprint(query))
+
+
+def observe_csv_sync(operazione, seconds, sizes):
+    """Registra la durata di una scrittura CSV e la dimensione dei file coinvolti ({'snapshot': byte, ...})"""
+    if not enabled:
+        return
+
+    csv_sync_duration.observe(seconds, operazione)
+    for file, size in sizes.items():
+        csv_file_size.observe(size, file)
+
+
+def add_collector(collector):
+    """
+    Registra una funzione chiamata a ogni lettura di /metrics, per i valori già tenuti altrove
+    (pool, cache...). Deve restituire tuple (nome, tipo, descrizione, campioni), dove ogni campione è
+    (suffisso, etichette, valore): il suffisso è '' oppure, per gli istogrammi, '_bucket', '_sum' e '_count'.
+    """
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def collect():
+    """Metriche del processo corrente come tuple (nome, tipo, descrizione, campioni), nel formato di add_collector"""
+    families = [metric.collect() for metric in _metrics]
+
+    for collector in _collectors:
+        try:
+            families.extend(collector())
+        except Exception as e:
+            logging.getLogger(__name__).warning("Errore lettura metriche: %s", e)
+
+    return families
+
+
+def _snapshot_path(pid):
+    return os.path.join(metrics_dir, f"{pid}.json")
+
+
+def write_snapshot():
+    """Scrive in METRICS_DIR le metriche del processo corrente, dove le legge il worker che risponde a /metrics"""
+    os.makedirs(metrics_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=metrics_dir, suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump(collect(), f)
+        os.replace(tmp_path, _snapshot_path(os.getpid()))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def remove_snapshot(pid):
+    """Elimina le metriche scritte da un worker terminato (vedi gunicorn.conf.child_exit)"""
+    try:
+        os.remove(_snapshot_path(pid))
+    except FileNotFoundError:
+        pass
+
+
+def _dump_loop():
+    while True:
+        try:
+            write_snapshot()
+        except Exception as e:
+            logging.getLogger(__name__).warning("Errore scrittura metriche in %s: %s", metrics_dir, e)
+        time.sleep(Config.METRICS_DUMP_INTERVAL)
+
+
+def start_dump_thread():
+    """Avvia nel worker il thread che scrive periodicamente le sue metriche in METRICS_DIR (se impostata)"""
+    global _dump_thread
+
+    if enabled and metrics_dir and _dump_thread is None:
+        _dump_thread = threading.Thread(target=_dump_loop, name='metrics-dump', daemon=True)
+        _dump_thread.start()
+
+
+def _collect_workers():
+    # Le metriche del processo corrente sono lette al momento, quelle degli altri worker dai loro file
+    # (vecchie al più di METRICS_DUMP_INTERVAL secondi); ogni campione riceve l'etichetta pid del suo processo.
+    pid = os.getpid()
+    per_pid = {pid: collect()}
+
+    names = os.listdir(metrics_dir) if os.path.isdir(metrics_dir) else []
+    for name in names:
+        other, ext = os.path.splitext(name)
+        if ext != '.json' or not other.isdigit() or int(other) == pid:
+            continue
+        try:
+            with open(os.path.join(metrics_dir, name), encoding='utf-8') as f:
+                per_pid[int(other)] = json.load(f)
+        except (OSError, ValueError):
+            # Worker appena terminato (file eliminato) o file illeggibile: sarà nella prossima lettura
+            continue
+
+    merged = {}
+    for worker_pid, families in sorted(per_pid.items()):
+        for name, kind, help, samples in families:
+            _, _, merged_samples = merged.setdefault(name, (kind, help, []))
+            merged_samples.extend(
+                (suffix, dict(labels, pid=str(worker_pid)), value) for suffix, labels, value in samples
+            )
+
+    return [(name, kind, help, samples) for name, (kind, help, samples) in merged.items()]
+
+
+def render():
+    """Restituisce tutte le metriche in formato testo Prometheus (di tutti i worker, con METRICS_DIR)"""
+    lines = []
+
+    for name, kind, help, samples in (_collect_workers() if metrics_dir else collect()):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+
+
+def _after_request(response):
+    start = g.pop('_metrics_start', None)
+
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'sconosciuta'
+        request_duration.observe(time.perf_counter() - start, request.method, route, str(response.status_code))
+
+    return response
+
+
+def token_required(f):
+    """
+    Protegge un endpoint di monitoraggio (/metrics, /stats/*): risponde solo a chi presenta
+    "Authorization: Bearer <METRICS_TOKEN>". Senza METRICS_TOKEN l'endpoint è disattivato (404):
+    latenze, forme delle query e stato dei pool non devono essere pubblici per dimenticanza.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not Config.METRICS_TOKEN:
+            abort(404)
+        # compare_digest accetta stringhe solo ASCII: con un header non ASCII solleverebbe TypeError (errore 500)
+        authorization = request.headers.get('Authorization', '').encode('utf-8')
+        if not hmac.compare_digest(authorization, f"Bearer {Config.METRICS_TOKEN}".encode('utf-8')):
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@token_required
+def metrics_view():
+    return Response(render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    """Registra gli hook che misurano le richieste e la route /metrics (solo se le metriche sono attive)"""
+    if not enabled:
+        return
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+def _after_fork():
+    # Il thread che scrive le metriche non esiste nel processo figlio: lo avvia start_dump_thread
+    global _dump_thread
+    _dump_thread = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
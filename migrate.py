@@ -0,0 +1,182 @@
+import os
+import re
+from datetime import date
+from config import Config
+from db import get_connection, execute_query, backend
+from models import Spesa, RiepilogoMensile, MetadatiSpese, VersioneDati, CURSOR_NEXT, CURSOR_PREV
+
+# Le migrazioni sono file NNNN_descrizione.sql, applicati in ordine di versione: migration/versions per MySQL,
+# migration/sqlite/versions per SQLite (stessi numeri di versione, sintassi del rispettivo database).
+# Con MySQL migration/init.sql resta lo script iniziale, eseguito a mano, che crea il database e le tabelle di base;
+# con SQLite lo schema di base (migration/sqlite/init.sql) viene creato da upgrade.
+MIGRATIONS_DIR = backend.migrations_dir
+
+_FILENAME_RE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+
+def list_migrations():
+    """Restituisce le migrazioni disponibili come lista ordinata di tuple (versione, nome, percorso)"""
+    migrations = []
+    
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _FILENAME_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    
+    return sorted(migrations)
+
+
+_TRIGGER_RE = re.compile(r'^CREATE\s+TRIGGER\b', re.IGNORECASE)
+_END_RE = re.compile(r'\bEND$', re.IGNORECASE)
+
+
+def split_statements(sql):
+    """
+    Divide uno script SQL nelle singole istruzioni, ignorando le righe di commento.
+    Il corpo di un CREATE TRIGGER (BEGIN ... END) contiene a sua volta dei ';' e resta un'unica istruzione.
+    """
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    statements = []
+    current = ''
+    
+    for part in '\n'.join(lines).split(';'):
+        current = f"{current};{part}" if current else part.strip()
+        if _TRIGGER_RE.match(current) and not _END_RE.search(current.strip()):
+            continue
+        if current.strip():
+            statements.append(current.strip())
+        current = ''
+    
+    if current.strip():
+        statements.append(current.strip())
+    
+    return statements
+
+
+def _run_script(cursor, path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for statement in split_statements(f.read()):
+            cursor.execute(statement)
+
+
+def _ensure_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+      version INT PRIMARY KEY,
+      nome VARCHAR(255) NOT NULL,
+      applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def get_applied():
+    """Restituisce l'insieme delle versioni già applicate"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        _ensure_table(cursor)
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def upgrade(target=None):
+    """
+    Applica in ordine le migrazioni non ancora eseguite (fino a target, se indicato).
+    In MySQL le istruzioni DDL non sono transazionali: la versione viene registrata solo dopo
+    che tutte le istruzioni del file sono andate a buon fine.
+    Ritorna:
+        list: Tuple (versione, nome) delle migrazioni applicate.
+    """
+    if backend.init_script:
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            _run_script(cursor, backend.init_script)
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+    
+    applied = get_applied()
+    done = []
+    
+    for version, nome, path in list_migrations():
+        if version in applied or (target is not None and version > target):
+            continue
+        
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            _run_script(cursor, path)
+            cursor.execute("INSERT INTO schema_migrations (version, nome) VALUES (%s, %s)", (version, nome))
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        
+        done.append((version, nome))
+    
+    return done
+
+
+# Tipi di accesso di EXPLAIN che leggono tutte le righe della tabella (ALL) o tutte le voci di un indice (index)
+FULL_SCAN_TYPES = ('ALL', 'INDEX')
+
+
+def get_hot_queries(user_id):
+    """
+    Restituisce le query eseguite più spesso dall'applicazione per un utente, come tuple (nome, query, parametri):
+    pagine dell'elenco (anche con il cursore), ricerca full-text, totali e report dal riepilogo mensile,
+    categorie e mesi (MetadatiSpese) e versione dei dati (VersioneDati, letta a ogni pagina e richiesta API).
+    """
+    page = Config.PAGE_SIZE + 1
+    categorie = Spesa.get_categorie(user_id=user_id)
+    mesi = Spesa.get_mesi(user_id=user_id)
+    
+    categoria = categorie[0] if categorie else ''
+    mese = mesi[0] if mesi else date.today().strftime("%Y-%m")
+    ultima = Spesa(id=2 ** 31 - 1, data=date.today())
+    next_cursor = Spesa.encode_cursor(CURSOR_NEXT, ultima)
+    prev_cursor = Spesa.encode_cursor(CURSOR_PREV, ultima)
+    # Una parola presente nei dati dell'utente, così la ricerca segue lo stesso piano di una ricerca reale
+    testo = categoria if Spesa.search_terms(categoria) else 'spesa'
+    
+    return [
+        ('elenco spese', *Spesa.build_select(user_id, None, page)),
+        ('pagina successiva', *Spesa.build_select(user_id, None, page, next_cursor)),
+        ('pagina precedente', *Spesa.build_select(user_id, None, page, prev_cursor)),
+        ('filtro categoria', *Spesa.build_select(user_id, {'categoria': categoria}, page)),
+        ('filtro mese', *Spesa.build_select(user_id, {'mese': mese}, page)),
+        ('filtro categoria e mese', *Spesa.build_select(user_id, {'categoria': categoria, 'mese': mese}, page)),
+        ('filtro mese, pagina successiva', *Spesa.build_select(user_id, {'mese': mese}, page, next_cursor)),
+        ('ricerca', *Spesa.build_search(testo, user_id, limit=page)),
+        ('totali', *RiepilogoMensile.build_totali(user_id)),
+        ('totali filtro mese', *RiepilogoMensile.build_totali(user_id, {'mese': mese})),
+        ('report per categoria', *RiepilogoMensile.build_per_categoria(user_id)),
+        ('report per categoria filtro mese', *RiepilogoMensile.build_per_categoria(user_id, {'mese': mese})),
+        ('categorie e mesi', MetadatiSpese.QUERY, (user_id,)),
+        ('versione dei dati', VersioneDati.QUERY, (user_id,)),
+    ]
+
+
+def explain_hot_queries(user_id):
+    """
+    Esegue EXPLAIN sulle query più frequenti.
+    Ritorna:
+        list: Tuple (nome, righe di EXPLAIN, full_scan) dove full_scan indica una scansione completa di una tabella
+        o di un suo indice.
+    """
+    results = []
+    
+    for nome, query, params in get_hot_queries(user_id):
+        rows = backend.normalize_explain(execute_query(backend.explain(query), params, fetch=True) or [])
+        # type 'index' (MySQL, o "SCAN ... USING INDEX" in SQLite) legge comunque tutto l'indice:
+        # conta come scansione completa anche quando l'indice copre tutte le colonne.
+        full_scan = any((row.get('type') or '').upper() in FULL_SCAN_TYPES for row in rows)
+        results.append((nome, rows, full_scan))
+    
+    return results
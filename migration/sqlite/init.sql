@@ -0,0 +1,21 @@
+-- Schema di base per il backend SQLite (DB_BACKEND=sqlite), equivalente a migration/init.sql.
+-- Viene eseguito da "flask db upgrade" prima delle migrazioni: tutte le istruzioni sono idempotenti.
+-- I tipi dichiarati (DATE, DECIMAL, TIMESTAMP) servono anche a convertire i valori letti (vedi backends.py).
+
+CREATE TABLE IF NOT EXISTS users (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  username VARCHAR(100) NOT NULL UNIQUE,
+  password_hash VARCHAR(255) NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS spese (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  data DATE NOT NULL,
+  categoria VARCHAR(100) NOT NULL,
+  descrizione VARCHAR(255) NOT NULL,
+  importo DECIMAL(10,2) NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
\ No newline at end of file
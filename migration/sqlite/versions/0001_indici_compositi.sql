@@ -0,0 +1,4 @@
+-- Stessi indici composti della migrazione MySQL 0001. Lo schema SQLite non ha mai avuto
+-- gli indici su singola colonna, quindi non c'è niente da eliminare.
+CREATE INDEX IF NOT EXISTS idx_spese_user_data_id ON spese(user_id, data, id);
+CREATE INDEX IF NOT EXISTS idx_spese_user_categoria_data ON spese(user_id, categoria, data);
@@ -0,0 +1,2 @@
+-- Stessa colonna della migrazione MySQL 0002.
+ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0;
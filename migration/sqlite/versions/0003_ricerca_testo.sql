@@ -0,0 +1,26 @@
+-- Ricerca full-text su descrizione e categoria delle spese (route /spese/search).
+-- spese_fts è un indice FTS5 "external content": i testi restano solo in spese e i trigger tengono
+-- l'indice allineato nella stessa transazione di ogni scrittura. Gli indici sui prefissi di 2 e 3 caratteri
+-- velocizzano le ricerche per parole incomplete; remove_diacritics ignora gli accenti (caffe trova caffè).
+CREATE VIRTUAL TABLE IF NOT EXISTS spese_fts USING fts5(
+  descrizione, categoria,
+  content='spese', content_rowid='id',
+  tokenize='unicode61 remove_diacritics 2',
+  prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS spese_fts_insert AFTER INSERT ON spese BEGIN
+  INSERT INTO spese_fts (rowid, descrizione, categoria) VALUES (new.id, new.descrizione, new.categoria);
+END;
+
+CREATE TRIGGER IF NOT EXISTS spese_fts_delete AFTER DELETE ON spese BEGIN
+  INSERT INTO spese_fts (spese_fts, rowid, descrizione, categoria) VALUES ('delete', old.id, old.descrizione, old.categoria);
+END;
+
+CREATE TRIGGER IF NOT EXISTS spese_fts_update AFTER UPDATE OF descrizione, categoria ON spese BEGIN
+  INSERT INTO spese_fts (spese_fts, rowid, descrizione, categoria) VALUES ('delete', old.id, old.descrizione, old.categoria);
+  INSERT INTO spese_fts (rowid, descrizione, categoria) VALUES (new.id, new.descrizione, new.categoria);
+END;
+
+-- Indicizza le spese già presenti
+INSERT INTO spese_fts (spese_fts) VALUES ('rebuild');
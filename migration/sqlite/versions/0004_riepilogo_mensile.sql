@@ -0,0 +1,16 @@
+-- Stessa tabella e stesso popolamento iniziale della migrazione MySQL 0004.
+CREATE TABLE IF NOT EXISTS riepilogo_mensile (
+  user_id INTEGER NOT NULL,
+  mese CHAR(7) NOT NULL,
+  categoria VARCHAR(100) NOT NULL,
+  totale DECIMAL(14,2) NOT NULL DEFAULT 0,
+  conteggio INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, mese, categoria),
+  FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+INSERT INTO riepilogo_mensile (user_id, mese, categoria, totale, conteggio)
+SELECT user_id, strftime('%Y-%m', data), categoria, SUM(importo), COUNT(*)
+FROM spese
+WHERE NOT EXISTS (SELECT 1 FROM riepilogo_mensile)
+GROUP BY user_id, strftime('%Y-%m', data), categoria;
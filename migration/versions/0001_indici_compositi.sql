@@ -0,0 +1,10 @@
+-- Indici composti che seguono le query reali: sempre per utente, ordinate per data (e id per la paginazione),
+-- eventualmente filtrate per categoria. Gli indici su singola colonna creati da init.sql diventano superflui:
+-- user_id è il prefisso dei nuovi indici (che soddisfano anche la chiave esterna), mentre data e categoria
+-- da sole non vengono mai usate senza user_id.
+CREATE INDEX idx_spese_user_data_id ON spese(user_id, data, id);
+CREATE INDEX idx_spese_user_categoria_data ON spese(user_id, categoria, data);
+
+DROP INDEX idx_spese_user_id ON spese;
+DROP INDEX idx_spese_data ON spese;
+DROP INDEX idx_spese_categoria ON spese;
@@ -0,0 +1,3 @@
+-- Versione dei dati di ogni utente: viene incrementata a ogni scrittura sulle sue spese
+-- e permette alle API di rispondere 304 Not Modified senza rileggere le spese (vedi VersioneDati).
+ALTER TABLE users ADD COLUMN data_version BIGINT NOT NULL DEFAULT 0;
@@ -0,0 +1,4 @@
+-- Ricerca full-text su descrizione e categoria delle spese (route /spese/search).
+-- Con la configurazione predefinita di InnoDB le parole più corte di 3 caratteri (innodb_ft_min_token_size)
+-- e le stopword non vengono indicizzate.
+ALTER TABLE spese ADD FULLTEXT INDEX ft_spese_testo (descrizione, categoria);
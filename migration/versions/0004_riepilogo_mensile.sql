@@ -0,0 +1,21 @@
+-- Tabella riepilogo_mensile: totale e numero di spese per utente, mese (YYYY-MM) e categoria.
+--    - Viene aggiornata nella stessa transazione di ogni inserimento/modifica/eliminazione in spese,
+--      così i totali si leggono in O(mesi x categorie) invece di sommare tutte le righe.
+--    - Può essere ricalcolata da zero con: flask riepilogo rebuild
+CREATE TABLE IF NOT EXISTS riepilogo_mensile (
+  user_id INT NOT NULL,
+  mese CHAR(7) NOT NULL,
+  categoria VARCHAR(100) NOT NULL,
+  totale DECIMAL(14,2) NOT NULL DEFAULT 0,
+  conteggio INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, mese, categoria),
+  FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Popola il riepilogo con le spese già presenti. Se la tabella contiene già dei totali (creata da una versione
+-- precedente di init.sql e poi aggiornata dall'applicazione) non viene toccata, per non contarli due volte.
+INSERT INTO riepilogo_mensile (user_id, mese, categoria, totale, conteggio)
+SELECT user_id, DATE_FORMAT(data, '%Y-%m'), categoria, SUM(importo), COUNT(*)
+FROM spese
+WHERE NOT EXISTS (SELECT 1 FROM riepilogo_mensile)
+GROUP BY user_id, DATE_FORMAT(data, '%Y-%m'), categoria;
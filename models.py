@@ -1,314 +1,999 @@
-import os
-import csv
-from datetime import datetime
-from decimal import Decimal
-import bcrypt
-from config import Config
-from db import execute_query
-
-class User:
-    """Modello utente per l'autenticazione"""
-    
-    def __init__(self, id=None, username=None, password_hash=None):
-        self.id = id
-        self.username = username
-        self.password_hash = password_hash
-    
-    @classmethod
-    def from_dict(cls, data):
-        """Crea un'istanza User da un dizionario"""
-        return cls(
-            id=data.get('id'),
-            username=data.get('username'),
-            password_hash=data.get('password_hash')
-        )
-    
-    def to_dict(self):
-        """Converte User in dizionario"""
-        return {
-            'id': self.id,
-            'username': self.username,
-            'password_hash': self.password_hash
-        }
-    
-    @staticmethod
-    def hash_password(password):
-        """Crea l'hash di una password usando bcrypt (algoritmo robusto contro attacchi di forza bruta)"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    
-    def verify_password(self, password):
-        """Verifica una password rispetto all'hash memorizzato"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
-    
-    @classmethod
-    def get_by_id(cls, user_id):
-        """Recupera un utente tramite ID"""
-        query = "SELECT * FROM users WHERE id = %s"
-        result = execute_query(query, (user_id,), fetch=True)
-        
-        if result and len(result) > 0:
-            return cls.from_dict(result[0])
-        return None
-    
-    @classmethod
-    def get_by_username(cls, username):
-        """Recupera un utente tramite username"""
-        query = "SELECT * FROM users WHERE username = %s"
-        result = execute_query(query, (username,), fetch=True)
-        
-        if result and len(result) > 0:
-            return cls.from_dict(result[0])
-        return None
-    
-    def save(self):
-        """Salva l'utente nel database (crea o aggiorna)"""
-        if self.id:
-            query = """
-            UPDATE users 
-            SET username = %s, password_hash = %s
-            WHERE id = %s
-            """
-            execute_query(query, (self.username, self.password_hash, self.id), commit=True)
-            return self.id
-        else:
-            query = """
-            INSERT INTO users (username, password_hash)
-            VALUES (%s, %s)
-            """
-            self.id = execute_query(query, (self.username, self.password_hash), commit=True)
-            return self.id
-
-
-class Spesa:
-    """Modello Spesa"""
-    
-    def __init__(self, id=None, user_id=None, data=None, categoria=None, descrizione=None, importo=None):
-        self.id = id
-        self.user_id = user_id
-        
-        # Conversione della data
-        if isinstance(data, str):
-            try:
-                self.data = datetime.strptime(data, "%Y-%m-%d").date()
-            except ValueError:
-                self.data = None
-        else:
-            self.data = data
-            
-        self.categoria = categoria
-        self.descrizione = descrizione
-        
-        # Conversione decimale
-        if isinstance(importo, str):
-            try:
-                self.importo = Decimal(importo.replace(',', '.'))
-            except:
-                self.importo = Decimal('0')
-        else:
-            self.importo = Decimal(str(importo)) if importo is not None else None
-    
-    @classmethod
-    def from_dict(cls, data):
-        """Crea una Spesa da un dizionario"""
-        return cls(
-            id=data.get('id'),
-            user_id=data.get('user_id'),
-            data=data.get('data'),
-            categoria=data.get('categoria'),
-            descrizione=data.get('descrizione'),
-            importo=data.get('importo')
-        )
-    
-    def to_dict(self):
-        """Converte Spesa in dizionario"""
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'data': self.data.strftime("%Y-%m-%d") if self.data else None,
-            'categoria': self.categoria,
-            'descrizione': self.descrizione,
-            'importo': float(self.importo) if self.importo else None
-        }
-    
-    def to_csv_dict(self):
-        """Converte Spesa in formato dizionario per CSV"""
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'data': self.data.strftime("%Y-%m-%d") if self.data else None,
-            'categoria': self.categoria,
-            'descrizione': self.descrizione,
-            'importo': str(self.importo) if self.importo else None
-        }
-    
-    @classmethod
-    def from_csv_dict(cls, row, user_id=None):
-        """Crea una Spesa da una riga CSV"""
-        return cls(
-            id=int(row.get('id')) if row.get('id') else None,
-            user_id=int(row.get('user_id')) if row.get('user_id') else user_id,
-            data=row.get('data'),
-            categoria=row.get('categoria'),
-            descrizione=row.get('descrizione'),
-            importo=row.get('importo')
-        )
-    
-    @staticmethod
-    def get_csv_path(user_id):
-        """Restituisce il percorso del file CSV per uno specifico utente"""
-        return os.path.join(Config.CSV_DIR, f"spese_{user_id}.csv")
-    
-    @classmethod
-    def load_from_csv(cls, user_id):
-        """Carica le spese da file CSV per uno specifico utente"""
-        csv_path = cls.get_csv_path(user_id)
-        spese = []
-        
-        try:
-            if os.path.exists(csv_path):
-                with open(csv_path, 'r', newline='', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        spese.append(cls.from_csv_dict(row, user_id))
-        except Exception as e:
-            print(f"Errore caricamento CSV: {e}")
-        
-        return spese
-    
-    @classmethod
-    def save_to_csv(cls, user_id, spese_list):
-        """Salva le spese su file CSV per uno specifico utente"""
-        csv_path = cls.get_csv_path(user_id)
-        
-        try:
-            with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-                fieldnames = ['id', 'user_id', 'data', 'categoria', 'descrizione', 'importo']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for spesa in spese_list:
-                    writer.writerow(spesa.to_csv_dict())
-            return True
-        except Exception as e:
-            print(f"Errore salvataggio CSV: {e}")
-            return False
-    
-    @classmethod
-    def get_by_id(cls, spesa_id, user_id=None):
-        """Recupera una spesa tramite ID, opzionalmente filtrando per utente"""
-        query = "SELECT * FROM spese WHERE id = %s"
-        params = [spesa_id]
-        
-        if user_id is not None:
-            query += " AND user_id = %s"
-            params.append(user_id)
-        
-        result = execute_query(query, tuple(params), fetch=True)
-        
-        if result and len(result) > 0:
-            return cls.from_dict(result[0])
-        return None
-    
-    @classmethod
-    def get_all(cls, user_id=None, filters=None):
-        """
-        Restituisce tutte le spese, opzionalmente filtrate per utente e altri filtri
-        Argomenti:
-            user_id (int, opzionale): ID utente
-            filters (dict, opzionale): Filtri aggiuntivi (categoria, mese)
-        """
-        query = "SELECT * FROM spese WHERE 1=1"
-        params = []
-        
-        if user_id is not None:
-            query += " AND user_id = %s"
-            params.append(user_id)
-        
-        if filters:
-            if filters.get('categoria'):
-                query += " AND categoria = %s"
-                params.append(filters['categoria'])
-            
-            if filters.get('mese'):
-                query += " AND DATE_FORMAT(data, '%Y-%m') = %s"
-                params.append(filters['mese'])
-        
-        query += " ORDER BY data DESC"
-        
-        result = execute_query(query, tuple(params) if params else None, fetch=True)
-        
-        return [cls.from_dict(row) for row in result] if result else []
-    
-    @classmethod
-    def get_categorie(cls, user_id=None):
-        """Restituisce tutte le categorie distinte, opzionalmente filtrate per utente"""
-        query = "SELECT DISTINCT categoria FROM spese"
-        params = []
-        
-        if user_id is not None:
-            query += " WHERE user_id = %s"
-            params.append(user_id)
-        
-        query += " ORDER BY categoria"
-        
-        result = execute_query(query, tuple(params) if params else None, fetch=True)
-        
-        return [row['categoria'] for row in result if row['categoria']] if result else []
-    
-    @classmethod
-    def get_mesi(cls, user_id=None):
-        """Restituisce tutti i mesi distinti in formato YYYY-MM, opzionalmente filtrati per utente"""
-        query = "SELECT DISTINCT DATE_FORMAT(data, '%Y-%m') as mese FROM spese"
-        params = []
-        
-        if user_id is not None:
-            query += " WHERE user_id = %s"
-            params.append(user_id)
-        
-        query += " ORDER BY mese DESC"
-        
-        result = execute_query(query, tuple(params) if params else None, fetch=True)
-        
-        return [row['mese'] for row in result if row['mese']] if result else []
-    
-    def save(self):
-        """Salva la spesa nel database (crea o aggiorna) e sincronizza il CSV"""
-        if self.id:
-            query = """
-            UPDATE spese 
-            SET user_id = %s, data = %s, categoria = %s, descrizione = %s, importo = %s
-            WHERE id = %s
-            """
-            execute_query(
-                query, 
-                (self.user_id, self.data, self.categoria, self.descrizione, float(self.importo), self.id), 
-                commit=True
-            )
-        else:
-            query = """
-            INSERT INTO spese (user_id, data, categoria, descrizione, importo)
-            VALUES (%s, %s, %s, %s, %s)
-            """
-            self.id = execute_query(
-                query, 
-                (self.user_id, self.data, self.categoria, self.descrizione, float(self.importo)), 
-                commit=True
-            )
-
-        spese = self.get_all(user_id=self.user_id)
-        self.save_to_csv(self.user_id, spese)
-        
-        return self.id
-    
-    def delete(self):
-        """Elimina la spesa dal database e aggiorna il CSV"""
-        if not self.id:
-            return False
-        
-        query = "DELETE FROM spese WHERE id = %s"
-        execute_query(query, (self.id,), commit=True)
-        
-        spese = self.get_all(user_id=self.user_id)
-        self.save_to_csv(self.user_id, spese)
-        
-        return True
\ No newline at end of file
+import re
+import base64
+import logging
+import threading
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+import csv_mirror
+import csv_sync
+import passwords
+from cache import TTLCache, MemoryPageCache, FilesystemPageCache
+from config import Config
+from backends import CENTS
+from db import execute_query, stream_query, transaction, backend
+
+logger = logging.getLogger(__name__)
+
+# Cache degli utenti, indicizzata per ('id', id) e ('username', username).
+# Contiene i dizionari delle righe: a ogni lettura viene creato un nuovo oggetto User.
+user_cache = TTLCache(maxsize=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+
+# Cache per utente di categorie e mesi usati, con la versione dei dati a cui si riferiscono (vedi MetadatiSpese).
+meta_cache = TTLCache(maxsize=Config.META_CACHE_SIZE, ttl=Config.META_CACHE_TTL)
+
+def create_page_cache():
+    """Crea la cache delle pagine indicata da Config.PAGE_CACHE_BACKEND (None se disattivata)"""
+    if Config.PAGE_CACHE_BACKEND == 'memory':
+        return MemoryPageCache(max_bytes=Config.PAGE_CACHE_MAX_BYTES)
+    if Config.PAGE_CACHE_BACKEND == 'filesystem':
+        return FilesystemPageCache(Config.PAGE_CACHE_DIR, max_bytes=Config.PAGE_CACHE_MAX_BYTES)
+    if Config.PAGE_CACHE_BACKEND == 'none':
+        return None
+    raise ValueError(f"PAGE_CACHE_BACKEND non supportato: {Config.PAGE_CACHE_BACKEND} (memory, filesystem, none)")
+
+# Cache delle pagine HTML già generate, per utente e versione dei dati (vedi spese.render_cached).
+page_cache = create_page_cache()
+
+# Parole di una ricerca full-text (lettere e cifre) e numero massimo di parole considerate
+_SEARCH_TERM_RE = re.compile(r'\w+')
+MAX_SEARCH_TERMS = 8
+
+# Direzioni dei cursori di paginazione
+CURSOR_NEXT = 'n'
+CURSOR_PREV = 'p'
+
+def arrotonda_importo(importo):
+    """Arrotonda un importo ai centesimi come la colonna DECIMAL(10,2) di MySQL (la metà per eccesso)"""
+    return importo.quantize(CENTS, rounding=ROUND_HALF_UP)
+
+class User:
+    """Modello utente per l'autenticazione"""
+    
+    def __init__(self, id=None, username=None, password_hash=None):
+        self.id = id
+        self.username = username
+        self.password_hash = password_hash
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Crea un'istanza User da un dizionario"""
+        return cls(
+            id=data.get('id'),
+            username=data.get('username'),
+            password_hash=data.get('password_hash')
+        )
+    
+    def to_dict(self):
+        """Converte User in dizionario"""
+        return {
+            'id': self.id,
+            'username': self.username,
+            'password_hash': self.password_hash
+        }
+    
+    @staticmethod
+    def hash_password(password):
+        """Crea l'hash di una password usando bcrypt (algoritmo robusto contro attacchi di forza bruta)"""
+        return passwords.hash_password(password)
+    
+    def verify_password(self, password):
+        """Verifica una password rispetto all'hash memorizzato"""
+        return passwords.verify_password(password, self.password_hash)
+    
+    def needs_rehash(self):
+        """Indica se l'hash memorizzato usa un costo bcrypt diverso da quello configurato"""
+        return passwords.needs_rehash(self.password_hash)
+    
+    @classmethod
+    def _get_cached(cls, key, query, value):
+        data = user_cache.get(key)
+        
+        if data is None:
+            result = execute_query(query, (value,), fetch=True)
+            if not result:
+                return None
+            data = result[0]
+            user_cache.set(('id', data['id']), data)
+            user_cache.set(('username', data['username']), data)
+        
+        return cls.from_dict(data)
+    
+    @classmethod
+    def get_by_id(cls, user_id):
+        """Recupera un utente tramite ID (passando dalla cache degli utenti)"""
+        return cls._get_cached(('id', user_id), "SELECT * FROM users WHERE id = %s", user_id)
+    
+    @classmethod
+    def get_by_username(cls, username):
+        """Recupera un utente tramite username (passando dalla cache degli utenti)"""
+        return cls._get_cached(('username', username), "SELECT * FROM users WHERE username = %s", username)
+    
+    def invalidate_cache(self):
+        """Rimuove l'utente dalla cache, anche con il vecchio username se è stato modificato"""
+        cached = user_cache.peek(('id', self.id)) if self.id else None
+        
+        if cached:
+            user_cache.delete(('username', cached['username']))
+        if self.id:
+            user_cache.delete(('id', self.id))
+        if self.username:
+            user_cache.delete(('username', self.username))
+    
+    def save(self):
+        """Salva l'utente nel database (crea o aggiorna)"""
+        self.invalidate_cache()
+        
+        if self.id:
+            query = """
+            UPDATE users 
+            SET username = %s, password_hash = %s
+            WHERE id = %s
+            """
+            execute_query(query, (self.username, self.password_hash, self.id), commit=True)
+        else:
+            query = """
+            INSERT INTO users (username, password_hash)
+            VALUES (%s, %s)
+            """
+            self.id = execute_query(query, (self.username, self.password_hash), commit=True)
+        
+        # Invalidazione anche dopo la scrittura: una lettura concorrente potrebbe aver rimesso in cache la versione vecchia.
+        self.invalidate_cache()
+        return self.id
+
+
+class Spesa:
+    """Modello Spesa"""
+    
+    # Niente __dict__ per istanza: meno memoria e accesso agli attributi più veloce su elenchi ed esportazioni.
+    __slots__ = ('id', 'user_id', 'data', 'categoria', 'descrizione', 'importo')
+    
+    # Colonne lette dalle query, nell'ordine atteso da from_row
+    COLUMNS = "id, user_id, data, categoria, descrizione, importo"
+    
+    def __init__(self, id=None, user_id=None, data=None, categoria=None, descrizione=None, importo=None):
+        self.id = id
+        self.user_id = user_id
+        
+        # Conversione della data
+        if isinstance(data, str):
+            try:
+                self.data = datetime.strptime(data, "%Y-%m-%d").date()
+            except ValueError:
+                self.data = None
+        else:
+            self.data = data
+            
+        self.categoria = categoria
+        self.descrizione = descrizione
+        
+        # Conversione decimale
+        if isinstance(importo, str):
+            try:
+                self.importo = Decimal(importo.replace(',', '.'))
+            except:
+                self.importo = Decimal('0')
+        elif importo is None or isinstance(importo, Decimal):
+            self.importo = importo
+        else:
+            self.importo = Decimal(str(importo))
+    
+    @classmethod
+    def from_row(cls, row):
+        """
+        Crea una Spesa da una tupla (id, user_id, data, categoria, descrizione, importo) letta dal database.
+        I valori hanno già il tipo giusto (date, Decimal), quindi non vengono riconvertiti come in __init__.
+        """
+        spesa = cls.__new__(cls)
+        spesa.id, spesa.user_id, spesa.data, spesa.categoria, spesa.descrizione, spesa.importo = row
+        return spesa
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Crea una Spesa da un dizionario"""
+        return cls(
+            id=data.get('id'),
+            user_id=data.get('user_id'),
+            data=data.get('data'),
+            categoria=data.get('categoria'),
+            descrizione=data.get('descrizione'),
+            importo=data.get('importo')
+        )
+    
+    def to_dict(self):
+        """Converte Spesa in dizionario"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'data': self.data.strftime("%Y-%m-%d") if self.data else None,
+            'categoria': self.categoria,
+            'descrizione': self.descrizione,
+            'importo': float(self.importo) if self.importo else None
+        }
+    
+    def to_csv_dict(self):
+        """Converte Spesa in formato dizionario per CSV"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'data': self.data.strftime("%Y-%m-%d") if self.data else None,
+            'categoria': self.categoria,
+            'descrizione': self.descrizione,
+            'importo': str(self.importo) if self.importo else None
+        }
+    
+    @classmethod
+    def from_csv_dict(cls, row, user_id=None):
+        """Crea una Spesa da una riga CSV"""
+        return cls(
+            id=int(row.get('id')) if row.get('id') else None,
+            user_id=int(row.get('user_id')) if row.get('user_id') else user_id,
+            data=row.get('data'),
+            categoria=row.get('categoria'),
+            descrizione=row.get('descrizione'),
+            importo=row.get('importo')
+        )
+    
+    @staticmethod
+    def get_csv_path(user_id):
+        """Restituisce il percorso del file CSV (snapshot) per uno specifico utente"""
+        return csv_mirror.get_snapshot_path(user_id)
+    
+    @classmethod
+    def load_from_csv(cls, user_id):
+        """Carica le spese da file CSV per uno specifico utente (snapshot più replay del journal)"""
+        spese = []
+        
+        try:
+            for row in csv_mirror.load_rows(user_id):
+                spese.append(cls.from_csv_dict(row, user_id))
+        except Exception as e:
+            logger.error("Errore caricamento CSV: %s", e)
+        
+        return spese
+    
+    @classmethod
+    def save_to_csv(cls, user_id, spese_list):
+        """Riscrive da zero il file CSV per uno specifico utente, azzerando il journal delle modifiche"""
+        try:
+            csv_mirror.write_snapshot(user_id, [spesa.to_csv_dict() for spesa in spese_list])
+            return True
+        except Exception as e:
+            logger.error("Errore salvataggio CSV: %s", e)
+            return False
+    
+    def sync_csv(self, op):
+        """
+        Accoda la modifica per la sincronizzazione del CSV, che avviene in background (vedi csv_sync).
+        Se l'utente non ha ancora uno snapshot, ne viene richiesta la creazione a partire dal database
+        (che include già la modifica corrente); da lì in poi ogni scrittura costa un solo append.
+        """
+        user_id = self.user_id
+        
+        if not csv_mirror.has_snapshot(user_id):
+            csv_sync.request_rebuild(user_id, lambda: Spesa.get_all(user_id=user_id))
+        else:
+            csv_sync.record(user_id, op, self.to_csv_dict())
+        
+        return True
+    
+    @classmethod
+    def get_by_id(cls, spesa_id, user_id=None):
+        """Recupera una spesa tramite ID, opzionalmente filtrando per utente"""
+        query = f"SELECT {cls.COLUMNS} FROM spese WHERE id = %s"
+        params = [spesa_id]
+        
+        if user_id is not None:
+            query += " AND user_id = %s"
+            params.append(user_id)
+        
+        result = execute_query(query, tuple(params), fetch=True, dictionary=False, prepared=True)
+        
+        if result and len(result) > 0:
+            return cls.from_row(result[0])
+        return None
+    
+    @staticmethod
+    def get_month_range(mese):
+        """
+        Converte un mese YYYY-MM nell'intervallo semiaperto [primo giorno, primo giorno del mese successivo).
+        Restituisce None se il formato non è valido.
+        """
+        try:
+            inizio = datetime.strptime(mese, "%Y-%m").date()
+        except (TypeError, ValueError):
+            return None
+        
+        if inizio.month == 12:
+            fine = inizio.replace(year=inizio.year + 1, month=1)
+        else:
+            fine = inizio.replace(month=inizio.month + 1)
+        return inizio, fine
+    
+    @classmethod
+    def _build_where(cls, user_id=None, filters=None):
+        """
+        Costruisce la clausola WHERE (e i parametri) per l'elenco delle spese.
+        Il filtro sul mese è espresso come intervallo di date sulla colonna data (e non con DATE_FORMAT),
+        così MySQL può usare gli indici su (user_id, data).
+        """
+        query = " WHERE 1=1"
+        params = []
+        
+        if user_id is not None:
+            query += " AND user_id = %s"
+            params.append(user_id)
+        
+        if filters:
+            if filters.get('categoria'):
+                query += " AND categoria = %s"
+                params.append(filters['categoria'])
+            
+            if filters.get('mese'):
+                month_range = cls.get_month_range(filters['mese'])
+                if month_range:
+                    query += " AND data >= %s AND data < %s"
+                    params.extend(month_range)
+                else:
+                    # Mese non valido: nessuna spesa corrisponde
+                    query += " AND 1=0"
+        
+        return query, params
+    
+    @staticmethod
+    def encode_cursor(direction, spesa):
+        """
+        Crea il token opaco che identifica la posizione (data, id) di una spesa nell'elenco.
+        direction vale CURSOR_NEXT (righe successive) o CURSOR_PREV (righe precedenti).
+        """
+        raw = f"{direction}:{spesa.data.strftime('%Y-%m-%d')}:{spesa.id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(token):
+        """Decodifica un token di paginazione; restituisce None se il token non è valido"""
+        if not token:
+            return None
+        
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+            direction, data, spesa_id = raw.split(':')
+            if direction not in (CURSOR_NEXT, CURSOR_PREV):
+                return None
+            return direction, datetime.strptime(data, "%Y-%m-%d").date(), int(spesa_id)
+        except (ValueError, UnicodeDecodeError):
+            return None
+    
+    @classmethod
+    def build_select(cls, user_id=None, filters=None, limit=None, cursor=None):
+        """Costruisce la query (e i parametri) usata da get_all; vedi get_all per il significato degli argomenti"""
+        where, params = cls._build_where(user_id, filters)
+        query = f"SELECT {cls.COLUMNS} FROM spese" + where
+        
+        decoded = cls.decode_cursor(cursor)
+        backwards = decoded is not None and decoded[0] == CURSOR_PREV
+        
+        if decoded:
+            _, cursor_data, cursor_id = decoded
+            operator = ">" if backwards else "<"
+            query += f" AND (data {operator} %s OR (data = %s AND id {operator} %s))"
+            params.extend([cursor_data, cursor_data, cursor_id])
+        
+        # Per tornare indietro si legge in ordine crescente a partire dal cursore e poi si inverte il risultato.
+        query += " ORDER BY data ASC, id ASC" if backwards else " ORDER BY data DESC, id DESC"
+        
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(int(limit))
+        
+        return query, tuple(params) if params else None
+    
+    @classmethod
+    def get_all(cls, user_id=None, filters=None, limit=None, cursor=None):
+        """
+        Restituisce tutte le spese, opzionalmente filtrate per utente e altri filtri
+        Argomenti:
+            user_id (int, opzionale): ID utente
+            filters (dict, opzionale): Filtri aggiuntivi (categoria, mese)
+            limit (int, opzionale): Numero massimo di righe da restituire
+            cursor (str, opzionale): Token di paginazione (vedi encode_cursor); la posizione è espressa
+                sulla coppia (data, id), così ogni pagina costa come la prima indipendentemente dall'offset
+        """
+        query, params = cls.build_select(user_id, filters, limit, cursor)
+        result = execute_query(query, params, fetch=True, dictionary=False, prepared=True)
+        
+        decoded = cls.decode_cursor(cursor)
+        backwards = decoded is not None and decoded[0] == CURSOR_PREV
+        
+        spese = [cls.from_row(row) for row in result] if result else []
+        if backwards:
+            spese.reverse()
+        return spese
+    
+    @classmethod
+    def iter_all(cls, user_id=None, filters=None, chunk_size=None):
+        """
+        Come get_all, ma restituisce un generatore: le spese vengono lette dal database a blocchi di chunk_size righe
+        (default Config.EXPORT_CHUNK_SIZE) man mano che il generatore viene consumato, senza costruire la lista intera.
+        """
+        query, params = cls.build_select(user_id, filters)
+        
+        for rows in stream_query(query, params, chunk_size=chunk_size or Config.EXPORT_CHUNK_SIZE, dictionary=False):
+            for row in rows:
+                yield cls.from_row(row)
+    
+    @classmethod
+    def get_page(cls, user_id=None, filters=None, cursor=None, page_size=None):
+        """
+        Restituisce una pagina di spese come tupla (spese, next_cursor, prev_cursor).
+        I cursori sono None quando non esiste una pagina successiva/precedente.
+        """
+        page_size = page_size or Config.PAGE_SIZE
+        decoded = cls.decode_cursor(cursor)
+        backwards = decoded is not None and decoded[0] == CURSOR_PREV
+        
+        # Si legge una riga in più per sapere se oltre questa pagina ce n'è un'altra.
+        spese = cls.get_all(user_id=user_id, filters=filters, limit=page_size + 1, cursor=cursor)
+        has_more = len(spese) > page_size
+        
+        if backwards:
+            spese = spese[1:] if has_more else spese
+            has_next, has_prev = True, has_more
+        else:
+            spese = spese[:page_size]
+            has_next, has_prev = has_more, decoded is not None
+        
+        if not spese:
+            return spese, None, None
+        
+        next_cursor = cls.encode_cursor(CURSOR_NEXT, spese[-1]) if has_next else None
+        prev_cursor = cls.encode_cursor(CURSOR_PREV, spese[0]) if has_prev else None
+        
+        return spese, next_cursor, prev_cursor
+    
+    @staticmethod
+    def search_terms(testo):
+        """Parole (minuscole, senza duplicati) di un testo di ricerca"""
+        terms = []
+        for term in _SEARCH_TERM_RE.findall((testo or '').lower()):
+            if term not in terms:
+                terms.append(term)
+        return terms[:MAX_SEARCH_TERMS]
+    
+    @classmethod
+    def build_search(cls, testo, user_id=None, filters=None, limit=None, offset=0):
+        """
+        Costruisce la query (e i parametri) usata da search; None se il testo non contiene parole.
+        La ricerca passa dall'indice full-text del backend e si combina con gli stessi filtri di get_all.
+        """
+        terms = cls.search_terms(testo)
+        if not terms:
+            return None
+        
+        join, params = backend.fulltext_join(terms, user_id)
+        where, where_params = cls._build_where(user_id, filters)
+        query = f"SELECT {cls.COLUMNS} FROM spese{join}{where} ORDER BY f.punteggio DESC, data DESC, id DESC"
+        params = params + where_params
+        
+        if limit is not None:
+            query += " LIMIT %s OFFSET %s"
+            params.extend([int(limit), int(offset)])
+        
+        return query, tuple(params)
+    
+    @classmethod
+    def search(cls, testo, user_id=None, filters=None, pagina=1, page_size=None):
+        """
+        Cerca le spese la cui descrizione o categoria contiene tutte le parole di testo (anche come inizio di parola),
+        dalla più rilevante. Ritorna la tupla (spese della pagina indicata, True se esiste una pagina successiva).
+        """
+        page_size = page_size or Config.PAGE_SIZE
+        pagina = max(int(pagina), 1)
+        
+        # Si legge una riga in più per sapere se oltre questa pagina ce n'è un'altra.
+        built = cls.build_search(testo, user_id, filters, limit=page_size + 1, offset=(pagina - 1) * page_size)
+        if built is None:
+            return [], False
+        
+        result = execute_query(*built, fetch=True, dictionary=False)
+        spese = [cls.from_row(row) for row in result] if result else []
+        
+        return spese[:page_size], len(spese) > page_size
+    
+    @classmethod
+    def get_totale(cls, user_id=None, filters=None):
+        """
+        Restituisce la somma degli importi di tutte le spese che rispettano i filtri (non solo della pagina).
+        Il valore viene letto dal riepilogo mensile, quindi non dipende dal numero di spese.
+        """
+        return RiepilogoMensile.get_totale(user_id=user_id, filters=filters)
+    
+    @classmethod
+    def get_totali(cls, user_id=None, filters=None):
+        """Restituisce (totale, numero di spese) per i filtri indicati, letti con un'unica query sul riepilogo mensile"""
+        return RiepilogoMensile.get_totali(user_id=user_id, filters=filters)
+    
+    @classmethod
+    def get_riepilogo(cls, user_id=None, filters=None):
+        """
+        Aggrega le spese per categoria a partire dal riepilogo mensile (stessi filtri di get_all).
+        Ritorna:
+            dict: {'categorie': [{'categoria', 'totale', 'conteggio'}, ...], 'totale', 'conteggio'}
+        """
+        categorie = [
+            {
+                'categoria': row['categoria'],
+                'totale': float(row['totale']),
+                'conteggio': int(row['conteggio'])
+            }
+            for row in RiepilogoMensile.get_per_categoria(user_id=user_id, filters=filters)
+        ]
+        
+        return {
+            'categorie': categorie,
+            'totale': round(sum(c['totale'] for c in categorie), 2),
+            'conteggio': sum(c['conteggio'] for c in categorie)
+        }
+    
+    @classmethod
+    def get_categorie(cls, user_id=None):
+        """Restituisce tutte le categorie distinte, opzionalmente filtrate per utente"""
+        if user_id is not None:
+            return sorted(MetadatiSpese.get(user_id)['categorie'])
+        
+        query = "SELECT DISTINCT categoria FROM spese ORDER BY categoria"
+        result = execute_query(query, fetch=True)
+        
+        return [row['categoria'] for row in result if row['categoria']] if result else []
+    
+    @classmethod
+    def get_mesi(cls, user_id=None):
+        """Restituisce tutti i mesi distinti in formato YYYY-MM, opzionalmente filtrati per utente"""
+        if user_id is not None:
+            return sorted(MetadatiSpese.get(user_id)['mesi'], reverse=True)
+        
+        return RiepilogoMensile.get_mesi()
+    
+    def _lock_current(self, cursor):
+        """Legge (e blocca fino al commit) la versione della spesa attualmente salvata nel database"""
+        query = "SELECT user_id, data, categoria, importo FROM spese WHERE id = %s" + backend.for_update
+        cursor.execute(query, (self.id,))
+        return cursor.fetchone()
+    
+    def save(self):
+        """
+        Salva la spesa nel database (crea o aggiorna) e registra la modifica nel CSV.
+        Il riepilogo mensile viene aggiornato nella stessa transazione: una modifica che sposta la spesa
+        in un altro mese o categoria toglie l'importo dal vecchio bucket e lo aggiunge al nuovo.
+        Restituisce l'id della spesa, oppure False se la spesa da aggiornare è stata eliminata nel frattempo.
+        """
+        old = None
+        # Lo stesso importo finisce nel database, nel riepilogo e nel journal CSV: il replay riproduce il database.
+        self.importo = arrotonda_importo(self.importo)
+        
+        with transaction() as cursor:
+            if self.id:
+                op = csv_mirror.OP_UPDATE
+                old = self._lock_current(cursor)
+                if not old:
+                    # Eliminata dopo il caricamento del form: niente da aggiornare, né nel riepilogo né nel CSV
+                    return False
+                
+                query = """
+                UPDATE spese 
+                SET user_id = %s, data = %s, categoria = %s, descrizione = %s, importo = %s
+                WHERE id = %s
+                """
+                cursor.execute(
+                    query, 
+                    (self.user_id, self.data, self.categoria, self.descrizione, float(self.importo), self.id)
+                )
+                
+                RiepilogoMensile.apply(
+                    cursor, old['user_id'], RiepilogoMensile.get_mese(old['data']), old['categoria'],
+                    -old['importo'], -1
+                )
+            else:
+                op = csv_mirror.OP_INSERT
+                query = """
+                INSERT INTO spese (user_id, data, categoria, descrizione, importo)
+                VALUES (%s, %s, %s, %s, %s)
+                """
+                cursor.execute(
+                    query, 
+                    (self.user_id, self.data, self.categoria, self.descrizione, float(self.importo))
+                )
+                self.id = cursor.lastrowid
+            
+            RiepilogoMensile.apply(
+                cursor, self.user_id, RiepilogoMensile.get_mese(self.data), self.categoria, self.importo, 1
+            )
+            version = old_version = VersioneDati.bump(cursor, self.user_id)
+            if old and old['user_id'] != self.user_id:
+                old_version = VersioneDati.bump(cursor, old['user_id'])
+
+        mese = RiepilogoMensile.get_mese(self.data)
+        if old:
+            # Si ricontrollano solo la categoria e il mese che la spesa ha lasciato.
+            old_mese = RiepilogoMensile.get_mese(old['data'])
+            MetadatiSpese.on_delete(
+                old['user_id'],
+                old_version,
+                old['categoria'] if old['categoria'] != self.categoria else None,
+                old_mese if old_mese != mese else None
+            )
+        MetadatiSpese.on_insert(self.user_id, version, self.categoria, mese)
+        VersioneDati.invalidate_pages(self.user_id)
+        if old and old['user_id'] != self.user_id:
+            VersioneDati.invalidate_pages(old['user_id'])
+        
+        self.sync_csv(op)
+        
+        return self.id
+    
+    @classmethod
+    def bulk_insert(cls, user_id, spese, batch_size=None):
+        """
+        Inserisce in un'unica transazione le spese prodotte dall'iterabile spese (anche un generatore),
+        a blocchi di batch_size righe (default Config.IMPORT_BATCH_SIZE) con INSERT multi-riga.
+        Il riepilogo mensile viene aggiornato una sola volta per bucket e il CSV viene risincronizzato
+        una sola volta alla fine. Restituisce il numero di spese inserite.
+        """
+        batch_size = batch_size or Config.IMPORT_BATCH_SIZE
+        query = """
+        INSERT INTO spese (user_id, data, categoria, descrizione, importo)
+        VALUES (%s, %s, %s, %s, %s)
+        """
+        buckets = {}
+        batch = []
+        inserite = 0
+        
+        with transaction() as cursor:
+            for spesa in spese:
+                spesa.importo = arrotonda_importo(spesa.importo)
+                batch.append((user_id, spesa.data, spesa.categoria, spesa.descrizione, float(spesa.importo)))
+                
+                key = (RiepilogoMensile.get_mese(spesa.data), spesa.categoria)
+                totale, conteggio = buckets.get(key, (Decimal('0'), 0))
+                buckets[key] = (totale + spesa.importo, conteggio + 1)
+                
+                if len(batch) >= batch_size:
+                    cursor.executemany(query, batch)
+                    inserite += len(batch)
+                    batch = []
+            
+            if batch:
+                cursor.executemany(query, batch)
+                inserite += len(batch)
+            
+            for (mese, categoria), (totale, conteggio) in buckets.items():
+                RiepilogoMensile.apply(cursor, user_id, mese, categoria, totale, conteggio)
+            
+            if inserite:
+                version = VersioneDati.bump(cursor, user_id)
+        
+        if inserite:
+            for mese, categoria in buckets:
+                MetadatiSpese.on_insert(user_id, version, categoria, mese)
+            
+            VersioneDati.invalidate_pages(user_id)
+            csv_sync.request_rebuild(user_id, lambda: Spesa.get_all(user_id=user_id))
+        
+        return inserite
+    
+    def delete(self):
+        """Elimina la spesa dal database (aggiornando il riepilogo mensile) e aggiorna il CSV"""
+        if not self.id:
+            return False
+        
+        with transaction() as cursor:
+            old = self._lock_current(cursor)
+            if not old:
+                return False
+            
+            cursor.execute("DELETE FROM spese WHERE id = %s", (self.id,))
+            
+            RiepilogoMensile.apply(
+                cursor, old['user_id'], RiepilogoMensile.get_mese(old['data']), old['categoria'],
+                -old['importo'], -1
+            )
+            version = VersioneDati.bump(cursor, old['user_id'])
+        
+        MetadatiSpese.on_delete(old['user_id'], version, old['categoria'], RiepilogoMensile.get_mese(old['data']))
+        VersioneDati.invalidate_pages(old['user_id'])
+        
+        self.sync_csv(csv_mirror.OP_DELETE)
+        
+        return True
+
+class RiepilogoMensile:
+    """
+    Totali per (utente, mese, categoria) mantenuti incrementalmente nella tabella riepilogo_mensile.
+    Ogni scrittura su spese aggiorna i "bucket" interessati nella stessa transazione.
+    """
+    
+    _UPSERT = backend.upsert_add('riepilogo_mensile', ('user_id', 'mese', 'categoria'), ('totale', 'conteggio'))
+    
+    @staticmethod
+    def get_mese(data):
+        """Restituisce il mese (YYYY-MM) a cui appartiene una data"""
+        return data.strftime("%Y-%m")
+    
+    @classmethod
+    def apply(cls, cursor, user_id, mese, categoria, importo, conteggio):
+        """
+        Somma importo e conteggio (anche negativi) al bucket indicato, usando il cursore della transazione corrente.
+        I bucket che restano senza spese vengono eliminati.
+        """
+        cursor.execute(cls._UPSERT, (user_id, mese, categoria, importo, conteggio))
+        
+        if conteggio < 0:
+            query = """
+            DELETE FROM riepilogo_mensile
+            WHERE user_id = %s AND mese = %s AND categoria = %s AND conteggio <= 0
+            """
+            cursor.execute(query, (user_id, mese, categoria))
+    
+    @staticmethod
+    def _build_where(user_id=None, filters=None):
+        query = " WHERE 1=1"
+        params = []
+        
+        if user_id is not None:
+            query += " AND user_id = %s"
+            params.append(user_id)
+        
+        if filters:
+            if filters.get('categoria'):
+                query += " AND categoria = %s"
+                params.append(filters['categoria'])
+            
+            if filters.get('mese'):
+                query += " AND mese = %s"
+                params.append(filters['mese'])
+        
+        return query, params
+    
+    @classmethod
+    def get_totale(cls, user_id=None, filters=None):
+        """Restituisce la somma degli importi per i filtri indicati (categoria, mese)"""
+        where, params = cls._build_where(user_id, filters)
+        query = "SELECT COALESCE(ROUND(SUM(totale), 2), 0) AS totale FROM riepilogo_mensile" + where
+        
+        result = execute_query(query, tuple(params) if params else None, fetch=True)
+        
+        return Decimal(str(result[0]['totale'])) if result else Decimal('0')
+    
+    @classmethod
+    def build_totali(cls, user_id=None, filters=None):
+        """Costruisce la query (e i parametri) usata da get_totali"""
+        where, params = cls._build_where(user_id, filters)
+        query = (
+            "SELECT COALESCE(ROUND(SUM(totale), 2), 0) AS totale, COALESCE(SUM(conteggio), 0) AS conteggio "
+            "FROM riepilogo_mensile" + where
+        )
+        return query, tuple(params) if params else None
+    
+    @classmethod
+    def get_totali(cls, user_id=None, filters=None):
+        """Restituisce la tupla (somma degli importi, numero di spese) per i filtri indicati (categoria, mese)"""
+        result = execute_query(*cls.build_totali(user_id, filters), fetch=True)
+        
+        if not result:
+            return Decimal('0'), 0
+        return Decimal(str(result[0]['totale'])), int(result[0]['conteggio'])
+    
+    @classmethod
+    def build_per_categoria(cls, user_id=None, filters=None):
+        """Costruisce la query (e i parametri) usata da get_per_categoria"""
+        where, params = cls._build_where(user_id, filters)
+        query = f"""
+        SELECT categoria, ROUND(SUM(totale), 2) AS totale, SUM(conteggio) AS conteggio
+        FROM riepilogo_mensile{where}
+        GROUP BY categoria
+        ORDER BY categoria
+        """
+        return query, tuple(params) if params else None
+    
+    @classmethod
+    def get_per_categoria(cls, user_id=None, filters=None):
+        """Restituisce le righe (categoria, totale, conteggio) aggregate per categoria"""
+        return execute_query(*cls.build_per_categoria(user_id, filters), fetch=True) or []
+    
+    @classmethod
+    def get_mesi(cls, user_id=None):
+        """Restituisce i mesi (YYYY-MM) in cui ci sono spese, dal più recente"""
+        where, params = cls._build_where(user_id)
+        query = "SELECT DISTINCT mese FROM riepilogo_mensile" + where + " ORDER BY mese DESC"
+        
+        result = execute_query(query, tuple(params) if params else None, fetch=True)
+        
+        return [row['mese'] for row in result] if result else []
+    
+    @staticmethod
+    def _calcola_da_spese(cursor, user_id=None):
+        # Ricalcola i bucket direttamente dalla tabella spese.
+        # ROUND serve a SQLite, che somma gli importi in virgola mobile; in MySQL le somme DECIMAL sono già esatte.
+        query = f"""
+        SELECT user_id, {backend.month('data')} AS mese, categoria,
+               ROUND(SUM(importo), 2) AS totale, COUNT(*) AS conteggio
+        FROM spese
+        """
+        params = ()
+        
+        if user_id is not None:
+            query += " WHERE user_id = %s"
+            params = (user_id,)
+        
+        query += " GROUP BY user_id, mese, categoria"
+        cursor.execute(query, params)
+        
+        return {
+            (row['user_id'], row['mese'], row['categoria']): (Decimal(str(row['totale'])), int(row['conteggio']))
+            for row in cursor.fetchall()
+        }
+    
+    @classmethod
+    def rebuild(cls, user_id=None):
+        """Ricostruisce da zero il riepilogo (di un utente o di tutti) a partire da spese. Restituisce il numero di bucket"""
+        with transaction() as cursor:
+            buckets = cls._calcola_da_spese(cursor, user_id)
+            
+            if user_id is not None:
+                cursor.execute("DELETE FROM riepilogo_mensile WHERE user_id = %s", (user_id,))
+            else:
+                cursor.execute("DELETE FROM riepilogo_mensile")
+            
+            if buckets:
+                query = """
+                INSERT INTO riepilogo_mensile (user_id, mese, categoria, totale, conteggio)
+                VALUES (%s, %s, %s, %s, %s)
+                """
+                cursor.executemany(query, [key + value for key, value in buckets.items()])
+        
+        return len(buckets)
+    
+    @classmethod
+    def verify(cls, user_id=None):
+        """
+        Confronta il riepilogo con i totali ricalcolati da spese.
+        Restituisce la lista delle differenze come tuple (user_id, mese, categoria, atteso, trovato),
+        dove atteso e trovato sono coppie (totale, conteggio) oppure None se il bucket manca.
+        """
+        with transaction() as cursor:
+            attesi = cls._calcola_da_spese(cursor, user_id)
+            
+            query = "SELECT user_id, mese, categoria, totale, conteggio FROM riepilogo_mensile"
+            params = ()
+            if user_id is not None:
+                query += " WHERE user_id = %s"
+                params = (user_id,)
+            cursor.execute(query, params)
+            
+            trovati = {
+                (row['user_id'], row['mese'], row['categoria']): (Decimal(str(row['totale'])), int(row['conteggio']))
+                for row in cursor.fetchall()
+            }
+        
+        differenze = []
+        for key in sorted(set(attesi) | set(trovati)):
+            if attesi.get(key) != trovati.get(key):
+                differenze.append(key + (attesi.get(key), trovati.get(key)))
+        
+        return differenze
+
+
+class MetadatiSpese:
+    """
+    Insiemi di categorie e mesi usati da ogni utente, tenuti in meta_cache insieme alla versione dei dati
+    (VersioneDati) a cui si riferiscono: ogni processo ha la propria cache, quindi una voce con una versione
+    diversa da quella nel database (scritta da un altro worker) viene ricaricata dal riepilogo mensile.
+    Le scritture del processo li aggiornano in modo incrementale: un inserimento aggiunge categoria e mese,
+    una modifica o un'eliminazione ricontrolla nel riepilogo mensile solo la categoria e il mese interessati.
+    """
+    
+    _lock = threading.Lock()
+    
+    QUERY = "SELECT mese, categoria FROM riepilogo_mensile WHERE user_id = %s"
+    
+    @classmethod
+    def _load(cls, user_id):
+        result = execute_query(cls.QUERY, (user_id,), fetch=True) or []
+        
+        return {
+            'categorie': frozenset(row['categoria'] for row in result),
+            'mesi': frozenset(row['mese'] for row in result)
+        }
+    
+    @classmethod
+    def get(cls, user_id):
+        """Restituisce {'categorie': frozenset, 'mesi': frozenset} per l'utente, leggendolo dal riepilogo se necessario"""
+        # La versione va letta prima dei dati: una scrittura concorrente può solo rendere la voce più recente della versione.
+        version = VersioneDati.get(user_id)
+        meta = meta_cache.get(user_id)
+        
+        if meta is None or meta['version'] != version:
+            meta = dict(cls._load(user_id), version=version)
+            with cls._lock:
+                # Un caricamento più lento di una scrittura non sostituisce una voce più recente
+                current = meta_cache.peek(user_id)
+                if current is None or current['version'] <= version:
+                    meta_cache.set(user_id, meta)
+        
+        return meta
+    
+    @classmethod
+    def _update(cls, user_id, version, categorie=None, mesi=None):
+        # Gli insiemi non vengono mai modificati sul posto: si sostituisce la voce con una copia aggiornata.
+        # Si aggiorna solo una voce allineata alla versione precedente alla scrittura (o già a quella nuova,
+        # per le scritture che aggiornano più volte lo stesso utente): le altre verranno ricaricate da get.
+        with cls._lock:
+            meta = meta_cache.peek(user_id)
+            if meta is not None and version - 1 <= meta['version'] <= version:
+                meta_cache.set(user_id, {
+                    'categorie': categorie(meta['categorie']) if categorie else meta['categorie'],
+                    'mesi': mesi(meta['mesi']) if mesi else meta['mesi'],
+                    'version': version
+                })
+    
+    @classmethod
+    def on_insert(cls, user_id, version, categoria, mese):
+        """Aggiunge categoria e mese di una spesa appena salvata con la versione dei dati version"""
+        cls._update(user_id, version, lambda c: c | {categoria}, lambda m: m | {mese})
+    
+    @classmethod
+    def on_delete(cls, user_id, version, categoria=None, mese=None):
+        """Dopo l'eliminazione (o lo spostamento) di una spesa, rimuove categoria e mese se non sono più usati"""
+        if meta_cache.peek(user_id) is None:
+            return
+        
+        rimuovi_categoria = rimuovi_mese = None
+        
+        if categoria is not None and not execute_query(
+            "SELECT 1 FROM riepilogo_mensile WHERE user_id = %s AND categoria = %s LIMIT 1",
+            (user_id, categoria), fetch=True
+        ):
+            rimuovi_categoria = lambda c: c - {categoria}
+        
+        if mese is not None and not execute_query(
+            "SELECT 1 FROM riepilogo_mensile WHERE user_id = %s AND mese = %s LIMIT 1",
+            (user_id, mese), fetch=True
+        ):
+            rimuovi_mese = lambda m: m - {mese}
+        
+        cls._update(user_id, version, rimuovi_categoria, rimuovi_mese)
+
+
+class VersioneDati:
+    """
+    Versione dei dati di ogni utente (colonna users.data_version), incrementata nella stessa transazione
+    di ogni scrittura sulle sue spese. Due letture con la stessa versione restituiscono gli stessi dati:
+    le API la usano per gli ETag e rispondono 304 senza interrogare la tabella spese, e fa parte
+    della chiave delle pagine in page_cache.
+    """
+    
+    QUERY = "SELECT data_version FROM users WHERE id = %s"
+    
+    @staticmethod
+    def bump(cursor, user_id):
+        """Incrementa la versione dell'utente usando il cursore della transazione corrente e restituisce quella nuova"""
+        cursor.execute("UPDATE users SET data_version = data_version + 1 WHERE id = %s", (user_id,))
+        # La riga resta bloccata fino al commit: la versione letta è esattamente quella scritta da questa transazione
+        cursor.execute("SELECT data_version FROM users WHERE id = %s", (user_id,))
+        row = cursor.fetchone()
+        return int(row['data_version']) if row else 0
+    
+    @classmethod
+    def get(cls, user_id):
+        """Restituisce la versione corrente dei dati dell'utente (0 se l'utente non esiste)"""
+        result = execute_query(cls.QUERY, (user_id,), fetch=True, dictionary=False, prepared=True)
+        return int(result[0][0]) if result else 0
+    
+    @staticmethod
+    def invalidate_pages(user_id):
+        """
+        Elimina le pagine dell'utente da page_cache dopo una scrittura. Con la nuova versione non verrebbero
+        più lette comunque: così liberano subito spazio invece di aspettare di essere le meno recenti.
+        """
+        if page_cache is not None:
+            page_cache.invalidate(user_id)
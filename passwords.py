@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from config import Config
+
+# bcrypt è volutamente lento: gli hash vengono calcolati in un pool di thread dedicato (bcrypt rilascia il GIL),
+# con un semaforo che limita le operazioni in corso o in coda. Così una raffica di login occupa al massimo
+# BCRYPT_WORKERS core, invece di bloccare tutti i worker che servono le normali pagine.
+
+
+class PasswordServiceBusy(Exception):
+    """Troppe operazioni bcrypt in corso: la richiesta viene rifiutata invece di restare in coda"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(Config.BCRYPT_MAX_PENDING)
+
+_stats_lock = threading.Lock()
+_stats = {}
+_rejected = 0
+
+
+def _after_fork():
+    # I thread del pool non sopravvivono al fork: il processo figlio ne crea di nuovi alla prima operazione.
+    global _executor, _executor_lock, _slots, _stats_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+    _slots = threading.BoundedSemaphore(Config.BCRYPT_MAX_PENDING)
+    _stats_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _get_executor():
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.BCRYPT_WORKERS, thread_name_prefix='bcrypt')
+    return _executor
+
+
+def _record(op, queued, elapsed):
+    with _stats_lock:
+        stat = _stats.setdefault(op, {'count': 0, 'seconds_total': 0.0, 'seconds_max': 0.0, 'queue_seconds_total': 0.0})
+        stat['count'] += 1
+        stat['seconds_total'] += elapsed
+        stat['seconds_max'] = max(stat['seconds_max'], elapsed)
+        stat['queue_seconds_total'] += queued
+
+
+def _timed(op, submitted_at, fn, *args):
+    started_at = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        _record(op, started_at - submitted_at, time.perf_counter() - started_at)
+
+
+def _run(op, fn, *args):
+    global _rejected
+
+    if not _slots.acquire(timeout=Config.BCRYPT_ACQUIRE_TIMEOUT):
+        with _stats_lock:
+            _rejected += 1
+        raise PasswordServiceBusy("Troppe operazioni sulle password in corso")
+
+    try:
+        return _get_executor().submit(_timed, op, time.perf_counter(), fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _verify(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_password(password):
+    """Crea l'hash bcrypt di una password con il costo Config.BCRYPT_ROUNDS"""
+    return _run('hash', _hash, password, Config.BCRYPT_ROUNDS)
+
+
+def verify_password(password, password_hash):
+    """Verifica una password rispetto a un hash bcrypt"""
+    return _run('verify', _verify, password, password_hash)
+
+
+def get_rounds(password_hash):
+    """Restituisce il costo con cui è stato calcolato un hash bcrypt ($2b$<costo>$...), o None se non riconosciuto"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    """Indica se l'hash è stato calcolato con un costo diverso da quello configurato"""
+    return get_rounds(password_hash) != Config.BCRYPT_ROUNDS
+
+
+def stats():
+    """Restituisce tempi e conteggi delle operazioni bcrypt, utili per dimensionare il pool"""
+    with _stats_lock:
+        ops = {}
+        for op, stat in _stats.items():
+            ops[op] = dict(stat, seconds_avg=stat['seconds_total'] / stat['count'] if stat['count'] else 0.0)
+
+        return {
+            'workers': Config.BCRYPT_WORKERS,
+            'max_pending': Config.BCRYPT_MAX_PENDING,
+            'rounds': Config.BCRYPT_ROUNDS,
+            'rejected': _rejected,
+            'operations': ops,
+        }
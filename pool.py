@@ -0,0 +1,377 @@
+import time
+import bisect
+import weakref
+import threading
+from collections import deque
+
+# Limiti superiori (in secondi) degli intervalli dell'istogramma dei tempi di attesa
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+
+class PoolTimeoutError(Exception):
+    """Nessuna connessione si è liberata entro il timeout di attesa del pool"""
+
+
+class PooledConnection:
+    """
+    Connessione presa in prestito dal pool.
+    Attributi e metodi vengono delegati alla connessione reale; close() la restituisce al pool invece di chiuderla.
+    """
+
+    def __init__(self, pool, conn, created_at):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_created_at', created_at)
+        object.__setattr__(self, '_released', False)
+
+    @property
+    def raw_connection(self):
+        """La connessione reale, ad esempio per associarle risorse che devono durare quanto lei"""
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def close(self):
+        if not self._released:
+            object.__setattr__(self, '_released', True)
+            self._pool._release(self._conn, self._created_at)
+
+
+class ConnectionPool:
+    """
+    Pool di connessioni thread-safe con attesa bloccante.
+    Mantiene fino a size connessioni aperte e ne può creare altre max_overflow nei picchi di carico,
+    chiudendole appena vengono restituite. Quando tutte le connessioni sono occupate, get_connection
+    attende fino a timeout secondi che se ne liberi una invece di fallire subito.
+    Prima di riusare una connessione ferma da più di pre_ping_after secondi ne verifica lo stato,
+    e sostituisce quelle più vecchie di recycle secondi.
+    """
+
+    def __init__(self, connect, size=5, max_overflow=0, timeout=30, recycle=3600, pre_ping_after=10):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping_after = pre_ping_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        self._waiters = 0
+
+        self._wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+        self._wait_total = 0.0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._invalidated = 0
+
+    def _record_wait(self, waited):
+        self._checkouts += 1
+        self._wait_total += waited
+        self._wait_counts[bisect.bisect_left(WAIT_BUCKETS, waited)] += 1
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _create(self):
+        conn = self._connect()
+        with self._cond:
+            self._created += 1
+        return conn, time.monotonic()
+
+    def _is_usable(self, conn, created_at, idle_since):
+        now = time.monotonic()
+
+        if self.recycle and now - created_at > self.recycle:
+            with self._cond:
+                self._recycled += 1
+            return False
+
+        if now - idle_since >= self.pre_ping_after:
+            try:
+                if not conn.is_connected():
+                    raise ConnectionError()
+            except Exception:
+                with self._cond:
+                    self._invalidated += 1
+                return False
+
+        return True
+
+    def get_connection(self, timeout=None):
+        """
+        Prende una connessione dal pool, attendendo al massimo timeout secondi (default: quello del pool).
+        Solleva PoolTimeoutError se nel frattempo non se ne libera nessuna.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    item = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    item = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(f"Nessuna connessione disponibile dopo {timeout} secondi")
+
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+
+            self._in_use += 1
+            self._record_wait(time.monotonic() - start)
+
+        try:
+            if item is not None:
+                conn, created_at, idle_since = item
+                if self._is_usable(conn, created_at, idle_since):
+                    return PooledConnection(self, conn, created_at)
+                self._discard(conn)
+
+            conn, created_at = self._create()
+            return PooledConnection(self, conn, created_at)
+
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn, created_at):
+        reusable = True
+        try:
+            # Una transazione lasciata aperta non deve passare alla richiesta successiva.
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            reusable = False
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable and len(self._idle) < self.size:
+                self._idle.append((conn, created_at, time.monotonic()))
+                conn = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if conn is not None:
+            self._discard(conn)
+
+    def close_all(self):
+        """Chiude tutte le connessioni inattive (quelle in uso vengono chiuse quando tornano al pool)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """Restituisce lo stato del pool e l'istogramma (cumulativo) dei tempi di attesa"""
+        with self._cond:
+            histogram = {}
+            cumulative = 0
+            for bound, count in zip(WAIT_BUCKETS + ('+Inf',), self._wait_counts):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiters': self._waiters,
+                'checkouts': self._checkouts,
+                'wait_seconds_total': round(self._wait_total, 6),
+                'wait_histogram': histogram,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'recycled': self._recycled,
+                'invalidated': self._invalidated,
+            }
+
+
+class ThreadLocalPool:
+    """
+    Pool con una connessione per thread, pensato per i database incorporati (SQLite) dove aprire
+    una connessione non costa un viaggio in rete ma conviene comunque riusarla (cache degli statement).
+    Ogni thread riprende sempre la propria connessione; se la chiede di nuovo mentre è già in uso
+    (ad esempio per uno stream durante una richiesta) ne riceve una aggiuntiva, chiusa appena restituita.
+    Le connessioni dei thread terminati vengono chiuse dal garbage collector.
+    """
+
+    def __init__(self, connect, pre_ping_after=10):
+        self._connect = connect
+        self.pre_ping_after = pre_ping_after
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = weakref.WeakSet()
+        self._in_use = 0
+        self._checkouts = 0
+        self._created = 0
+        self._invalidated = 0
+
+    def get_connection(self, timeout=None):
+        """Restituisce la connessione del thread corrente (timeout è accettato per compatibilità con ConnectionPool)"""
+        item = getattr(self._local, 'idle', None)
+        self._local.idle = None
+        conn = None
+
+        if item is not None:
+            conn, created_at, idle_since = item
+            if time.monotonic() - idle_since >= self.pre_ping_after and not conn.is_connected():
+                with self._lock:
+                    self._invalidated += 1
+                conn = None
+
+        if conn is None:
+            conn = self._connect()
+            created_at = time.monotonic()
+            with self._lock:
+                self._created += 1
+                self._open.add(conn)
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+
+        return PooledConnection(self, conn, created_at)
+
+    def _release(self, conn, created_at):
+        reusable = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            reusable = False
+
+        with self._lock:
+            self._in_use -= 1
+
+        if reusable and getattr(self._local, 'idle', None) is None:
+            self._local.idle = (conn, created_at, time.monotonic())
+        else:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close_all(self):
+        """Chiude la connessione inattiva del thread corrente"""
+        item = getattr(self._local, 'idle', None)
+        self._local.idle = None
+
+        if item is not None:
+            try:
+                item[0].close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """Restituisce lo stato del pool (stesse chiavi principali di ConnectionPool.stats)"""
+        with self._lock:
+            return {
+                'open': len(self._open),
+                'in_use': self._in_use,
+                'checkouts': self._checkouts,
+                'created': self._created,
+                'invalidated': self._invalidated,
+            }
+
+
+class ReplicaSet:
+    """
+    Insieme di pool verso le repliche in sola lettura, usati a turno (round-robin).
+    Una replica che non riesce a fornire una connessione viene considerata non disponibile e saltata
+    per retry_after secondi. Se nessuna replica fornisce una connessione get_connection solleva l'errore
+    dell'ultima provata, o PoolTimeoutError se sono tutte escluse: il chiamante legge allora dal primario.
+    Un pool saturo (PoolTimeoutError) non rende la replica non disponibile: con timeout=0 si passa
+    subito alla replica successiva, senza attendere che se ne liberi una connessione.
+    """
+
+    def __init__(self, pools, names=None, retry_after=30):
+        self._pools = list(pools)
+        self._names = list(names) if names else [str(i) for i in range(len(self._pools))]
+        self.retry_after = retry_after
+        self._down_until = [0.0] * len(self._pools)
+        self._failures = [0] * len(self._pools)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pools)
+
+    def get_connection(self, timeout=None, replica=None):
+        """Connessione dalla prossima replica disponibile o, se indicato l'indice replica, solo da quella replica"""
+        if replica is not None:
+            indexes = [replica]
+        else:
+            with self._lock:
+                start = self._next
+                self._next = (self._next + 1) % len(self._pools)
+            indexes = [(start + offset) % len(self._pools) for offset in range(len(self._pools))]
+
+        now = time.monotonic()
+        error = None
+
+        for index in indexes:
+            if self._down_until[index] > now:
+                continue
+
+            try:
+                return self._pools[index].get_connection(timeout=timeout)
+            except PoolTimeoutError as e:
+                error = e
+            except Exception as e:
+                error = e
+                with self._lock:
+                    self._down_until[index] = time.monotonic() + self.retry_after
+                    self._failures[index] += 1
+
+        raise error or PoolTimeoutError("Nessuna replica disponibile")
+
+    def index_of(self, conn):
+        """Indice della replica da cui proviene una connessione restituita da get_connection"""
+        return self._pools.index(conn._pool)
+
+    def close_all(self):
+        for pool in self._pools:
+            pool.close_all()
+
+    def stats(self):
+        """Stato di ogni replica: nome, disponibilità, errori di connessione e statistiche del suo pool"""
+        now = time.monotonic()
+        return [
+            {
+                'replica': name,
+                'healthy': self._down_until[i] <= now,
+                'failures': self._failures[i],
+                **pool.stats(),
+            }
+            for i, (name, pool) in enumerate(zip(self._names, self._pools))
+        ]
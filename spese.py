@@ -1,227 +1,482 @@
-import io
-import csv
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file
-from decimal import Decimal, InvalidOperation
-from datetime import datetime
-from models import Spesa
-from auth import login_required
-
-spese_bp = Blueprint('spese', __name__)
-
-@spese_bp.route('/')
-@login_required
-def index():
-    """Pagina principale con elenco delle spese dell'utente loggato"""
-    user_id = session.get('user_id')
-    spese = Spesa.get_all(user_id=user_id)
-    totale = sum(spesa.importo for spesa in spese if spesa.importo)
-    categorie = Spesa.get_categorie(user_id=user_id)
-    
-    return render_template('index.html', spese=spese, totale=totale, categorie=categorie)
-
-@spese_bp.route('/add', methods=['POST'])
-@login_required
-def add_spesa():
-    """Aggiunge una nuova spesa dopo validazione dei dati"""
-    user_id = session.get('user_id')
-    
-    data = request.form.get('data')
-    categoria = request.form.get('categoria')
-    descrizione = request.form.get('descrizione')
-    importo = request.form.get('importo')
-    
-    errors = []
-    
-    if not data:
-        errors.append("La data è obbligatoria")
-    else:
-        try:
-            datetime.strptime(data, "%Y-%m-%d")
-        except ValueError:
-            errors.append("Formato data non valido (YYYY-MM-DD)")
-    
-    if not categoria:
-        errors.append("La categoria è obbligatoria")
-    
-    if not descrizione:
-        errors.append("La descrizione è obbligatoria")
-    
-    if not importo:
-        errors.append("L'importo è obbligatorio")
-    else:
-        try:
-            importo_decimal = Decimal(importo.replace(',', '.'))
-            if importo_decimal <= 0:
-                errors.append("L'importo deve essere maggiore di zero")
-        except InvalidOperation:
-            errors.append("Importo non valido")
-    
-    if errors:
-        for error in errors:
-            flash(error, 'danger')
-        return redirect(url_for('spese.index'))
-    
-    spesa = Spesa(
-        user_id=user_id,
-        data=data,
-        categoria=categoria,
-        descrizione=descrizione,
-        importo=importo_decimal
-    )
-    
-    if spesa.save():
-        flash('Spesa aggiunta con successo!', 'success')
-    else:
-        flash('Errore durante il salvataggio della spesa', 'danger')
-    
-    return redirect(url_for('spese.index'))
-
-@spese_bp.route('/edit/<int:id>', methods=['GET', 'POST'])
-@login_required
-def edit_spesa(id):
-    """Modifica una spesa esistente"""
-    user_id = session.get('user_id')
-    spesa = Spesa.get_by_id(id, user_id)
-    
-    if not spesa:
-        flash('Spesa non trovata o non autorizzata', 'danger')
-        return redirect(url_for('spese.index'))
-    
-    if request.method == 'POST':
-        data = request.form.get('data')
-        categoria = request.form.get('categoria')
-        descrizione = request.form.get('descrizione')
-        importo = request.form.get('importo')
-        
-        errors = []
-        
-        if not data:
-            errors.append("La data è obbligatoria")
-        else:
-            try:
-                datetime.strptime(data, "%Y-%m-%d")
-            except ValueError:
-                errors.append("Formato data non valido (YYYY-MM-DD)")
-        
-        if not categoria:
-            errors.append("La categoria è obbligatoria")
-        
-        if not descrizione:
-            errors.append("La descrizione è obbligatoria")
-        
-        if not importo:
-            errors.append("L'importo è obbligatorio")
-        else:
-            try:
-                importo_decimal = Decimal(importo.replace(',', '.'))
-                if importo_decimal <= 0:
-                    errors.append("L'importo deve essere maggiore di zero")
-            except InvalidOperation:
-                errors.append("Importo non valido")
-        
-        if errors:
-            for error in errors:
-                flash(error, 'danger')
-            return redirect(url_for('spese.edit_spesa', id=id))
-        
-        spesa.data = datetime.strptime(data, "%Y-%m-%d").date()
-        spesa.categoria = categoria
-        spesa.descrizione = descrizione
-        spesa.importo = importo_decimal
-        
-        if spesa.save():
-            flash('Spesa aggiornata con successo!', 'success')
-            return redirect(url_for('spese.index'))
-        else:
-            flash('Errore durante l\'aggiornamento della spesa', 'danger')
-    
-    categorie = Spesa.get_categorie(user_id=user_id)
-    return render_template('edit.html', spesa=spesa, categorie=categorie)
-
-@spese_bp.route('/delete/<int:id>', methods=['POST'])
-@login_required
-def delete_spesa(id):
-    """Elimina una spesa"""
-    user_id = session.get('user_id')
-    spesa = Spesa.get_by_id(id, user_id)
-    
-    if not spesa:
-        flash('Spesa non trovata o non autorizzata', 'danger')
-    elif spesa.delete():
-        flash('Spesa eliminata con successo!', 'success')
-    else:
-        flash('Errore durante l\'eliminazione della spesa', 'danger')
-    
-    return redirect(url_for('spese.index'))
-
-@spese_bp.route('/filter')
-@login_required
-def filter_spese():
-    """Filtra le spese per categoria e/o mese (query string)"""
-    user_id = session.get('user_id')
-    categoria = request.args.get('categoria')
-    mese = request.args.get('mese')
-    
-    filters = {}
-    if categoria:
-        filters['categoria'] = categoria
-    if mese:
-        filters['mese'] = mese
-    
-    spese = Spesa.get_all(user_id=user_id, filters=filters)
-    totale = sum(spesa.importo for spesa in spese if spesa.importo)
-    
-    categorie = Spesa.get_categorie(user_id=user_id)
-    mesi = Spesa.get_mesi(user_id=user_id)
-    
-    return render_template(
-        'report.html', 
-        spese=spese, 
-        totale=totale, 
-        categorie=categorie, 
-        mesi=mesi,
-        selected_categoria=categoria,
-        selected_mese=mese
-    )
-
-@spese_bp.route('/export')
-@login_required
-def export_spese():
-    """Esporta le spese filtrate in un file CSV che poi sarà scaricabile"""
-    user_id = session.get('user_id')
-    categoria = request.args.get('categoria')
-    mese = request.args.get('mese')
-    
-    filters = {}
-    if categoria:
-        filters['categoria'] = categoria
-    if mese:
-        filters['mese'] = mese
-    
-    spese = Spesa.get_all(user_id=user_id, filters=filters)
-    
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=['id', 'user_id', 'data', 'categoria', 'descrizione', 'importo'])
-    writer.writeheader()
-    
-    for spesa in spese:
-        writer.writerow(spesa.to_dict())
-    
-    mem = io.BytesIO()
-    mem.write(output.getvalue().encode('utf-8'))
-    mem.seek(0)
-    output.close()
-    
-    filename = "spese"
-    if categoria:
-        filename += f"_{categoria}"
-    if mese:
-        filename += f"_{mese}"
-    filename += ".csv"
-    
-    return send_file(
-        mem,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
-    )
\ No newline at end of file
+import io
+import os
+import csv
+import hashlib
+import unicodedata
+from urllib.parse import quote, urlencode
+from flask import (
+    Blueprint, Response, render_template, stream_template, request, redirect, url_for, flash, session, jsonify,
+    get_flashed_messages
+)
+from decimal import Decimal, InvalidOperation
+from datetime import datetime
+from config import Config
+from db import stream_query, release_db
+from models import Spesa, VersioneDati, page_cache, arrotonda_importo
+from auth import login_required
+
+spese_bp = Blueprint('spese', __name__)
+
+def set_attachment_filename(response, filename):
+    """
+    Imposta l'header Content-Disposition per il download, come fa send_file:
+    i nomi non ASCII (ad esempio categorie accentate) vengono passati anche nella forma RFC 5987 (filename*).
+    """
+    try:
+        filename.encode('ascii')
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        quoted = quote(filename, safe="!#$&+^`|~")
+        response.headers.set(
+            'Content-Disposition', 'attachment', filename=simple, **{'filename*': f"UTF-8''{quoted}"}
+        )
+
+# Segnaposto scritto al posto dei messaggi flash nelle pagine in cache, sostituito a ogni richiesta
+FLASH_PLACEHOLDER = '<!-- flash-messages -->'
+
+def _templates_signature():
+    # Data e dimensione dei template fanno parte della chiave: dopo un aggiornamento dei template
+    # le pagine generate con quelli vecchi (ad esempio nella cache su file) non vengono più usate.
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+    parts = []
+    for name in sorted(os.listdir(directory)):
+        stat = os.stat(os.path.join(directory, name))
+        parts.append(f"{name}:{stat.st_mtime_ns}:{stat.st_size}")
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+TEMPLATES_SIGNATURE = _templates_signature()
+
+def render_cached(view, template, build_context):
+    """
+    Restituisce la pagina generata da template con il contesto di build_context(), passando da page_cache.
+    La chiave comprende utente, view, parametri della query string e versione dei dati dell'utente:
+    ogni scrittura sulle spese cambia la versione, quindi una pagina in cache non è mai più vecchia dei dati.
+    I messaggi flash restano fuori dalla parte in cache e vengono inseriti a ogni richiesta.
+    """
+    if page_cache is None:
+        return render_template(template, **build_context())
+    
+    user_id = session.get('user_id')
+    # La versione va letta prima dei dati: una scrittura concorrente può solo rendere la pagina più recente della chiave.
+    version = VersioneDati.get(user_id)
+    # Parametri codificati: "q=a&x=b" e "q=a%26x%3Db" sono ricerche diverse e devono avere chiavi diverse
+    params = urlencode(sorted(request.args.items(multi=True)))
+    raw = f"{TEMPLATES_SIGNATURE}:{view}:{session.get('username')}:{version}:{params}"
+    key = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    
+    body = page_cache.get(user_id, key)
+    status = 'hit'
+    if body is None:
+        status = 'miss'
+        body = render_template(template, flash_placeholder=FLASH_PLACEHOLDER, **build_context()).encode('utf-8')
+        page_cache.set(user_id, key, body)
+    
+    flashes = render_template('flash_messages.html').encode('utf-8')
+    response = Response(body.replace(FLASH_PLACEHOLDER.encode('ascii'), flashes, 1), mimetype='text/html')
+    response.headers['X-Page-Cache'] = status
+    return response
+
+def _bufferizza(chunks, size):
+    # Jinja produce frammenti di poche decine di byte: vengono raggruppati in blocchi di circa size byte.
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_page(template, **context):
+    """
+    Genera la pagina in streaming: l'intestazione e i form partono subito, le righe vengono prodotte man mano
+    che il generatore passato nel contesto (ad esempio Spesa.iter_all) le legge dal database.
+    Nulla che dipenda dal numero di righe viene tenuto in memoria; i totali vanno calcolati prima, con una query aggregata.
+    """
+    # I messaggi flash vanno tolti dalla sessione ora: quando il template li legge gli header
+    # (e il cookie di sessione) sono già stati inviati. Flask li conserva per il resto della richiesta.
+    get_flashed_messages(with_categories=True)
+    
+    # Totali e categorie sono già nel contesto: la connessione della richiesta torna al pool ora, invece di
+    # restare occupata (insieme a quella dello stream) finché un client lento non ha scaricato tutta la pagina.
+    release_db()
+    
+    chunks = stream_template(template, streaming=True, **context)
+    return Response(_bufferizza(chunks, Config.STREAM_BUFFER_SIZE), mimetype='text/html')
+
+# Lunghezze massime delle colonne in migration/init.sql
+MAX_CATEGORIA = 100
+MAX_DESCRIZIONE = 255
+
+# Numero massimo di errori di importazione mostrati singolarmente
+MAX_IMPORT_ERRORS = 10
+
+def valida_spesa(data, categoria, descrizione, importo):
+    """
+    Valida i campi di una spesa (form di inserimento/modifica o riga di un CSV importato).
+    Ritorna:
+        tuple: (lista degli errori, importo convertito in Decimal e arrotondato ai centesimi oppure None)
+    """
+    errors = []
+    importo_decimal = None
+    
+    if not data:
+        errors.append("La data è obbligatoria")
+    else:
+        try:
+            datetime.strptime(data, "%Y-%m-%d")
+        except ValueError:
+            errors.append("Formato data non valido (YYYY-MM-DD)")
+    
+    if not categoria:
+        errors.append("La categoria è obbligatoria")
+    elif len(categoria) > MAX_CATEGORIA:
+        errors.append(f"La categoria non può superare {MAX_CATEGORIA} caratteri")
+    
+    if not descrizione:
+        errors.append("La descrizione è obbligatoria")
+    elif len(descrizione) > MAX_DESCRIZIONE:
+        errors.append(f"La descrizione non può superare {MAX_DESCRIZIONE} caratteri")
+    
+    if not importo:
+        errors.append("L'importo è obbligatorio")
+    else:
+        try:
+            importo_decimal = Decimal(importo.replace(',', '.'))
+            if not importo_decimal.is_finite():
+                errors.append("Importo non valido")
+            else:
+                # Come verrà salvato nel database: 0.001 diventa 0.00 e non è un importo valido
+                importo_decimal = arrotonda_importo(importo_decimal)
+                if importo_decimal <= 0:
+                    errors.append("L'importo deve essere maggiore di zero")
+        except InvalidOperation:
+            errors.append("Importo non valido")
+    
+    return errors, importo_decimal
+
+@spese_bp.route('/')
+@login_required
+def index():
+    """Pagina principale con elenco delle spese dell'utente loggato"""
+    user_id = session.get('user_id')
+    
+    # Con ?tutte=1 l'elenco completo viene generato in streaming, senza paginazione (e senza cache).
+    if request.args.get('tutte'):
+        totale, conteggio = Spesa.get_totali(user_id=user_id)
+        return stream_page(
+            'index.html',
+            spese=Spesa.iter_all(user_id=user_id),
+            totale=totale,
+            conteggio=conteggio,
+            categorie=Spesa.get_categorie(user_id=user_id)
+        )
+    
+    def build_context():
+        spese, next_cursor, prev_cursor = Spesa.get_page(user_id=user_id, cursor=request.args.get('cursor'))
+        totale, conteggio = Spesa.get_totali(user_id=user_id)
+        return {
+            'spese': spese,
+            'totale': totale,
+            'conteggio': conteggio,
+            'categorie': Spesa.get_categorie(user_id=user_id),
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor
+        }
+    
+    return render_cached('index', 'index.html', build_context)
+
+@spese_bp.route('/add', methods=['POST'])
+@login_required
+def add_spesa():
+    """Aggiunge una nuova spesa dopo validazione dei dati"""
+    user_id = session.get('user_id')
+    
+    data = request.form.get('data')
+    categoria = request.form.get('categoria')
+    descrizione = request.form.get('descrizione')
+    importo = request.form.get('importo')
+    
+    errors, importo_decimal = valida_spesa(data, categoria, descrizione, importo)
+    
+    if errors:
+        for error in errors:
+            flash(error, 'danger')
+        return redirect(url_for('spese.index'))
+    
+    spesa = Spesa(
+        user_id=user_id,
+        data=data,
+        categoria=categoria,
+        descrizione=descrizione,
+        importo=importo_decimal
+    )
+    
+    if spesa.save():
+        flash('Spesa aggiunta con successo!', 'success')
+    else:
+        flash('Errore durante il salvataggio della spesa', 'danger')
+    
+    return redirect(url_for('spese.index'))
+
+@spese_bp.route('/import', methods=['POST'])
+@login_required
+def import_spese():
+    """
+    Importa le spese da un file CSV nello stesso formato dell'esportazione (id e user_id vengono ignorati).
+    Le righe vengono validate una alla volta mentre il file viene letto; quelle valide vengono inserite
+    a blocchi in un'unica transazione, quelle non valide vengono segnalate con il numero di riga.
+    """
+    user_id = session.get('user_id')
+    file = request.files.get('file')
+    
+    if not file or not file.filename:
+        flash('Seleziona un file CSV da importare', 'danger')
+        return redirect(url_for('spese.index'))
+    
+    reader = csv.DictReader(io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline=''))
+    errors = []
+    scartate = 0
+    
+    try:
+        colonne_mancanti = [c for c in ('data', 'categoria', 'descrizione', 'importo') if c not in (reader.fieldnames or [])]
+        if colonne_mancanti:
+            flash(f"Colonne mancanti nel CSV: {', '.join(colonne_mancanti)}", 'danger')
+            return redirect(url_for('spese.index'))
+        
+        def righe_valide():
+            nonlocal scartate
+            
+            for row in reader:
+                riga_errors, importo_decimal = valida_spesa(
+                    row.get('data'), row.get('categoria'), row.get('descrizione'), row.get('importo')
+                )
+                
+                if riga_errors:
+                    scartate += 1
+                    if len(errors) < MAX_IMPORT_ERRORS:
+                        errors.append(f"Riga {reader.line_num}: {'; '.join(riga_errors)}")
+                    continue
+                
+                yield Spesa(
+                    user_id=user_id,
+                    data=row['data'],
+                    categoria=row['categoria'],
+                    descrizione=row['descrizione'],
+                    importo=importo_decimal
+                )
+        
+        inserite = Spesa.bulk_insert(user_id, righe_valide())
+    
+    except (UnicodeDecodeError, csv.Error) as e:
+        flash(f"File CSV non valido: {e}", 'danger')
+        return redirect(url_for('spese.index'))
+    
+    for error in errors:
+        flash(error, 'danger')
+    if scartate > len(errors):
+        flash(f"... e altre {scartate - len(errors)} righe non valide", 'danger')
+    
+    flash(f"Importate {inserite} spese", 'success' if inserite else 'warning')
+    return redirect(url_for('spese.index'))
+
+@spese_bp.route('/edit/<int:id>', methods=['GET', 'POST'])
+@login_required
+def edit_spesa(id):
+    """Modifica una spesa esistente"""
+    user_id = session.get('user_id')
+    spesa = Spesa.get_by_id(id, user_id)
+    
+    if not spesa:
+        flash('Spesa non trovata o non autorizzata', 'danger')
+        return redirect(url_for('spese.index'))
+    
+    if request.method == 'POST':
+        data = request.form.get('data')
+        categoria = request.form.get('categoria')
+        descrizione = request.form.get('descrizione')
+        importo = request.form.get('importo')
+        
+        errors, importo_decimal = valida_spesa(data, categoria, descrizione, importo)
+        
+        if errors:
+            for error in errors:
+                flash(error, 'danger')
+            return redirect(url_for('spese.edit_spesa', id=id))
+        
+        spesa.data = datetime.strptime(data, "%Y-%m-%d").date()
+        spesa.categoria = categoria
+        spesa.descrizione = descrizione
+        spesa.importo = importo_decimal
+        
+        if spesa.save():
+            flash('Spesa aggiornata con successo!', 'success')
+        else:
+            flash('Spesa non trovata: potrebbe essere stata eliminata', 'danger')
+        return redirect(url_for('spese.index'))
+    
+    categorie = Spesa.get_categorie(user_id=user_id)
+    return render_template('edit.html', spesa=spesa, categorie=categorie)
+
+@spese_bp.route('/delete/<int:id>', methods=['POST'])
+@login_required
+def delete_spesa(id):
+    """Elimina una spesa"""
+    user_id = session.get('user_id')
+    spesa = Spesa.get_by_id(id, user_id)
+    
+    if not spesa:
+        flash('Spesa non trovata o non autorizzata', 'danger')
+    elif spesa.delete():
+        flash('Spesa eliminata con successo!', 'success')
+    else:
+        flash('Errore durante l\'eliminazione della spesa', 'danger')
+    
+    return redirect(url_for('spese.index'))
+
+@spese_bp.route('/filter')
+@login_required
+def filter_spese():
+    """Filtra le spese per categoria e/o mese (query string)"""
+    user_id = session.get('user_id')
+    categoria = request.args.get('categoria')
+    mese = request.args.get('mese')
+    
+    filters = {}
+    if categoria:
+        filters['categoria'] = categoria
+    if mese:
+        filters['mese'] = mese
+    
+    if request.args.get('tutte'):
+        totale, conteggio = Spesa.get_totali(user_id=user_id, filters=filters)
+        return stream_page(
+            'report.html',
+            spese=Spesa.iter_all(user_id=user_id, filters=filters),
+            totale=totale,
+            conteggio=conteggio,
+            categorie=Spesa.get_categorie(user_id=user_id),
+            mesi=Spesa.get_mesi(user_id=user_id),
+            selected_categoria=categoria,
+            selected_mese=mese
+        )
+    
+    def build_context():
+        spese, next_cursor, prev_cursor = Spesa.get_page(
+            user_id=user_id, 
+            filters=filters, 
+            cursor=request.args.get('cursor')
+        )
+        totale, conteggio = Spesa.get_totali(user_id=user_id, filters=filters)
+        return {
+            'spese': spese,
+            'totale': totale,
+            'conteggio': conteggio,
+            'categorie': Spesa.get_categorie(user_id=user_id),
+            'mesi': Spesa.get_mesi(user_id=user_id),
+            'selected_categoria': categoria,
+            'selected_mese': mese,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor
+        }
+    
+    return render_cached('report', 'report.html', build_context)
+
+@spese_bp.route('/search')
+@login_required
+def search_spese():
+    """Ricerca full-text su descrizione e categoria (parametro q), combinabile con i filtri categoria e mese"""
+    user_id = session.get('user_id')
+    testo = request.args.get('q', '').strip()
+    categoria = request.args.get('categoria')
+    mese = request.args.get('mese')
+    
+    filters = {}
+    if categoria:
+        filters['categoria'] = categoria
+    if mese:
+        filters['mese'] = mese
+    
+    try:
+        pagina = max(int(request.args.get('pagina', 1)), 1)
+    except ValueError:
+        pagina = 1
+    
+    def build_context():
+        spese, has_next = Spesa.search(testo, user_id=user_id, filters=filters, pagina=pagina) if testo else ([], False)
+        return {
+            'spese': spese,
+            'has_next': has_next,
+            'pagina': pagina,
+            'testo': testo,
+            'categorie': Spesa.get_categorie(user_id=user_id),
+            'mesi': Spesa.get_mesi(user_id=user_id),
+            'selected_categoria': categoria,
+            'selected_mese': mese
+        }
+    
+    return render_cached('search', 'search.html', build_context)
+
+@spese_bp.route('/report/data')
+@login_required
+def report_data():
+    """Restituisce in JSON i totali per categoria calcolati dal database, usati dal grafico del report"""
+    user_id = session.get('user_id')
+    categoria = request.args.get('categoria')
+    mese = request.args.get('mese')
+    
+    filters = {}
+    if categoria:
+        filters['categoria'] = categoria
+    if mese:
+        filters['mese'] = mese
+    
+    return jsonify(Spesa.get_riepilogo(user_id=user_id, filters=filters))
+
+@spese_bp.route('/export')
+@login_required
+def export_spese():
+    """
+    Esporta le spese filtrate in un file CSV scaricabile.
+    Il file viene generato in streaming: le righe vengono lette dal database a blocchi e inviate al client
+    man mano, senza costruire l'intero CSV in memoria.
+    """
+    user_id = session.get('user_id')
+    categoria = request.args.get('categoria')
+    mese = request.args.get('mese')
+    
+    filters = {}
+    if categoria:
+        filters['categoria'] = categoria
+    if mese:
+        filters['mese'] = mese
+    
+    query, params = Spesa.build_select(user_id=user_id, filters=filters)
+    
+    def generate():
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=['id', 'user_id', 'data', 'categoria', 'descrizione', 'importo'])
+        writer.writeheader()
+        yield output.getvalue()
+        
+        for rows in stream_query(query, params, chunk_size=Config.EXPORT_CHUNK_SIZE, dictionary=False):
+            output.seek(0)
+            output.truncate()
+            for row in rows:
+                writer.writerow(Spesa.from_row(row).to_dict())
+            yield output.getvalue()
+    
+    filename = "spese"
+    if categoria:
+        filename += f"_{categoria}"
+    if mese:
+        filename += f"_{mese}"
+    filename += ".csv"
+    
+    response = Response(generate(), mimetype='text/csv')
+    set_attachment_filename(response, filename)
+    return response